@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 启动时间基准 (防止启动变慢的回归)。
+
+1. 用 python -X importtime 导入主程序和扫描模块，打印累计耗时最多的模块，
+   并检查主程序导入时没有加载 pandas、scikit-learn 等重型模块，扫描子进程只加载 process_single_image 需要的模块；
+2. 启动交互主程序，测量从进程启动到出现第一个菜单提示的时间 (取多次中的最小值)。
+
+用法:
+    python benchmark_import_time.py [--top 15] [--repeat 3] [--max-prompt-seconds 0.5]
+任何一项检查失败时退出码为 1。
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DRIVER_MODULE = "getIMGINFOandClassify"
+SCANNER_MODULE = "image_scanner"
+FIRST_PROMPT = "请选择要执行的操作"
+
+# 主程序导入时不允许加载的模块 (这些模块在 load_pipeline_modules 中按需导入)
+DRIVER_FORBIDDEN_MODULES = ("pandas", "numpy", "openpyxl", "xlsxwriter", "PIL", "sklearn", "scipy", "loguru", "tqdm")
+# 扫描子进程 (image_scanner) 不允许加载的模块
+SCANNER_FORBIDDEN_MODULES = ("pandas", "numpy", "openpyxl", "xlsxwriter", "sklearn", "scipy", "loguru", "tqdm")
+
+DEFAULT_MAX_PROMPT_SECONDS = 0.5
+
+
+def _child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONIOENCODING"] = "utf-8"
+    return env
+
+
+def measure_import_time(module: str) -> List[Tuple[str, int, int]]:
+    """
+    在新进程中用 -X importtime 导入 module。
+
+    :return: [(模块名, 自身耗时微秒, 累计耗时微秒)]，按导入完成顺序。
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SCRIPT_DIR, env=_child_env(), capture_output=True, text=True, encoding="utf-8", check=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def measure_first_prompt_latency() -> float:
+    """
+    启动交互主程序，返回从启动到第一个菜单提示输出的秒数 (随后输入 4 退出)。
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-u", f"{DRIVER_MODULE}.py"],
+        cwd=SCRIPT_DIR, env=_child_env(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    output = b""
+    elapsed = None
+    try:
+        while True:
+            chunk = process.stdout.read1(4096)
+            if not chunk:
+                break
+            output += chunk
+            if FIRST_PROMPT.encode("utf-8") in output:
+                elapsed = time.perf_counter() - start
+                break
+        process.communicate(b"4\n", timeout=30)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    if elapsed is None:
+        raise RuntimeError("主程序没有输出菜单提示。")
+    return elapsed
+
+
+def _check_forbidden(module: str, entries: List[Tuple[str, int, int]], forbidden: Tuple[str, ...]) -> List[str]:
+    loaded = {name.split(".")[0] for name, _, _ in entries}
+    return [f"{module} 导入时加载了 {name}" for name in forbidden if name in loaded]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="主程序启动时间基准")
+    parser.add_argument("--top", type=int, default=15, help="显示累计耗时最多的前 N 个模块")
+    parser.add_argument("--repeat", type=int, default=3, help="菜单提示延迟的测量次数 (取最小值)")
+    parser.add_argument("--max-prompt-seconds", type=float, default=DEFAULT_MAX_PROMPT_SECONDS, help="菜单提示延迟上限 (秒)")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module, forbidden in ((DRIVER_MODULE, DRIVER_FORBIDDEN_MODULES), (SCANNER_MODULE, SCANNER_FORBIDDEN_MODULES)):
+        entries = measure_import_time(module)
+        total_us = next((cumulative for name, _, cumulative in entries if name == module), 0)
+        print(f"\n--- import {module}: {total_us / 1000:.1f} ms ---")
+        print(f"{'累计(ms)':>10}{'自身(ms)':>10}  模块")
+        for name, self_us, cumulative_us in sorted(entries, key=lambda entry: entry[2], reverse=True)[:args.top]:
+            print(f"{cumulative_us / 1000:>10.1f}{self_us / 1000:>10.1f}  {name}")
+        failures.extend(_check_forbidden(module, entries, forbidden))
+
+    latencies = [measure_first_prompt_latency() for _ in range(max(1, args.repeat))]
+    best = min(latencies)
+    print(f"\n菜单提示延迟: 最小 {best * 1000:.0f} ms (共 {len(latencies)} 次: {', '.join(f'{x * 1000:.0f}' for x in latencies)} ms)")
+    if best > args.max_prompt_seconds:
+        failures.append(f"菜单提示延迟 {best:.3f} 秒超过上限 {args.max_prompt_seconds} 秒")
+
+    if failures:
+        print("\n【启动时间回归】")
+        for failure in failures:
+            print(f"- {failure}")
+        return 1
+    print("\n启动时间检查通过。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 流水线各步骤的性能基准 (结果保存为 JSON，便于跨提交比较)。
+
+在 synthetic_corpus 生成的合成目录树上依次计时:
+- scan:     get_image_info；
+- tfidf:    preprocess_tags + calculate_and_extract_tfidf；
+- score:    ImageScorer.score_dataframe；
+- report:   create_excel_report (在临时工作目录中写入报告和报告数据库)；
+- tag:      tag_files_by_prompt (在目录树副本上重命名)；
+- classify: categorize_images (在另一个目录树副本上移动)。
+每项记录墙钟时间、CPU 时间 (本进程 + 已结束的子进程) 和处理的行数。
+
+用法:
+    python benchmark_suite.py --size 10k [--corpus-dir D:/bench/10k] [--output result.json]
+    python benchmark_suite.py --size 10k --compare 旧结果.json
+--corpus-dir 已存在时直接使用 (应由相同 --size/--seed 生成)，否则在其中 (或临时目录) 生成。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import synthetic_corpus
+from pipeline_runner import _children_cpu_time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_NAMES = ["scan", "tfidf", "score", "report", "tag", "classify"]
+# 比较时超过该比例视为变慢
+REGRESSION_RATIO = 1.10
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timed(name: str, func: Callable[[], Any], count_rows: Callable[[Any], int]) -> Dict[str, Any]:
+    """执行 func 并返回计时结果 (墙钟、CPU、行数)。"""
+    cpu_start = time.process_time() + _children_cpu_time()
+    wall_start = time.perf_counter()
+    result = func()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() + _children_cpu_time() - cpu_start
+    rows = count_rows(result)
+    print(f"[{name}] 墙钟 {wall:.3f} 秒, CPU {cpu:.3f} 秒, {rows} 行")
+    return {"name": name, "wall_seconds": wall, "cpu_seconds": cpu, "rows": rows}
+
+
+def _copy_tree(source: str, work_dir: str, name: str) -> str:
+    target = os.path.join(work_dir, name)
+    shutil.copytree(source, target, copy_function=shutil.copy2)
+    return target
+
+
+def run_benchmarks(corpus_dir: str, work_dir: str, names: List[str]) -> List[Dict[str, Any]]:
+    """
+    在 corpus_dir 上依次执行 names 中的基准 (文件操作类基准使用 work_dir 中的副本)。
+    """
+    import pandas as pd
+    import getIMGINFOandClassify as driver
+
+    driver.load_pipeline_modules()
+    results = []
+    records = driver.get_image_info(corpus_dir)
+    if "scan" in names:
+        results.append(_timed("scan", lambda: driver.get_image_info(corpus_dir), len))
+
+    if "tfidf" in names:
+        def _tfidf():
+            corpus, cleaned = driver.preprocess_tags(pd.DataFrame(records)[driver.TFIDF_TARGET_COLUMN])
+            return driver.calculate_and_extract_tfidf(pd.DataFrame(records), corpus, cleaned, driver.TFIDF_TOP_N_FEATURES)[0]
+        results.append(_timed("tfidf", _tfidf, len))
+
+    if "score" in names:
+        def _score():
+            scored = driver.ImageScorer(driver.ScorerConfig()).score_dataframe(pd.DataFrame(records))
+            if scored is None:
+                raise RuntimeError("评分失败。")
+            return scored
+        results.append(_timed("score", _score, len))
+
+    if "report" in names:
+        report_dir = os.path.join(work_dir, "report")
+        os.makedirs(report_dir, exist_ok=True)
+        cwd = os.getcwd()
+        os.chdir(report_dir) # 报告和报告数据库写入当前工作目录
+        try:
+            results.append(_timed("report", lambda: driver.create_excel_report(records), lambda _: len(records)))
+        finally:
+            os.chdir(cwd)
+
+    if "tag" in names:
+        tag_records = driver.get_image_info(_copy_tree(corpus_dir, work_dir, "tag"))
+        results.append(_timed("tag", lambda: driver.tag_files_by_prompt(tag_records, driver.TAGGING_KEYWORDS), len))
+
+    if "classify" in names:
+        classify_dir = _copy_tree(corpus_dir, work_dir, "classify")
+        classify_records = driver.get_image_info(classify_dir)
+        keyword_list = [kw.strip() for kw in driver.DEFAULT_CLASSIFY_KEYWORDS.split(",") if kw.strip()]
+        results.append(_timed(
+            "classify", lambda: driver.categorize_images(classify_records, keyword_list, classify_dir), lambda _: len(classify_records)
+        ))
+    return results
+
+
+def compare_results(old: Dict[str, Any], new: Dict[str, Any]) -> int:
+    """
+    打印两次结果的墙钟时间比值。
+    :return: 变慢超过 REGRESSION_RATIO 的基准数量。
+    """
+    old_by_name = {item["name"]: item for item in old.get("benchmarks", [])}
+    print(f"\n--- 与 {old.get('git_commit') or '未知提交'} ({old.get('corpus', {}).get('files')} 个文件) 比较 ---")
+    print(f"{'基准':<10}{'旧(秒)':>10}{'新(秒)':>10}{'比值':>8}")
+    regressions = 0
+    for item in new["benchmarks"]:
+        before = old_by_name.get(item["name"])
+        if before is None or before["wall_seconds"] <= 0:
+            print(f"{item['name']:<10}{'-':>10}{item['wall_seconds']:>10.3f}{'-':>8}")
+            continue
+        ratio = item["wall_seconds"] / before["wall_seconds"]
+        mark = "  变慢" if ratio > REGRESSION_RATIO else ""
+        regressions += ratio > REGRESSION_RATIO
+        print(f"{item['name']:<10}{before['wall_seconds']:>10.3f}{item['wall_seconds']:>10.3f}{ratio:>8.2f}{mark}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="流水线性能基准")
+    parser.add_argument("--size", default="1k", help="合成目录树的文件数: 1k / 10k / 100k 或具体数字")
+    parser.add_argument("--seed", type=int, default=0, help="合成目录树的随机种子")
+    parser.add_argument("--corpus-dir", help="合成目录树位置 (已存在时直接使用；默认在临时目录中生成)")
+    parser.add_argument("--only", help=f"只运行指定基准，逗号分隔 ({','.join(BENCHMARK_NAMES)})")
+    parser.add_argument("--output", help="结果 JSON 文件 (默认 benchmark_results_<时间戳>.json)")
+    parser.add_argument("--compare", help="与之前的结果 JSON 比较")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.only.split(",")] if args.only else BENCHMARK_NAMES
+    unknown = [name for name in names if name not in BENCHMARK_NAMES]
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(unknown)}")
+    n_files = synthetic_corpus.parse_size(args.size)
+    output = args.output or f"benchmark_results_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    output = os.path.abspath(output)
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as work_dir:
+        corpus_dir = os.path.abspath(args.corpus_dir) if args.corpus_dir else os.path.join(work_dir, "corpus")
+        if os.path.isdir(corpus_dir) and os.listdir(corpus_dir):
+            print(f"使用已有的目录树: {corpus_dir}")
+        else:
+            start = time.perf_counter()
+            synthetic_corpus.generate_corpus(corpus_dir, n_files, args.seed)
+            print(f"已生成 {n_files} 个文件 ({time.perf_counter() - start:.1f} 秒): {corpus_dir}")
+        benchmarks = run_benchmarks(corpus_dir, work_dir, names)
+
+    result = {
+        "git_commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": {"files": n_files, "seed": args.seed},
+        "benchmarks": benchmarks,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n基准结果已保存: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare_results(json.load(f), result)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
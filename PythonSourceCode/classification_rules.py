@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 图片分类规则引擎 (按列批量求值，先生成完整的移动计划表，再执行 I/O)。
+
+规则优先级与 file_categorizer.categorize_images 原有逻辑一致:
+1. 受保护文件夹 (完整名称 -> 模糊关键词 -> 绝对路径) 内的图片不移动；
+   绝对路径规则与原有逻辑相同，只保护文件夹本身；PROTECT_SUBFOLDERS 开启后也保护其子文件夹；
+2. 第一级目录: 创建日期目录 (缺失时为 '未获取日期'，为空字符串时没有日期这一级，与原有 os.path.join 的结果相同)；
+3. 第二级目录: 按关键词列表顺序第一个命中的关键词，未命中为 '未分类'。
+
+文件夹相关的规则只对去重后的文件夹求值一次 (同一文件夹内的图片结果必然相同)，
+关键词匹配使用预编译的 KeywordMatcher，30 万张图片的分类只需要几秒 CPU 时间。
+"""
+import os
+import re
+import pandas as pd
+from typing import List, Dict, Any, Iterable, Optional, Union
+from keyword_matcher import get_keyword_matcher
+
+UNCLASSIFIED_FOLDER_NAME = "未分类"
+UNKNOWN_DATE_FOLDER_NAME = "未获取日期"
+
+# 保护规则 (计划表 '保护规则' 列的取值)
+PROTECT_BY_NAME = "完整名称"
+PROTECT_BY_FUZZY = "模糊关键词"
+PROTECT_BY_PATH = "绝对路径"
+
+# [2026-10-19] 新增: 受保护的绝对路径是否也保护其子文件夹 (默认 False，与原有逻辑一致: 只保护文件夹本身)
+PROTECT_SUBFOLDERS = False
+
+# 计划动作 (计划表 '动作' 列的取值)
+ACTION_PROTECTED = "protected" # 位于受保护文件夹，不移动
+ACTION_SKIP_SAME = "skip_same" # 已位于理想目标位置，跳过 I/O
+ACTION_MOVE = "move"           # 需要移动
+
+PLAN_COLUMNS = [
+    "图片文件名", "初始绝对路径", "所在文件夹", "保护规则",
+    "创建日期目录", "匹配关键词", "目标文件夹", "理想目标路径", "动作",
+]
+
+
+class ProtectedPathIndex:
+    """
+    受保护文件夹绝对路径的索引 (集合查找，替代对列表逐项比较)。
+    默认只保护文件夹本身 (与原有的 'image_dir_abs in protected_folders' 一致)；
+    include_subfolders=True 时作为前缀索引，查询时沿父目录向上查找 (O(路径深度))，子文件夹也受保护。
+    """
+    def __init__(self, protected_folders: Optional[Iterable[str]] = None, include_subfolders: bool = PROTECT_SUBFOLDERS):
+        self.include_subfolders = include_subfolders
+        self._roots = {self._key(folder) for folder in (protected_folders or [])}
+
+    def _key(self, path: str) -> str:
+        # 原有逻辑按 os.path.abspath 精确比较；前缀模式同时忽略大小写差异 (Windows)
+        path = os.path.abspath(path)
+        return os.path.normcase(path) if self.include_subfolders else path
+
+    def __bool__(self):
+        return bool(self._roots)
+
+    def is_protected(self, directory: str) -> bool:
+        current = self._key(directory)
+        if not self.include_subfolders:
+            return current in self._roots
+        while True:
+            if current in self._roots:
+                return True
+            parent = os.path.dirname(current)
+            if parent == current:
+                return False
+            current = parent
+
+
+def _compile_fuzzy_pattern(fuzzy_keywords: Iterable[str]) -> Optional[re.Pattern]:
+    """
+    把模糊保护关键词编译为一个不区分大小写的正则 (任意一个关键词出现在文件夹名称中即命中)。
+    """
+    keywords = [kw.lower() for kw in fuzzy_keywords if kw]
+    if not keywords:
+        return None
+    return re.compile("|".join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True)))
+
+
+def _to_frame(image_data: Union[pd.DataFrame, List[Dict[str, Any]]]) -> pd.DataFrame:
+    """
+    只取规则需要的列 (图片路径、提示词、创建日期目录)，缺失的列用空值补齐。
+    """
+    columns = ["图片的绝对路径", "正面提示词", "负面提示词", "创建日期目录"]
+    if isinstance(image_data, pd.DataFrame):
+        frame = image_data.reindex(columns=columns)
+    else:
+        frame = pd.DataFrame(
+            {column: [data.get(column) for data in image_data] for column in columns},
+            columns=columns,
+        )
+    return frame.reset_index(drop=True)
+
+
+def build_move_plan(
+    image_data: Union[pd.DataFrame, List[Dict[str, Any]]],
+    keyword_list: List[str],
+    root_dir: str,
+    protected_names: Iterable[str] = (),
+    fuzzy_keywords: Iterable[str] = (),
+    protected_folders: Optional[Iterable[str]] = None,
+    protect_subfolders: bool = PROTECT_SUBFOLDERS,
+) -> pd.DataFrame:
+    """
+    对全部图片按列求值分类规则，返回完整的移动计划表 (不执行任何 I/O)。
+
+    :param image_data: 扫描结果 (DataFrame 或 字典列表)，需要 '图片的绝对路径'、'正面提示词'、'负面提示词'、'创建日期目录' 列。
+    :param keyword_list: 分类关键词列表 (顺序即优先级)。
+    :param root_dir: 分类根目录 (绝对路径)。
+    :param protected_names: 受保护的文件夹名称 (完整匹配)。
+    :param fuzzy_keywords: 模糊保护关键词 (文件夹名称包含即受保护，不区分大小写)。
+    :param protected_folders: 受保护的文件夹绝对路径。
+    :param protect_subfolders: [2026-10-19 新增] 是否也保护 protected_folders 的子文件夹 (默认只保护文件夹本身)。
+    :return: 与输入顺序一致的计划表，列见 PLAN_COLUMNS。
+    """
+    frame = _to_frame(image_data)
+    if frame.empty:
+        return pd.DataFrame(columns=PLAN_COLUMNS)
+
+    paths = frame["图片的绝对路径"].astype(str)
+    directories = paths.map(os.path.dirname)
+    filenames = paths.map(os.path.basename)
+
+    # 1. 文件夹规则: 只对去重后的文件夹求值
+    name_set = set(protected_names)
+    fuzzy_pattern = _compile_fuzzy_pattern(fuzzy_keywords)
+    path_index = ProtectedPathIndex(protected_folders, include_subfolders=protect_subfolders)
+
+    def _protect_rule(directory: str) -> Optional[str]:
+        directory_name = os.path.basename(directory)
+        if directory_name in name_set:
+            return PROTECT_BY_NAME
+        if fuzzy_pattern is not None and fuzzy_pattern.search(directory_name.lower()):
+            return PROTECT_BY_FUZZY
+        if path_index and path_index.is_protected(directory):
+            return PROTECT_BY_PATH
+        return None
+
+    unique_directories = directories.unique()
+    rule_by_directory = {directory: _protect_rule(directory) for directory in unique_directories}
+    protect_rules = directories.map(rule_by_directory)
+
+    # 2. 关键词规则: 相同的提示词只匹配一次
+    matcher = get_keyword_matcher(keyword_list)
+    prompt_texts = [
+        matcher.normalize(positive, negative)
+        for positive, negative in zip(frame["正面提示词"], frame["负面提示词"])
+    ]
+    matched_keywords = pd.Series(matcher.first_match_column(prompt_texts), dtype=object)
+
+    # 3. 目标路径 (字符串按列拼接)
+    date_folders = frame["创建日期目录"].where(frame["创建日期目录"].notna(), UNKNOWN_DATE_FOLDER_NAME).astype(str)
+    sub_folders = matched_keywords.where(matched_keywords.notna(), UNCLASSIFIED_FOLDER_NAME)
+    # 创建日期目录为空字符串时跳过这一级 (与 os.path.join(root_dir, '', 子目录) 相同，避免 'root//子目录')
+    date_prefixes = date_folders.where(date_folders == "", date_folders + os.sep)
+    target_folders = os.path.join(root_dir, "") + date_prefixes + sub_folders
+    ideal_targets = target_folders + os.sep + filenames
+
+    actions = pd.Series(ACTION_MOVE, index=frame.index, dtype=object)
+    actions[paths == ideal_targets] = ACTION_SKIP_SAME
+    actions[protect_rules.notna()] = ACTION_PROTECTED
+
+    return pd.DataFrame({
+        "图片文件名": filenames,
+        "初始绝对路径": paths,
+        "所在文件夹": directories,
+        "保护规则": protect_rules,
+        "创建日期目录": date_folders,
+        "匹配关键词": matched_keywords,
+        "目标文件夹": target_folders,
+        "理想目标路径": ideal_targets,
+        "动作": actions,
+    }, columns=PLAN_COLUMNS)
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 分阶段的完全重复文件查找 (对应主程序 TODO "图片去重功能")。
+
+逐级过滤，只有前一级仍可能重复的文件才进入下一级，读取的字节数只占归档总量的很小一部分:
+1. 按文件大小分组 (只需 stat，不读文件)；大小唯一的文件不可能重复；
+2. 同大小的文件计算首尾块哈希 (开头和结尾各 HEAD_TAIL_BYTES 字节)；不超过两个块的小文件直接读取全部内容，
+   首尾块哈希即完整哈希；
+3. 首尾块也相同的文件才计算完整内容哈希 (按 HASH_CHUNK_BYTES 流式读取)。
+哈希在线程池中并行计算 (hashlib 计算大块数据和文件读取时都会释放 GIL)，结果按 (路径, 大小, 修改时间) 缓存在
+hash_cache.HashCache 中，再次运行时未变化的文件不再读取。
+
+结果可以作为报告中的新工作表 (duplicate_sheet_records / DUPLICATE_SHEET_NAME)。
+"""
+import os
+import hashlib
+import concurrent.futures
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from hash_cache import HashCache, HASH_CACHE_FILE
+
+HEAD_TAIL_BYTES = 64 * 1024
+HASH_CHUNK_BYTES = 1024 * 1024
+# 哈希线程数 (以读盘为主，多于 CPU 核心数也有收益)
+HASH_WORKERS = min(16, (os.cpu_count() or 4) * 2)
+# 哈希摘要长度 (字节)
+DIGEST_SIZE = 16
+
+DUPLICATE_SHEET_NAME = "重复文件"
+DUPLICATE_COLUMNS = ["重复组", "组内文件数", "建议", "文件大小(字节)", "修改时间", "内容哈希", "图片超链接", "图片的绝对路径"]
+SUGGEST_KEEP = "保留 (最早)"
+SUGGEST_REMOVE = "可删除"
+
+
+def head_tail_hash(path: str, size: int) -> Tuple[str, int, bool]:
+    """
+    计算首尾块哈希 (哈希中包含文件大小)。
+
+    :return: (哈希, 读取的字节数, 是否已读取全部内容)。
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    digest.update(size.to_bytes(8, "little"))
+    with open(path, "rb") as f:
+        if size <= 2 * HEAD_TAIL_BYTES:
+            data = f.read()
+            digest.update(data)
+            return digest.hexdigest(), len(data), True
+        head = f.read(HEAD_TAIL_BYTES)
+        f.seek(-HEAD_TAIL_BYTES, os.SEEK_END)
+        tail = f.read(HEAD_TAIL_BYTES)
+    digest.update(head)
+    digest.update(tail)
+    return digest.hexdigest(), len(head) + len(tail), False
+
+
+def full_hash(path: str) -> Tuple[str, int]:
+    """
+    流式计算完整内容哈希。
+
+    :return: (哈希, 读取的字节数)。
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    read_bytes = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+            read_bytes += len(chunk)
+    return digest.hexdigest(), read_bytes
+
+
+def _groups_of(keys: Dict[str, Any]) -> List[List[str]]:
+    """按值分组，只返回包含两个及以上路径的组。"""
+    groups = defaultdict(list)
+    for path, key in keys.items():
+        groups[key].append(path)
+    return [paths for paths in groups.values() if len(paths) > 1]
+
+
+def find_exact_duplicates(
+    paths: Iterable[str],
+    cache_path: Optional[str] = HASH_CACHE_FILE,
+    max_workers: int = HASH_WORKERS,
+) -> Dict[str, Any]:
+    """
+    查找内容完全相同的文件。
+
+    :param paths: 文件路径 (通常是扫描结果的 '图片的绝对路径' 列)。
+    :param cache_path: 哈希缓存数据库路径，None 表示不使用缓存。
+    :param max_workers: 哈希线程数。
+    :return: {"groups": [[路径, ...], ...] (每组按修改时间从早到晚排序，组按可释放空间从大到小排序),
+              "signatures": {路径: (大小, 修改时间纳秒)}, "hashes": {路径: 完整哈希},
+              "stats": {文件数, 总字节数, 读取字节数, 各阶段候选数, 重复组数, 可释放字节数, ...}}。
+    """
+    signatures: Dict[str, Tuple[int, int]] = {}
+    for path in dict.fromkeys(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signatures[path] = (stat.st_size, stat.st_mtime_ns)
+    total_bytes = sum(size for size, _ in signatures.values())
+
+    # 1. 按大小分组
+    size_candidates = [path for group in _groups_of({path: sig[0] for path, sig in signatures.items()}) for path in group]
+    stats = {
+        "文件数": len(signatures),
+        "总字节数": total_bytes,
+        "读取字节数": 0,
+        "同大小候选": len(size_candidates),
+        "首尾块相同候选": 0,
+        "完整哈希计算数": 0,
+        "缓存命中": 0,
+    }
+    cache = HashCache(cache_path) if cache_path else None
+    try:
+        cached = cache.lookup({path: signatures[path] for path in size_candidates}) if cache else {}
+        stats["缓存命中"] = len(cached)
+        head_tail: Dict[str, str] = {}
+        full: Dict[str, str] = {}
+        for path, values in cached.items():
+            if values.get("head_tail"):
+                head_tail[path] = values["head_tail"]
+            if values.get("full"):
+                full[path] = values["full"]
+        new_hashes: Dict[str, Dict[str, str]] = defaultdict(dict)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            # 2. 首尾块哈希
+            todo = [path for path in size_candidates if path not in head_tail]
+            futures = {executor.submit(head_tail_hash, path, signatures[path][0]): path for path in todo}
+            for future in concurrent.futures.as_completed(futures):
+                path = futures[future]
+                try:
+                    digest, read_bytes, complete = future.result()
+                except OSError:
+                    continue
+                stats["读取字节数"] += read_bytes
+                head_tail[path] = new_hashes[path]["head_tail"] = digest
+                if complete:
+                    full[path] = new_hashes[path]["full"] = digest
+
+            head_tail_candidates = [path for group in _groups_of(head_tail) for path in group]
+            stats["首尾块相同候选"] = len(head_tail_candidates)
+
+            # 3. 完整哈希
+            todo = [path for path in head_tail_candidates if path not in full]
+            stats["完整哈希计算数"] = len(todo)
+            futures = {executor.submit(full_hash, path): path for path in todo}
+            for future in concurrent.futures.as_completed(futures):
+                path = futures[future]
+                try:
+                    digest, read_bytes = future.result()
+                except OSError:
+                    continue
+                stats["读取字节数"] += read_bytes
+                full[path] = new_hashes[path]["full"] = digest
+
+        if cache and new_hashes:
+            cache.store((path, *signatures[path], hashes) for path, hashes in new_hashes.items())
+    finally:
+        if cache:
+            cache.close()
+
+    # 完整哈希已包含文件大小 (首尾块哈希对小文件即完整哈希，其中也包含大小)，这里仍按 (大小, 哈希) 分组
+    groups = _groups_of({path: (signatures[path][0], full[path]) for path in head_tail_candidates if path in full})
+    groups = [sorted(group, key=lambda path: (signatures[path][1], path)) for group in groups]
+    groups.sort(key=lambda group: signatures[group[0]][0] * (len(group) - 1), reverse=True)
+    stats["重复组数"] = len(groups)
+    stats["重复文件数"] = sum(len(group) - 1 for group in groups)
+    stats["可释放字节数"] = sum(signatures[group[0]][0] * (len(group) - 1) for group in groups)
+    return {"groups": groups, "signatures": signatures, "hashes": full, "stats": stats}
+
+
+def duplicate_sheet_records(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    把 find_exact_duplicates 的结果转换为报告工作表的行 (每个文件一行，同组相邻)。
+    """
+    signatures, hashes = result["signatures"], result["hashes"]
+    records = []
+    for group_number, group in enumerate(result["groups"], start=1):
+        for index, path in enumerate(group):
+            size, mtime_ns = signatures[path]
+            records.append({
+                "重复组": group_number,
+                "组内文件数": len(group),
+                "建议": SUGGEST_KEEP if index == 0 else SUGGEST_REMOVE,
+                "文件大小(字节)": size,
+                "修改时间": datetime.fromtimestamp(mtime_ns / 1e9).strftime("%Y-%m-%d %H:%M:%S"),
+                "内容哈希": hashes[path],
+                "图片超链接": path,
+                "图片的绝对路径": path,
+            })
+    return records
+
+
+def print_duplicate_summary(stats: Dict[str, Any]):
+    total = stats["总字节数"] or 1
+    print("\n--- 完全重复文件查找 ---")
+    print(
+        f"文件 {stats['文件数']} 个 ({stats['总字节数'] / 1024 ** 2:.1f} MB)；同大小候选 {stats['同大小候选']}，"
+        f"首尾块相同 {stats['首尾块相同候选']}，计算完整哈希 {stats['完整哈希计算数']}，缓存命中 {stats['缓存命中']}"
+    )
+    print(f"读取 {stats['读取字节数'] / 1024 ** 2:.1f} MB，占总量的 {stats['读取字节数'] / total:.2%}")
+    print(f"重复组 {stats['重复组数']} 个，多余文件 {stats['重复文件数']} 个，可释放 {stats['可释放字节数'] / 1024 ** 2:.1f} MB")
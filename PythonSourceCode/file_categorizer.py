@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 import os
 import re
-from typing import List, Dict, Any, Optional # 导入 Optional
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Set, Iterable, Tuple # 导入 Optional
+from collections import Counter, defaultdict
+import concurrent.futures
 from tqdm import tqdm # 导入 tqdm, 用于进度条显示
 
 # 默认禁止自动分类的文件夹名称列表 (完整匹配)
@@ -22,110 +23,179 @@ FUZZY_PROTECTED_KEYWORDS = [
     "手动",
 ]
 
-# 依赖导入：从 filename_tagger 模块导入冲突解决函数
-try:
-    from filename_tagger import get_unique_filename
-except ImportError:
-    # 占位函数，避免模块缺失时代码崩溃
-    def get_unique_filename(target_dir, filename):
-        print(f"[ERROR] filename_tagger.py 缺失，归档冲突解决失败，返回原始文件名: {filename}")
-        return filename
-    print("警告: 无法导入 filename_tagger.get_unique_filename。文件冲突解决功能将失效。")
+from move_engine import move_path, MoveStats # [2026-10-19] 新增: 跨卷感知的移动引擎 (替代 os.rename)
+from virtual_fs import REAL_FS # [2026-10-19] 新增: 文件系统抽象 (传入 VirtualFileSystem 即可在内存中模拟运行)
+from rename_planner import resolve_unique_name, MAX_RENAME_WORKERS # [2026-10-19] 新增: 内存中的 (N) 冲突后缀计算
+# [2026-10-19] 新增: 先规划、后执行的批量移动 + 按列求值的分类规则引擎
+from rename_planner import plan_renames, execute_rename_plan, CONFLICT_SUFFIX, STATUS_DONE, STATUS_FAILED
+from classification_rules import build_move_plan, ACTION_MOVE, ACTION_PROTECTED, ACTION_SKIP_SAME, PROTECT_BY_NAME, PROTECT_BY_PATH
+import structured_log # [2026-10-19] 新增: 基于队列的批量结构化日志
+from structured_log import LEVEL_INFO, LEVEL_WARNING
 
 
-def log_error(message: str):
+def log_error(message: str, stage: str = "classify", file: Optional[str] = None, level: str = structured_log.LEVEL_ERROR):
     """
     [临时] 记录错误信息到控制台和日志文件。
     
     注意: 最终应根据用户要求使用 loguru/logger_obj 进行隐性注入。
+    [2026-10-19] 修改: 通过 structured_log 按批写入 image_scan_error.log (格式不变) 和 image_scan_error.jsonl，
+    控制台输出限速，不再每条消息打开一次日志文件。
+
+    :param stage: [2026-10-19 新增] 所属阶段 ("classify" / "archive")。
+    :param file: [2026-10-19 新增] 相关的文件路径。
+    :param level: [2026-10-19 新增] 日志级别 (LEVEL_INFO 只输出到控制台)。
+    """
+    structured_log.log_event(message, level=level, stage=stage, file=file)
+
+
+def log_info(message: str, stage: str = "classify", file: Optional[str] = None):
+    """
+    [2026-10-19] 新增: 记录进度信息 (LEVEL_INFO，只输出到控制台，不写入错误日志文件)。
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"{timestamp} - {message}\n"
-    print(message) # 在控制台打印错误信息
-    # 假设日志文件名为 image_scan_error.log
-    with open("image_scan_error.log", "a", encoding="utf-8") as log_file:
-        log_file.write(log_entry)
+    structured_log.log_event(message, level=LEVEL_INFO, stage=stage, file=file)
+
+
+def merge_folder_trees(
+    source_dir: str,
+    target_dir: str,
+    stats: Optional[MoveStats] = None,
+    max_workers: int = MAX_RENAME_WORKERS,
+    fs=REAL_FS,
+) -> Dict[str, Any]:
+    """
+    [2026-10-19] 新增: 把源文件夹合并到已存在的目标文件夹 (merge_and_move_folder 的批量版本)。
+
+    1. 规划: 用 os.scandir 同时遍历两棵目录树，每个目录只列举一次，在内存中算出全部移动操作
+       (目标不存在的子文件夹整体移动；同名文件按 resolve_unique_name 添加 (N) 后缀)；
+    2. 执行: 按源子文件夹分组，多个子文件夹并行移动 (move_path，跨卷安全)；
+    3. 清理: 自底向上删除已清空的源文件夹。
+
+    :param source_dir: 源目录路径 (合并完成后被删除)
+    :param target_dir: 目标目录路径 (必须已存在)
+    :param stats: 可选的移动统计对象
+    :param max_workers: 并行执行的最大线程数
+    :param fs: 文件系统 (REAL_FS 或 virtual_fs.VirtualFileSystem)
+    :return: {'moved': [(源, 目标)], 'renamed': [(源, 目标)], 'failed': [(源, 错误)], 'source_removed': bool}
+             renamed 为因冲突添加了 (N) 后缀的文件，不计入 moved。
+    """
+    result: Dict[str, Any] = {"moved": [], "renamed": [], "failed": [], "source_removed": False}
+    # 每个源子文件夹的操作列表: (源路径, 目标路径, 是否因冲突改名)
+    groups: Dict[str, List[Tuple[str, str, bool]]] = defaultdict(list)
+    merged_source_dirs: List[str] = [] # 被递归合并 (而非整体移动) 的源文件夹，执行后需要清理
+
+    # 1. 规划阶段 (只读)
+    pending = [(source_dir, target_dir)]
+    while pending:
+        current_source, current_target = pending.pop()
+        merged_source_dirs.append(current_source)
+        try:
+            with fs.scandir(current_target) as entries:
+                # 目标目录中的已有名称 -> 是否为文件夹
+                target_entries = {os.path.normcase(entry.name): entry.is_dir() for entry in entries}
+            with fs.scandir(current_source) as entries:
+                source_entries = [(entry.name, entry.is_dir(), entry.is_file()) for entry in entries]
+        except OSError as e:
+            result["failed"].append((current_source, str(e)))
+            continue
+        occupied: Set[str] = set(target_entries)
+
+        for name, is_dir, is_file in source_entries:
+            source_path = os.path.join(current_source, name)
+            key = os.path.normcase(name)
+            if is_dir:
+                if key not in target_entries:
+                    # 目标不存在，整个文件夹直接移动
+                    groups[current_source].append((source_path, os.path.join(current_target, name), False))
+                    occupied.add(key)
+                elif target_entries[key]:
+                    # 目标存在同名文件夹，继续合并下一层
+                    pending.append((source_path, os.path.join(current_target, name)))
+                else:
+                    result["failed"].append((source_path, "目标位置存在同名文件，无法合并文件夹"))
+            elif is_file:
+                unique_filename = name
+                if key in occupied:
+                    try:
+                        unique_filename = resolve_unique_name(name, occupied)
+                    except Exception as e:
+                        result["failed"].append((source_path, str(e)))
+                        continue
+                occupied.add(os.path.normcase(unique_filename))
+                groups[current_source].append((source_path, os.path.join(current_target, unique_filename), unique_filename != name))
+
+    # 2. 执行阶段: 不同源子文件夹并行，同一子文件夹内顺序执行
+    def _run_group(operations: List[Tuple[str, str, bool]]):
+        moved, renamed, failed = [], [], []
+        for source_path, target_path, by_conflict in operations:
+            try:
+                move_path(source_path, target_path, stats, fs=fs)
+                (renamed if by_conflict else moved).append((source_path, target_path))
+            except Exception as e:
+                failed.append((source_path, str(e)))
+        return moved, renamed, failed
+
+    if groups:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for moved, renamed, failed in executor.map(_run_group, groups.values()):
+                result["moved"].extend(moved)
+                result["renamed"].extend(renamed)
+                result["failed"].extend(failed)
+
+    for source_path, target_path in result["renamed"]:
+        log_error(f"    提醒: 文件冲突解决，已重命名移动 '{os.path.basename(source_path)}' -> '{os.path.basename(target_path)}'",
+                  stage="archive", file=source_path, level=LEVEL_WARNING)
+    for source_path, error in result["failed"]:
+        log_error(f"警告: 归档合并时移动 '{source_path}' 失败: {error}", stage="archive", file=source_path)
 
+    # 3. 清理阶段: 规划时父目录总是先于子目录加入，倒序即为自底向上
+    for directory in reversed(merged_source_dirs):
+        try:
+            with fs.scandir(directory) as entries:
+                if next(entries, None) is not None:
+                    continue
+            fs.rmdir(directory)
+            if directory == source_dir:
+                result["source_removed"] = True
+        except OSError as e:
+            log_error(f"错误: 无法删除空文件夹 '{directory}'。请手动检查权限。错误: {e}", stage="archive", file=directory)
+
+    return result
 
-def merge_and_move_folder(source_dir: str, target_dir: str) -> bool:
+
+def merge_and_move_folder(source_dir: str, target_dir: str, stats: Optional[MoveStats] = None, fs=REAL_FS) -> bool:
     """
     递归地将源文件夹内容合并到目标文件夹中。
     文件如果已存在则重命名添加 (N) 后移动。
     
-    [2025-10-28] 依赖: 外部函数 get_unique_filename (来自 filename_tagger 模块)
+    [2026-10-19] 修改: 改为调用 merge_folder_trees (一次遍历规划 + 按子文件夹并行执行)，保留原有的 bool 返回值。
     
     :param source_dir: 源目录路径 (将被清空或删除)
     :param target_dir: 目标目录路径
+    :param stats: [2026-10-19 新增] 可选的移动统计对象
+    :param fs: [2026-10-19 新增] 文件系统 (REAL_FS 或 virtual_fs.VirtualFileSystem)
     :return: bool, 源文件夹是否被成功删除/清空
     """
-    content_moved = False
-    
-    for item in os.listdir(source_dir):
-        source_path = os.path.join(source_dir, item)
-        target_path = os.path.join(target_dir, item)
-        
-        if os.path.isdir(source_path):
-            # 如果是子文件夹
-            if not os.path.exists(target_path):
-                # 目标不存在，直接移动整个文件夹
-                os.rename(source_path, target_path)
-                content_moved = True
-            else:
-                # 目标存在，递归合并
-                sub_folder_moved = merge_and_move_folder(source_path, target_path)
-                if sub_folder_moved:
-                    content_moved = True # 即使是递归移动也算作内容有移动
-        elif os.path.isfile(source_path):
-            # 如果是文件
-            if not os.path.exists(target_path):
-                # 目标不存在，直接移动文件
-                os.rename(source_path, target_path)
-                content_moved = True
-            else:
-                # 目标已存在同名文件，调用 get_unique_filename 解决冲突
-                original_filename = item
-                # 调用从 filename_tagger 导入的函数
-                unique_filename = get_unique_filename(target_dir, original_filename) 
-                
-                new_target_path = os.path.join(target_dir, unique_filename)
-                
-                # 重命名并移动文件
-                try:
-                    os.rename(source_path, new_target_path)
-                    content_moved = True
-                    log_error(f"    提醒: 文件冲突解决，已重命名移动 '{original_filename}' -> '{unique_filename}'") # 使用 log_error 记录警告
-                except Exception as e:
-                    log_error(f"警告: 归档合并时重命名移动文件 '{source_path}' 失败: {e}")
+    return merge_folder_trees(source_dir, target_dir, stats, fs=fs)["source_removed"]
 
 
-    # 递归结束后，尝试删除源文件夹（如果它现在是空的）
-    if not os.listdir(source_dir):
-        try:
-            os.rmdir(source_dir)
-            return True # 源文件夹已被删除，表示所有内容已成功转移/处理
-        except OSError as e:
-            log_error(f"错误: 无法删除空文件夹 '{source_dir}'。请手动检查权限。错误: {e}")
-            return False
-    return False # 源文件夹非空，或删除失败
-
-
-def archive_date_folders(base_source_dir: str, archive_target_dir: str):
+def archive_date_folders(base_source_dir: str, archive_target_dir: str, fs=REAL_FS):
     """
     遍历 base_source_dir 下的一级子文件夹，如果文件夹名称是 YYYY-MM-DD 格式，
     则将其整个移动归档到 archive_target_dir 文件夹下。
     
     :param base_source_dir: 扫描源目录 (如: .../txt2img-images/)
     :param archive_target_dir: 归档目标目录 (如: .../txt2img-images/历史)
+    :param fs: [2026-10-19 新增] 文件系统 (REAL_FS 或 virtual_fs.VirtualFileSystem)
     """
     print("\n--- 开始执行日期文件夹归档操作 ---")
     
     # 确保目标目录存在
-    if not os.path.exists(archive_target_dir):
+    if not fs.exists(archive_target_dir):
         try:
-            os.makedirs(archive_target_dir)
+            fs.makedirs(archive_target_dir)
             print(f"创建归档目标目录: {archive_target_dir}")
         except Exception as e:
-            log_error(f"创建归档目标目录失败: {e}")
+            log_error(f"创建归档目标目录失败: {e}", stage="archive", file=archive_target_dir)
             return # 创建失败则退出归档
 
     # 日期文件夹名称的正则表达式 (YYYY-MM-DD)
@@ -133,16 +203,17 @@ def archive_date_folders(base_source_dir: str, archive_target_dir: str):
     
     total_found = 0
     total_archived = 0
+    move_stats = MoveStats() # [2026-10-19] 新增: 统计同卷重命名/跨卷复制的数量和速率
 
     try:
         # 获取绝对路径用于安全比较
         abs_archive_target_dir = os.path.abspath(archive_target_dir)
         
-        for item in os.listdir(base_source_dir):
+        for item in fs.listdir(base_source_dir):
             source_path = os.path.join(base_source_dir, item)
             
             # 1. 检查是否是文件夹
-            if os.path.isdir(source_path):
+            if fs.isdir(source_path):
                 # 2. 检查文件夹名称是否符合 YYYY-MM-DD 格式
                 if date_folder_pattern.match(item):
                     
@@ -154,18 +225,20 @@ def archive_date_folders(base_source_dir: str, archive_target_dir: str):
                     total_found += 1
                     target_path = os.path.join(archive_target_dir, item)
                     
-                    if not os.path.exists(target_path):
-                        # 目标位置不存在，直接移动整个文件夹
-                        os.rename(source_path, target_path)
+                    if not fs.exists(target_path):
+                        # 目标位置不存在，直接移动整个文件夹 (跨卷时自动复制+校验+删除源)
+                        move_path(source_path, target_path, move_stats, fs=fs)
                         print(f"成功归档(移动)文件夹: '{item}' -> '{archive_target_dir}'")
                         total_archived += 1
                     else:
                         # 目标位置已存在同名文件夹，执行合并操作
                         print(f"提醒: 归档目标位置已存在同名文件夹 '{item}'。开始合并内容...")
                         # 核心修改：调用合并函数，并检查是否成功清理了源文件夹
-                        source_folder_empty = merge_and_move_folder(source_path, target_path)
+                        # [2026-10-19] 修改: 使用 merge_folder_trees，输出结构化的合并结果
+                        merge_result = merge_folder_trees(source_path, target_path, move_stats, fs=fs)
+                        print(f"    合并结果: 直接移动 {len(merge_result['moved'])} 项，冲突改名 {len(merge_result['renamed'])} 项，失败 {len(merge_result['failed'])} 项。")
                         
-                        if source_folder_empty:
+                        if merge_result["source_removed"]:
                             # merge_and_move_folder成功后会自行删除源文件夹
                             print(f"成功归档(合并)并清理源文件夹: {item}")
                             total_archived += 1 # 视为成功归档（合并也是归档的一种）
@@ -174,9 +247,46 @@ def archive_date_folders(base_source_dir: str, archive_target_dir: str):
                             print(f"提醒: 文件夹 '{item}' 合并操作完成，但源文件夹可能仍有内容或清理失败。")
                             
     except Exception as e:
-        log_error(f"日期文件夹归档时发生错误: {e}")
+        log_error(f"日期文件夹归档时发生错误: {e}", stage="archive")
         
     print(f"日期文件夹归档操作完成。发现日期文件夹 {total_found} 个，成功归档(移动或合并) {total_archived} 个。")
+    print(f"归档移动统计: {move_stats.summary()}")
+
+
+def remove_empty_source_dirs(source_dirs: Iterable[str], root_dir: str, fs=REAL_FS) -> int:
+    """
+    [2026-10-19] 新增: 清理移动后变空的原文件夹。
+
+    只清理有文件移出的文件夹本身 (与逐个移动时的清理范围相同)，不会向上删除变空的父文件夹
+    (父文件夹可能是名称受保护的文件夹，例如 精选/sub 中的文件移走后不能删除 精选)。
+    每个文件夹只检查一次 (读取到第一个条目即停止)，子文件夹先于父文件夹处理；root_dir 本身永远不会被删除。
+
+    :param source_dirs: 有文件移出的原文件夹 (绝对路径) 集合。
+    :param root_dir: 分类根目录 (绝对路径)。
+    :param fs: 文件系统 (REAL_FS 或 virtual_fs.VirtualFileSystem)。
+    :return: 删除的文件夹数量。
+    """
+    root_dir = os.path.abspath(root_dir)
+    root_prefix = os.path.join(root_dir, "")
+    # 路径越深越先处理，保证子文件夹先于父文件夹 (两者都有文件移出时父文件夹才可能变空)
+    candidates = sorted({d for d in source_dirs if d.startswith(root_prefix)}, key=lambda d: d.count(os.sep), reverse=True)
+    removed_count = 0
+
+    for directory in candidates:
+        try:
+            with fs.scandir(directory) as entries:
+                if next(entries, None) is not None:
+                    continue # 非空，保留
+            fs.rmdir(directory)
+            removed_count += 1
+            log_info(f"清理空文件夹: {directory}", file=directory)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            log_error(f"警告: 无法清理空文件夹 '{directory}'，可能仍有隐藏文件。错误: {e}", file=directory, level=LEVEL_WARNING)
+            continue
+
+    return removed_count
 
 
 def categorize_images(
@@ -185,6 +295,7 @@ def categorize_images(
     root_dir_path: str, 
     protected_folders: Optional[List[str]] = None,
     additional_protected_names: Optional[List[str]] = None, # [2025-10-28 新增] 额外的受保护文件夹名称列表
+    fs=REAL_FS, # [2026-10-19 新增] 文件系统 (传入 VirtualFileSystem 时只在内存中模拟)
 ) -> List[Dict[str, str]]: # [修改] 新增返回类型
     """
     根据创建日期和关键词列表，将图片进行两级分类和移动。
@@ -194,8 +305,10 @@ def categorize_images(
     :param image_data: 包含图片信息的列表。
     :param keyword_list: 用于文件夹分类的关键词列表。
     :param root_dir_path: 扫描的主文件夹路径，也是分类的根目录。
-    :param protected_folders: 受保护的文件夹绝对路径列表，位于其中的文件不会被移动。
+    :param protected_folders: 受保护的文件夹绝对路径列表，直接位于其中的文件不会被移动
+                              (classification_rules.PROTECT_SUBFOLDERS 开启后也包括其子文件夹)。
     :param additional_protected_names: [2025-10-28 新增] 额外禁止自动分类的文件夹名称列表 (如: 精选)。
+    :param fs: [2026-10-19 新增] 文件系统 (REAL_FS 或 virtual_fs.VirtualFileSystem)。
     :return: List[Dict[str, str]], 包含分类操作记录的列表。 # [修改] 新增返回描述
     """
     if not image_data:
@@ -218,22 +331,43 @@ def categorize_images(
     if additional_protected_names:
         protected_names.update(additional_protected_names)
         
-    # 2. [核心新增] 将模糊匹配的关键词转换为小写，用于进行 IN 检查
-    lower_fuzzy_keywords = [kw.lower() for kw in FUZZY_PROTECTED_KEYWORDS] #
-
-    # 将关键词转为小写，以便进行不区分大小写的匹配
-    lower_keyword_list = [kw.strip().lower() for kw in keyword_list if kw.strip()]
-    if not lower_keyword_list:
+    # 2. [2026-10-19] 修改: 分类规则 (保护文件夹 + 日期 + 第一个命中的关键词) 由规则引擎按列批量求值，
+    #    在任何 I/O 之前生成完整的移动计划表
+    if not [kw for kw in keyword_list if kw.strip()]:
         print("分类关键词列表为空，将全部移动到日期/未分类文件夹。")
-        
-    for i, data in enumerate(image_data):
-        current_image_path = data["图片的绝对路径"]
-        image_dir = os.path.dirname(current_image_path) # 当前图片所在的文件夹
-        image_dir_name = os.path.basename(image_dir) # 当前图片所在文件夹的名称
-        image_filename = os.path.basename(current_image_path)
-        image_dir_name_lower = image_dir_name.lower() # [新增] 文件夹名称小写，用于模糊匹配
-
-        # [新增] 初始日志记录 (在跳过前记录，方便追踪)
+    move_plan = build_move_plan(
+        image_data,
+        keyword_list,
+        root_dir,
+        protected_names=protected_names,
+        fuzzy_keywords=FUZZY_PROTECTED_KEYWORDS,
+        protected_folders=protected_folders,
+    )
+    print(f"分类计划已生成: {move_plan['动作'].value_counts().to_dict()}")
+
+    # 3. 需要移动的图片: 在内存中规划 (N) 冲突后缀 (与 get_unique_filename 规则一致)，再批量执行
+    #    (预写日志 + 按源文件夹并行，目标文件夹每个只创建一次)
+    move_rows = move_plan.index[move_plan["动作"] == ACTION_MOVE]
+    rename_plan = plan_renames(
+        zip(move_plan.loc[move_rows, "初始绝对路径"], move_plan.loc[move_rows, "理想目标路径"]),
+        on_conflict=CONFLICT_SUFFIX,
+        fs=fs,
+    )
+    execute_rename_plan(rename_plan, fs=fs)
+    operation_by_row = dict(zip(move_rows, rename_plan))
+
+    # [2026-10-19] 新增: 有文件移出的原文件夹计数器 (用于最后统一清理)
+    moved_out_counter: Counter = Counter()
+
+    # 4. 按原顺序生成操作日志
+    for i, row in enumerate(move_plan.itertuples(index=False)):
+        image_filename = row.图片文件名
+        current_image_path = row.初始绝对路径
+        date_dir_name = row.创建日期目录
+        target_keyword = row.匹配关键词
+        is_classified = isinstance(target_keyword, str)
+
+        # [新增] 初始日志记录
         log_entry: Dict[str, str] = {
             "图片文件名": image_filename,
             "初始绝对路径": current_image_path,
@@ -241,119 +375,51 @@ def categorize_images(
             "状态类型": "未处理 (初始化)", 
         }
 
-
-        # [2025-10-29 核心修改] 安全检查 (按文件夹名称跳过): 
-        # 优先级 1: 完整名称匹配
-        if image_dir_name in protected_names:
-            log_error(f"【安全跳过】文件 '{image_filename}' 位于名称受保护文件夹 (完整匹配) '{image_dir_name}'。跳过分类和移动。")
-            log_entry["状态类型"] = "安全跳过 (保护路径)" # 统一标记安全跳过
-            classification_log.append(log_entry) # 记录日志
-            continue # 跳过当前文件的处理
-        
-        # 优先级 2: 模糊关键词匹配
-        # 检查文件夹名称是否包含任何模糊保护关键词
-        if any(keyword in image_dir_name_lower for keyword in lower_fuzzy_keywords): #
-            log_error(f"【安全跳过】文件 '{image_filename}' 位于名称受保护文件夹 (模糊匹配) '{image_dir_name}'。跳过分类和移动。")
-            log_entry["状态类型"] = "安全跳过 (保护路径)" # 统一标记安全跳过
-            classification_log.append(log_entry) # 记录日志
-            continue # 跳过当前文件的处理
-
-        # [2025-10-28] 原有安全检查 (按文件夹绝对路径跳过): 
-        image_dir_abs = os.path.abspath(image_dir)
-        if protected_folders and image_dir_abs in protected_folders:
-            # 记录 log_error 方便调试
-            log_error(f"【安全跳过】文件 '{image_filename}' 位于绝对路径受保护文件夹 '{image_dir_abs}'。跳过分类和移动。")
+        # [2025-10-29 核心修改] 安全检查 (按文件夹名称/模糊关键词/绝对路径跳过)
+        if row.动作 == ACTION_PROTECTED:
+            if row.保护规则 == PROTECT_BY_PATH:
+                log_error(f"【安全跳过】文件 '{image_filename}' 位于绝对路径受保护文件夹 '{os.path.abspath(row.所在文件夹)}'。跳过分类和移动。",
+                          file=current_image_path, level=LEVEL_WARNING)
+            else:
+                rule_desc = "完整匹配" if row.保护规则 == PROTECT_BY_NAME else "模糊匹配"
+                log_error(f"【安全跳过】文件 '{image_filename}' 位于名称受保护文件夹 ({rule_desc}) '{os.path.basename(row.所在文件夹)}'。跳过分类和移动。",
+                          file=current_image_path, level=LEVEL_WARNING)
             log_entry["状态类型"] = "安全跳过 (保护路径)" # 统一标记安全跳过
             classification_log.append(log_entry) # 记录日志
             continue # 跳过当前文件的处理
-        
-        # 1. 第一级分类：确定日期文件夹 (YYYY-MM-DD 或 未获取日期)
-        date_dir_name = data.get("创建日期目录", "未获取日期")
-        date_folder = os.path.join(root_dir, date_dir_name) # 第一级目录路径
-
-        # 2. 第二级分类：确定关键词分类结果
-        positive_prompt = data.get("正面提示词", "").lower()
-        negative_prompt = data.get("负面提示词", "").lower()
-        all_prompts = f"{positive_prompt} {negative_prompt}"
-        
-        target_keyword = None
-        is_classified = False
-        
-        # 优先级匹配：严格按照 keyword_list 的顺序
-        for keyword in lower_keyword_list:
-            if keyword in all_prompts:
-                # 找到匹配，确定目标关键词（使用原始大小写）
-                original_keyword = keyword_list[lower_keyword_list.index(keyword)] 
-                target_keyword = original_keyword
-                is_classified = True
-                break
-        
-        # 3. 确定最终目标文件夹 (第二级目录)
-        target_sub_folder = None
-        if is_classified:
-            target_sub_folder = target_keyword # 关键词文件夹
-        else:
-            target_sub_folder = "未分类" # 未匹配则归入未分类
-
-        # 最终目标路径：根目录 / 日期目录 / 关键词或未分类目录
-        target_folder = os.path.join(date_folder, target_sub_folder) 
 
-        # 4. 确定理想目标路径 (不进行冲突解决)
-        # 理想目标路径：根目录 / 日期目录 / 关键词或未分类目录 / 文件名
-        ideal_target_path = os.path.join(target_folder, image_filename) # 【新增】计算理想路径
-        
-        # 5. 【核心I/O优化】检查当前位置是否等于理想目标位置 (Idempotency Check)
-        # 如果文件已经位于正确的目标文件夹，并且文件名是理想的文件名（未添加 (N)）
-        if current_image_path == ideal_target_path:
-            # 如果目标路径和当前路径相同，则无需移动，跳过I/O操作
+        # 5. 【核心I/O优化】文件已经位于正确的目标文件夹，并且文件名是理想的文件名（未添加 (N)）
+        if row.动作 == ACTION_SKIP_SAME:
             if is_classified:
                 log_entry["状态类型"] = "因路径相同而跳过I/O (已在关键词目录)"
-                print(f"无需移动 ({i+1}/{total_images}): '{image_filename}' 已位于目标位置 '{date_dir_name}/{target_keyword}'。")
+                log_info(f"无需移动 ({i+1}/{total_images}): '{image_filename}' 已位于目标位置 '{date_dir_name}/{target_keyword}'。", file=current_image_path)
             else:
                 log_entry["状态类型"] = "因路径相同而跳过I/O (已在未分类目录)"
-                print(f"无需移动 ({i+1}/{total_images}): '{image_filename}' 已位于目标位置 '{date_dir_name}/未分类'。")
+                log_info(f"无需移动 ({i+1}/{total_images}): '{image_filename}' 已位于目标位置 '{date_dir_name}/未分类'。", file=current_image_path)
             
             classification_log.append(log_entry) # 记录日志
             continue # 跳到下一个文件
-            
-        # 6. 确定最终目标路径 (执行冲突解决)
-        # 只有在不匹配理想目标路径时，才执行冲突解决
-        # 使用 get_unique_filename 检查分类目标文件夹是否存在同名文件，避免冲突
-        unique_filename = get_unique_filename(target_folder, image_filename) 
-        new_image_path = os.path.join(target_folder, unique_filename)
 
-        # 7. 移动操作 (当且仅当目标路径和当前路径不一致时才执行)
-        try:
-            # 创建目标子文件夹 (包括日期文件夹和关键词/未分类文件夹)
-            if not os.path.exists(target_folder):
-                os.makedirs(target_folder)
-            
-            # 执行重命名/移动
-            os.rename(current_image_path, new_image_path)
-            
-            # 统计和日志
+        # 6. 移动结果
+        op = operation_by_row[i] # 计划表使用 0..n-1 的默认索引
+        if op.status == STATUS_DONE:
             if is_classified:
                 log_entry["状态类型"] = "成功分类到关键词目录"
-                print(f"成功分类 ({i+1}/{total_images}): '{image_filename}' -> '{date_dir_name}/{target_keyword}'")
+                log_info(f"成功分类 ({i+1}/{total_images}): '{image_filename}' -> '{date_dir_name}/{target_keyword}'", file=current_image_path)
             else: 
                 log_entry["状态类型"] = "成功移入/保留在 '未分类' 目录"
-                print(f"移入未分类 ({i+1}/{total_images}): '{image_filename}' -> '{date_dir_name}/未分类'")
-                
+                log_info(f"移入未分类 ({i+1}/{total_images}): '{image_filename}' -> '{date_dir_name}/未分类'", file=current_image_path)
             classification_log.append(log_entry) # 记录成功移动的日志
-                
-            # 8. 清理空闲原文件夹
-            # 只要原文件夹不是最顶层的主文件夹 (root_dir)，且移动后变空，就尝试清理
-            if os.path.abspath(image_dir) != root_dir and not os.listdir(image_dir): # 使用 os.path.abspath 确保比较的是同一路径
-                try:
-                    os.rmdir(image_dir)
-                    print(f"清理空文件夹: {image_dir}")
-                except OSError as e:
-                    log_error(f"警告: 无法清理空文件夹 '{image_dir}'，可能仍有隐藏文件。错误: {e}")
-                
-        except Exception as e:
-            log_entry["状态类型"] = f"移动失败/其他异常: {e}" # 统一失败状态
+            # 只记录有文件移出的原文件夹，全部移动完成后统一清理空文件夹
+            moved_out_counter[os.path.abspath(row.所在文件夹)] += 1
+        else:
+            error = op.error if op.status == STATUS_FAILED else "文件不存在"
+            log_entry["状态类型"] = f"移动失败/其他异常: {error}" # 统一失败状态
             classification_log.append(log_entry)
-            log_error(f"分类/移动文件 '{current_image_path}' 时发生错误: {e}")
+            log_error(f"分类/移动文件 '{current_image_path}' 时发生错误: {error}", file=current_image_path)
+
+    # 7. [2026-10-19] 新增: 统一清理移动后变空的原文件夹 (自底向上，每个文件夹只检查一次)
+    remove_empty_source_dirs(moved_out_counter, root_dir, fs=fs)
 
     # [替换] 最终统计日志：从生成的 classification_log 中计算
     if classification_log:
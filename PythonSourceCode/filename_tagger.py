@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
 import os
 import re
+from functools import lru_cache
 from typing import List, Dict, Any
+from virtual_fs import REAL_FS # [2026-10-19] 新增: 文件系统抽象 (支持内存中模拟运行)
+from keyword_matcher import get_keyword_matcher # [2026-10-19] 新增: 共享的多关键词匹配器
+# [2026-10-19] 新增: 先规划、后执行的批量重命名引擎
+from rename_planner import (
+    plan_renames, execute_rename_plan, CONFLICT_SKIP,
+    STATUS_SKIP_SAME, STATUS_SKIP_CONFLICT, STATUS_MISSING, STATUS_DONE, STATUS_FAILED,
+)
 
 # [2025-10-28] 新增: 用于文件名标记的关键词列表 (已从 getIMGINFOandClassify.py 分离)
 TAGGING_KEYWORDS: List[str] = [
@@ -16,6 +24,9 @@ TAGGING_KEYWORDS: List[str] = [
     "no_pants"           # 没穿裤子
 ]
 
+# [2026-10-19] 新增: 评分标记前缀 (与 image_scorer_supervised.ScorerConfig.SCORE_PREFIX 保持一致)
+SCORE_PREFIX = "@@@评分"
+
 def get_unique_filename(target_dir, filename):
     """
     根据目标文件夹和文件名，生成一个不冲突的唯一文件名。
@@ -78,15 +89,58 @@ def _parse_base_filename(filename: str, tag_delimiter: str = "___") -> tuple[str
     # 如果没有找到匹配的标签后缀，则返回原文件名（不含扩展名）
     return base, ext
 
-def tag_files_by_prompt(image_data: List[Dict[str, Any]], keyword_list: List[str], tag_delimiter: str = "___", tfidf_suffix_col: str = None) -> List[Dict[str, Any]]:
+def parse_score_value(score: Any) -> int | None:
+    """
+    [2026-10-19] 新增: 把评分列的值转换为整数，缺失或无效 (None/NaN/非数字) 时返回 None。
+    """
+    try:
+        return int(score)
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=None)
+def _score_tag_pattern(score_prefix: str) -> re.Pattern:
+    """[2026-10-19] 新增: 匹配基础名末尾评分标记的正则 (每个前缀只编译一次)。"""
+    return re.compile(rf'{re.escape(score_prefix)}\d+$', re.IGNORECASE)
+
+
+def compose_score_tagged_base_name(base_name: str, score_value: int, score_prefix: str = SCORE_PREFIX) -> str:
+    """
+    [2026-10-19] 新增: 在基础文件名 (不含扩展名) 末尾写入评分标记 '@@@评分{分数}'，并移除旧的评分标记。
+
+    :param base_name: 不含扩展名的文件名 (可以已包含标签后缀)。
+    :param score_value: 整数评分。
+    :param score_prefix: 评分标记前缀。
+    :return: 新的基础文件名。
+    """
+    cleaned_base_name = _score_tag_pattern(score_prefix).sub('', base_name).strip().rstrip('_')
+    return f"{cleaned_base_name}{score_prefix}{score_value}"
+
+
+def tag_files_by_prompt(
+    image_data: List[Dict[str, Any]],
+    keyword_list: List[str],
+    tag_delimiter: str = "___",
+    tfidf_suffix_col: str = None,
+    score_col: str = None,
+    score_prefix: str = SCORE_PREFIX,
+    fs=REAL_FS,
+) -> List[Dict[str, Any]]:
     """
     增强功能：根据提示词匹配关键词，给文件添加或更新 '___tag1___tag2' 后缀，
     并**附加** TF-IDF 分析得到的关键词后缀。
 
+    [2026-10-19] 新增: 传入 score_col 时，评分标记 '@@@评分N' 也在同一次重命名中写入
+    (最终文件名 = 基础名 + 自定义tag + TF-IDF tag + 评分tag)，每个文件只重命名一次。
+
     :param image_data: 包含图片信息的列表。
     :param keyword_list: 用于匹配的关键词列表（按顺序）。
     :param tag_delimiter: 用于分隔 tag 的字符串，默认为 "___"。
     :param tfidf_suffix_col: 包含预先计算的 TF-IDF 后缀字符串的列名 (如 'TF-IDF文件名后缀')。
+    :param score_col: [2026-10-19 新增] 包含预估评分的列名 (如 '个性化推荐预估评分')，None 表示不写评分标记。
+    :param score_prefix: [2026-10-19 新增] 评分标记前缀，默认 '@@@评分'。
+    :param fs: [2026-10-19 新增] 文件系统 (REAL_FS 或 virtual_fs.VirtualFileSystem，后者只在内存中模拟重命名)。
     :return: 更新后的 image_data 列表。
     """
     # ⚠️ 错误处理简化：由于 log_error 是外部函数，在此独立模块中用 print 代替
@@ -99,6 +153,10 @@ def tag_files_by_prompt(image_data: List[Dict[str, Any]], keyword_list: List[str
     tfidf_suffix_enabled = tfidf_suffix_col and image_data and tfidf_suffix_col in image_data[0]
     if tfidf_suffix_enabled:
         print(f"文件名标记将额外附加来自列 '{tfidf_suffix_col}' 的 TF-IDF 后缀。")
+    # [2026-10-19] 新增: 检查评分列是否启用
+    score_tag_enabled = score_col and image_data and score_col in image_data[0]
+    if score_tag_enabled:
+        print(f"文件名标记将在末尾写入来自列 '{score_col}' 的评分标记 '{score_prefix}N' (单次重命名)。")
     print(f"当前文件名标记关键词列表: {keyword_list} (定界符: {tag_delimiter} )")
     
     if not image_data:
@@ -108,31 +166,18 @@ def tag_files_by_prompt(image_data: List[Dict[str, Any]], keyword_list: List[str
     total_images = len(image_data)
     renamed_count = 0
     
-    # 转换为小写，方便不区分大小写的匹配
-    lower_keyword_list = [kw.strip().lower() for kw in keyword_list if kw.strip()]
+    # [2026-10-19] 修改: 关键词只编译一次，整列提示词批量匹配 (小写化、消除WebUI转义符(\)都在匹配器内完成)
+    matcher = get_keyword_matcher(keyword_list, strip_backslash=True)
+    all_matched_tags = matcher.match_column(matcher.build_prompt_texts(image_data))
+    rename_requests = [] # (当前路径, 新路径)，与 image_data 一一对应
     
     for i, data in enumerate(image_data):
         current_image_path = data["图片的绝对路径"]
         image_dir = os.path.dirname(current_image_path)
         image_filename = os.path.basename(current_image_path)
         
-        # 提示词预处理
-        positive_prompt = data.get("正面提示词", "").lower()
-        negative_prompt = data.get("负面提示词", "").lower()
-        
-        # 消除WebUI可能自动添加的转义符 (\)
-        positive_prompt_clean = positive_prompt.replace("\\", "")
-        negative_prompt_clean = negative_prompt.replace("\\", "")
-        
-        all_prompts = f"{positive_prompt_clean} {negative_prompt_clean}"
-        
-        matched_tags = []
-        # 1. 严格按顺序匹配关键词 (非 TF-IDF 关键词)
-        for keyword in lower_keyword_list:
-            # 使用原始大小写的关键词作为最终 tag
-            original_keyword = keyword_list[lower_keyword_list.index(keyword)] 
-            if keyword in all_prompts:
-                matched_tags.append(original_keyword)
+        # 1. 严格按顺序匹配关键词 (非 TF-IDF 关键词)，使用原始大小写的关键词作为最终 tag
+        matched_tags = all_matched_tags[i]
         
         # 2. 构建提示词匹配关键词的后缀 tag 字符串
         tag_suffix = ""
@@ -155,33 +200,45 @@ def tag_files_by_prompt(image_data: List[Dict[str, Any]], keyword_list: List[str
         
         # 6. 确定新的完整文件名 (使用干净的基础名 + 最终后缀)
         new_base_name = base_name_without_tags + final_suffix # 核心文件名 + 最终后缀
+        score_value = parse_score_value(data.get(score_col)) if score_tag_enabled else None
+        if score_value is not None:
+            # [2026-10-19] 新增: 先移除基础名中残留的旧评分标记，再在最末尾写入新评分标记
+            new_base_name = compose_score_tagged_base_name(
+                _score_tag_pattern(score_prefix).sub('', base_name_without_tags) + final_suffix,
+                score_value,
+                score_prefix,
+            )
         new_filename = new_base_name + ext
         new_image_path = os.path.join(image_dir, new_filename)
 
-        # 7. 【幂等性保护机制】检查是否已经等于目标文件名
-        if current_image_path == new_image_path:
-             print(f"无需标记 ({i+1}/{total_images}): '{image_filename}' 标签已精确匹配，跳过重命名。")
-             continue 
-        
-        # 8. 执行重命名操作
-        try:
-            if os.path.exists(new_image_path):
-                # 目标文件名已存在，可能是手动改名或罕见冲突
-                simple_error_log(f"警告: 目标文件名 '{new_filename}' 已存在，跳过重命名以避免冲突。")
-                continue
-            
-            os.rename(current_image_path, new_image_path)
-            
-            # 9. 更新 image_data 中的路径信息
-            data["图片的绝对路径"] = new_image_path
-            data["图片超链接"] = f'={new_image_path}'
-            
+        # 7. [2026-10-19] 修改: 只记录重命名请求，全部计算完成后统一规划和执行
+        rename_requests.append((current_image_path, new_image_path))
+
+    # 8. 【幂等性保护 + 冲突检查】在内存中规划 (每个目录只列举一次)，目标已存在则跳过以避免冲突
+    plan = plan_renames(rename_requests, on_conflict=CONFLICT_SKIP, fs=fs)
+    for op in plan:
+        if op.status == STATUS_SKIP_CONFLICT:
+            # 目标文件名已存在，可能是手动改名或罕见冲突
+            simple_error_log(f"警告: 目标文件名 '{os.path.basename(op.target)}' 已存在，跳过重命名以避免冲突。")
+        elif op.status == STATUS_MISSING:
+            simple_error_log(f"重命名文件 '{op.source}' 时发生错误: 文件不存在。")
+
+    # 9. 批量执行 (预写日志 + 按目录并行)
+    execute_rename_plan(plan, fs=fs)
+
+    for i, (data, op) in enumerate(zip(image_data, plan)):
+        image_filename = os.path.basename(op.source)
+        if op.status == STATUS_SKIP_SAME:
+            print(f"无需标记 ({i+1}/{total_images}): '{image_filename}' 标签已精确匹配，跳过重命名。")
+        elif op.status == STATUS_DONE:
+            # 10. 更新 image_data 中的路径信息
+            data["图片的绝对路径"] = op.target
+            data["图片超链接"] = f'={op.target}'
             renamed_count += 1
             # 日志输出
-            print(f"成功标记/更新 ({i+1}/{total_images}): '{image_filename}' -> '{new_filename}'")
-            
-        except Exception as e:
-            simple_error_log(f"重命名文件 '{current_image_path}' 时发生错误: {e}")
+            print(f"成功标记/更新 ({i+1}/{total_images}): '{image_filename}' -> '{os.path.basename(op.target)}'")
+        elif op.status == STATUS_FAILED:
+            simple_error_log(f"重命名文件 '{op.source}' 时发生错误: {op.error}")
 
     print(f"\n文件名标记操作完成。总共处理图片 {total_images} 张，成功重命名 {renamed_count} 张。")
     return image_data
\ No newline at end of file
@@ -1,13 +1,11 @@
 # -*- coding: utf-8 -*-
+from __future__ import annotations # [2026-10-19] 新增: 类型注解延迟求值 (pd 等在 load_pipeline_modules 中才导入)
 import os
-import pandas as pd
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, Color
 import subprocess
 from datetime import datetime
 from typing import List, Dict, Any, Union 
 import re 
-from tqdm import tqdm 
+import metrics_exporter # [2026-10-19] 新增: 实时吞吐指标 (只依赖标准库)
 # import shutil # 移除非必要的导入，遵循难度等级1
 # TODO tag的相关性分析
 # TODO tag的统计分析
@@ -38,75 +36,171 @@ from tqdm import tqdm
 
 
 
-# [2025-10-28] 新增: 导入图片扫描和元数据提取模块
-try:
-    # 导入核心扫描函数和日志函数
-    from image_scanner import get_image_info, log_error
-except ImportError:
-    print("严重警告: 找不到核心功能模块 'image_scanner.py'。程序无法运行。")
-    # 定义占位函数，确保主程序可以安全退出
-    def log_error(message: str):
-        print(f"[CRITICAL ERROR] image_scanner.py 缺失。{message}")
-    def get_image_info(folder_path: str):
-        print("[CRITICAL ERROR] image_scanner.py 缺失，无法扫描图片。")
-        return []
-
-# [2025-10-27] 新增: 导入 TF-IDF 核心功能
-# 假设 tfidf_processor.py 文件存在于同一目录下
-try:
-    # 新增: 导入 format_tfidf_tags_for_filename 函数，用于生成文件后缀
-    from tfidf_processor import preprocess_tags, calculate_and_extract_tfidf, format_tfidf_tags_for_filename
-    # 配置 TF-IDF (注意：未来应从 tfidf_processor 导入这些常量以实现统一)
-    TFIDF_NEW_COLUMN_NAME = 'TF-IDF区分度关键词(Top 10)'
-    TFIDF_TOP_N_FEATURES = 10 
-    TFIDF_TARGET_COLUMN = '提取正向词的核心词'
-    TFIDF_SUFFIX_COLUMN = 'TF-IDF文件名后缀' # 新增: 用于存储 TF-IDF 后缀的临时列名
-except ImportError:
-    print("警告: 找不到核心功能模块 'tfidf_processor.py'。TF-IDF 分析功能将被跳过。")
-    # 定义占位函数和配置，避免程序崩溃
-    TFIDF_NEW_COLUMN_NAME = 'TF-IDF区分度关键词(Top 10)'
-    TFIDF_TOP_N_FEATURES = 10
-    TFIDF_TARGET_COLUMN = '提取正向词的核心词'
-    TFIDF_SUFFIX_COLUMN = 'TF-IDF文件名后缀'
-    def preprocess_tags(tags_series): return [], tags_series 
-    def calculate_and_extract_tfidf(df, corpus, cleaned_tags_series, top_n): return ["TF-IDF模块缺失"] * len(df), [[]] * len(df)
-    def format_tfidf_tags_for_filename(tag_list, tag_delimiter="___"): return ""
-# [2025-10-27] End TF-IDF 导入
-
-# [2025-10-28] 新增: 导入文件名处理功能模块
-try:
-    # 导入文件名标记的核心函数和 TAGGING_KEYWORDS 常量
-    from filename_tagger import tag_files_by_prompt, TAGGING_KEYWORDS 
-except ImportError:
-    print("警告: 找不到核心功能模块 'filename_tagger.py'。文件名标记功能将受限或失败。")
-    # 定义占位函数和常量，避免程序崩溃
-    def tag_files_by_prompt(image_data: List[Dict[str, Any]], keyword_list: List[str], tag_delimiter: str = "___", tfidf_suffix_col: str = None) -> List[Dict[str, Any]]:
-        print("[ERROR] filename_tagger.py 缺失，跳过文件名标记。")
-        return image_data
-    TAGGING_KEYWORDS = [] # 占位空列表
-# [2025-10-28] End filename_tagger 导入
-
-# [2025-10-28] 新增: 导入文件分类和归档功能模块
-try:
-    # 导入文件分类和归档的核心函数
-    from file_categorizer import categorize_images, archive_date_folders 
-except ImportError:
-    print("警告: 找不到核心功能模块 'file_categorizer.py'。文件分类和归档功能将被跳过。")
-    # 定义占位函数，避免程序崩溃
-    def categorize_images(image_data: List[Dict[str, Any]], keyword_list: List[str], root_dir_path: str):
-        print("[ERROR] file_categorizer.py 缺失，跳过文件分类。")
-    def archive_date_folders(base_source_dir: str, archive_target_dir: str):
-        print("[ERROR] file_categorizer.py 缺失，跳过日期文件夹归档。")
-# [2025-10-28] End file_categorizer 导入
-
-# [2025-10-27] 新增: 导入 image_scorer_supervised 模块，用于添加评分列
-try:
-    from image_scorer_supervised import ScorerConfig, ImageScorer
-    SCORER_MODULE_LOADED = True
-except ImportError as e: # 捕获 ImportError 及其细节
-    print(f"警告: 找不到核心功能模块 'image_scorer_supervised.py' 或其依赖项。个性化推荐评分功能将被跳过。错误: {e}")
-    SCORER_MODULE_LOADED = False
-# [2025-10-27] End image_scorer_supervised 导入
+# [2026-10-19] 修改: 耗时的导入 (pandas、openpyxl、PIL、scikit-learn、loguru 等) 延迟到 load_pipeline_modules()，
+# 菜单在导入这些模块之前显示，选择 "4. 退出程序" 不再需要等待；
+# Windows 的 spawn 模式下扫描子进程会重新导入本模块，现在子进程只导入 process_single_image 需要的 image_scanner。
+_PIPELINE_MODULES_LOADED = False
+
+
+def load_pipeline_modules():
+    """
+    [2026-10-19] 新增: 导入各功能模块 (只执行一次)。交互流程在选择操作后调用，pipeline_runner 在构建流水线前调用。
+    模块缺失时与原来一样使用占位函数/标志。
+    """
+    global _PIPELINE_MODULES_LOADED
+    global pd, get_column_letter, Font, Color
+    global get_image_info, log_error, SCAN_RESULT_COLUMNS
+    global preprocess_tags, calculate_and_extract_tfidf, format_tfidf_tags_for_filename
+    global TFIDF_NEW_COLUMN_NAME, TFIDF_TOP_N_FEATURES, TFIDF_TARGET_COLUMN, TFIDF_SUFFIX_COLUMN
+    global tag_files_by_prompt, TAGGING_KEYWORDS, categorize_images, archive_date_folders
+    global ScorerConfig, ImageScorer, SCORER_MODULE_LOADED
+    global write_report_streaming, EXCEL_MAX_DATA_ROWS, REPORT_WRITER_LOADED
+    global ReportStore, REPORT_STORE_FILE, make_cell_pointer, REPORT_STORE_LOADED
+    global find_exact_duplicates, duplicate_sheet_records, print_duplicate_summary, DUPLICATE_SHEET_NAME, DUPLICATE_COLUMNS, DUPLICATE_FINDER_LOADED
+    global find_near_duplicates, near_duplicate_sheet_records, print_near_duplicate_summary, NEAR_DUPLICATE_SHEET_NAME, NEAR_DUPLICATE_COLUMNS
+    global PERCEPTUAL_HASH_LOADED
+    if _PIPELINE_MODULES_LOADED:
+        return
+    _PIPELINE_MODULES_LOADED = True
+
+    import pandas as pd
+    from openpyxl.utils import get_column_letter
+    from openpyxl.styles import Font, Color
+
+    # [2025-10-28] 新增: 导入图片扫描和元数据提取模块
+    try:
+        # 导入核心扫描函数和日志函数
+        from image_scanner import get_image_info, log_error, SCAN_RESULT_COLUMNS
+    except ImportError:
+        print("严重警告: 找不到核心功能模块 'image_scanner.py'。程序无法运行。")
+        # 定义占位函数，确保主程序可以安全退出
+        def log_error(message: str):
+            print(f"[CRITICAL ERROR] image_scanner.py 缺失。{message}")
+        def get_image_info(folder_path: str, scan_cache=None):
+            print("[CRITICAL ERROR] image_scanner.py 缺失，无法扫描图片。")
+            return []
+        SCAN_RESULT_COLUMNS = []
+
+    # [2025-10-27] 新增: 导入 TF-IDF 核心功能
+    # 假设 tfidf_processor.py 文件存在于同一目录下
+    try:
+        # 新增: 导入 format_tfidf_tags_for_filename 函数，用于生成文件后缀
+        from tfidf_processor import preprocess_tags, calculate_and_extract_tfidf, format_tfidf_tags_for_filename
+        # 配置 TF-IDF (注意：未来应从 tfidf_processor 导入这些常量以实现统一)
+        TFIDF_NEW_COLUMN_NAME = 'TF-IDF区分度关键词(Top 10)'
+        TFIDF_TOP_N_FEATURES = 10 
+        TFIDF_TARGET_COLUMN = '提取正向词的核心词'
+        TFIDF_SUFFIX_COLUMN = 'TF-IDF文件名后缀' # 新增: 用于存储 TF-IDF 后缀的临时列名
+    except ImportError:
+        print("警告: 找不到核心功能模块 'tfidf_processor.py'。TF-IDF 分析功能将被跳过。")
+        # 定义占位函数和配置，避免程序崩溃
+        TFIDF_NEW_COLUMN_NAME = 'TF-IDF区分度关键词(Top 10)'
+        TFIDF_TOP_N_FEATURES = 10
+        TFIDF_TARGET_COLUMN = '提取正向词的核心词'
+        TFIDF_SUFFIX_COLUMN = 'TF-IDF文件名后缀'
+        def preprocess_tags(tags_series): return [], tags_series 
+        def calculate_and_extract_tfidf(df, corpus, cleaned_tags_series, top_n): return ["TF-IDF模块缺失"] * len(df), [[]] * len(df)
+        def format_tfidf_tags_for_filename(tag_list, tag_delimiter="___"): return ""
+    # [2025-10-27] End TF-IDF 导入
+
+    # [2025-10-28] 新增: 导入文件名处理功能模块
+    try:
+        # 导入文件名标记的核心函数和 TAGGING_KEYWORDS 常量
+        from filename_tagger import tag_files_by_prompt, TAGGING_KEYWORDS 
+    except ImportError:
+        print("警告: 找不到核心功能模块 'filename_tagger.py'。文件名标记功能将受限或失败。")
+        # 定义占位函数和常量，避免程序崩溃
+        def tag_files_by_prompt(image_data: List[Dict[str, Any]], keyword_list: List[str], tag_delimiter: str = "___", tfidf_suffix_col: str = None, score_col: str = None) -> List[Dict[str, Any]]:
+            print("[ERROR] filename_tagger.py 缺失，跳过文件名标记。")
+            return image_data
+        TAGGING_KEYWORDS = [] # 占位空列表
+    # [2025-10-28] End filename_tagger 导入
+
+    # [2025-10-28] 新增: 导入文件分类和归档功能模块
+    try:
+        # 导入文件分类和归档的核心函数
+        from file_categorizer import categorize_images, archive_date_folders 
+    except ImportError:
+        print("警告: 找不到核心功能模块 'file_categorizer.py'。文件分类和归档功能将被跳过。")
+        # 定义占位函数，避免程序崩溃
+        def categorize_images(image_data: List[Dict[str, Any]], keyword_list: List[str], root_dir_path: str):
+            print("[ERROR] file_categorizer.py 缺失，跳过文件分类。")
+        def archive_date_folders(base_source_dir: str, archive_target_dir: str):
+            print("[ERROR] file_categorizer.py 缺失，跳过日期文件夹归档。")
+    # [2025-10-28] End file_categorizer 导入
+
+    # [2025-10-27] 新增: 导入 image_scorer_supervised 模块，用于添加评分列
+    try:
+        from image_scorer_supervised import ScorerConfig, ImageScorer
+        SCORER_MODULE_LOADED = True
+    except ImportError as e: # 捕获 ImportError 及其细节
+        print(f"警告: 找不到核心功能模块 'image_scorer_supervised.py' 或其依赖项。个性化推荐评分功能将被跳过。错误: {e}")
+        SCORER_MODULE_LOADED = False
+    # [2025-10-27] End image_scorer_supervised 导入
+
+    # [2026-10-19] 新增: 导入流式 Excel 报告写入模块 (恒定内存)
+    try:
+        from report_writer import write_report_streaming, EXCEL_MAX_DATA_ROWS
+        REPORT_WRITER_LOADED = True
+    except ImportError as e:
+        print(f"警告: 找不到模块 'report_writer.py'。报告将使用 pandas 在内存中生成。错误: {e}")
+        REPORT_WRITER_LOADED = False
+    # [2026-10-19] End report_writer 导入
+
+    # [2026-10-19] 新增: 导入报告数据库模块 (报告的主存储，Excel 只是可选导出)
+    try:
+        from report_store import ReportStore, REPORT_STORE_FILE, make_cell_pointer
+        REPORT_STORE_LOADED = True
+    except ImportError as e:
+        print(f"警告: 找不到模块 'report_store.py'。报告只保存为 Excel。错误: {e}")
+        REPORT_STORE_LOADED = False
+    # [2026-10-19] End report_store 导入
+
+    # [2026-10-19] 新增: 导入完全重复文件查找模块
+    try:
+        from duplicate_finder import (
+            find_exact_duplicates, duplicate_sheet_records, print_duplicate_summary, DUPLICATE_SHEET_NAME, DUPLICATE_COLUMNS,
+        )
+        DUPLICATE_FINDER_LOADED = True
+    except ImportError as e:
+        print(f"警告: 找不到模块 'duplicate_finder.py'。重复文件查找将被跳过。错误: {e}")
+        DUPLICATE_FINDER_LOADED = False
+    # [2026-10-19] End duplicate_finder 导入
+
+    # [2026-10-19] 新增: 导入感知哈希近似重复查找模块
+    try:
+        from perceptual_hash import (
+            find_near_duplicates, near_duplicate_sheet_records, print_near_duplicate_summary,
+            NEAR_DUPLICATE_SHEET_NAME, NEAR_DUPLICATE_COLUMNS,
+        )
+        PERCEPTUAL_HASH_LOADED = True
+    except ImportError as e:
+        print(f"警告: 找不到模块 'perceptual_hash.py' 或其依赖项。近似重复查找将被跳过。错误: {e}")
+        PERCEPTUAL_HASH_LOADED = False
+    # [2026-10-19] End perceptual_hash 导入
+
+
+# 保存报告数据库后是否同时导出 Excel 报告 (关闭后只更新数据库，不生成 xlsx)
+EXPORT_EXCEL_REPORT = True
+# [2026-10-19] 新增: 报告分片方式 (None: 只在超过 Excel 行数上限时按行数分片；"rows": 按行数；"date": 按创建日期目录)
+REPORT_SHARD_BY = None
+# [2026-10-19] 新增: 增量报告模式。按图片路径与报告数据库比较，只写入新增/变化/删除的行，
+# Excel 只导出本次的变更 (图片信息报告_变更_<时间>.xlsx)；扫描时复用未变化图片的元数据
+INCREMENTAL_REPORT = False
+# [2026-10-19] 新增: 实时吞吐指标输出 (None 为不输出)。Prometheus 文本文件应放在 node-exporter 的 textfile 目录下，
+# 例如 "C:/node_exporter/textfile/image_analyzer.prom"；JSON Lines 日志例如 "image_analyzer_metrics.jsonl"
+METRICS_TEXTFILE = None
+METRICS_JSONL = None
+# [2026-10-19] 新增: 生成报告时查找内容完全相同的文件 (按大小 -> 首尾块哈希 -> 完整哈希逐级过滤，哈希缓存在
+# 图片哈希缓存.sqlite)，结果作为报告的 '重复文件' 工作表；增量/分片报告写入单独的 图片信息报告_重复文件_<时间>.xlsx
+FIND_DUPLICATES = False
+# [2026-10-19] 新增: 用感知哈希 (dHash/pHash) 查找近似重复的图片 (PNG 转换为 WebP/JPEG 后的副本等)，
+# 结果作为 '近似重复' 工作表；NEAR_DUPLICATE_DISTANCE 为 64 位哈希的汉明距离阈值
+FIND_NEAR_DUPLICATES = False
+NEAR_DUPLICATE_DISTANCE = 6
+
+# [2026-10-19] 新增: 默认分类关键词 (用于分类文件夹，不是用于文件名标记)，交互流程和 pipeline_runner 共用
+DEFAULT_CLASSIFY_KEYWORDS = "skeleton,penis,pussy,nipple,vagina,censor,nude,green_hair,blue_hair,red_hair,purple_hair,yellow_hair,pink_hair,white_hair,grey_hair,brown_hair,black_hair,blonde_hair,aqua_hair"
 
 
 # [2025-06-10] 永远不要使用等待加载"networkidle"。
@@ -115,19 +209,91 @@ except ImportError as e: # 捕获 ImportError 及其细节
 # [2025-06-08] 我提供的代码不要删除我的注释
 
 
-def create_excel_report(image_data: List[Dict[str, Any]], base_filename="图片信息报告"):
+def create_excel_report(image_data: List[Dict[str, Any]], base_filename="图片信息报告", scan_root: str | None = None):
     """
     Creates an Excel report from the collected image data with a timestamped filename.
     
     【核心修改点】：不再自动打开文件，以避免评分写入时的文件锁冲突。
+    [2026-10-19] 修改: 优先使用 report_writer 流式写入 (逐行写入超链接和样式，内存占用与行数无关)，
+    输出格式不变；模块缺失时使用原有的 pandas + openpyxl 内存写入。
+    [2026-10-19] 新增: 报告数据同时保存到报告数据库 (REPORT_STORE_FILE)，评分等步骤可直接按列读写；
+    EXPORT_EXCEL_REPORT 为 False 时只保存数据库。
+    [2026-10-19] 新增: 超过 Excel 行数上限或设置了 REPORT_SHARD_BY 时，从数据库分片导出 (返回索引文件路径)；
+    超长单元格截断并注明完整内容在数据库中的位置。
+    [2026-10-19] 新增: INCREMENTAL_REPORT 为 True 时增量更新数据库，只导出变更报告 (返回变更报告路径)。
+    [2026-10-19] 新增: FIND_DUPLICATES 为 True 时查找完全重复的文件，作为 '重复文件' 工作表写入报告。
+    [2026-10-19] 新增: FIND_NEAR_DUPLICATES 为 True 时查找近似重复的图片，作为 '近似重复' 工作表写入报告。
     
     :param image_data: 包含图片信息的列表。
     :param base_filename: 报告的基础文件名。
-    :return: 生成的 Excel 文件的绝对路径。
+    :param scan_root: [2026-10-19 新增] 扫描的根目录。增量模式只删除该目录下已不存在的图片的行。
+    :return: 生成的 Excel 文件的绝对路径 (未导出 Excel 时为 None)。
     """
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     output_filename = f"{base_filename}_{timestamp}.xlsx"
     output_filepath = os.path.abspath(output_filename) # 获取绝对路径，方便后续调用
+    # [2026-10-19] 修改: 只在会写出 Excel 时查找重复文件 (只保存数据库时跳过哈希计算)；
+    # report_writer 缺失时的 pandas 写入总是生成 Excel
+    export_excel = EXPORT_EXCEL_REPORT or not REPORT_WRITER_LOADED
+    duplicate_sheets = find_duplicate_sheets(image_data) if export_excel else []
+
+    if REPORT_WRITER_LOADED:
+        # 列顺序与 pd.DataFrame(image_data) 一致: 按键第一次出现的顺序
+        columns = list(dict.fromkeys(key for data in image_data for key in data))
+        if not columns:
+            print("没有找到任何图片文件，将创建一个空的Excel文件。")
+            columns = [
+                "所在文件夹", "图片的绝对路径", "图片超链接", "stable diffusion的 ai图片的生成信息",
+                "去掉换行符的生成信息", "正面提示词", "负面提示词", "其他设置", "正面提示词字数",
+                "模型", "创建日期目录", "提取正向词的核心词", "TF-IDF区分度关键词(Top 10)",
+            ]
+        # 过滤掉临时列 'TF-IDF文件名后缀'
+        cols_to_write = [col for col in columns if col != TFIDF_SUFFIX_COLUMN]
+        cell_pointer = None
+        if REPORT_STORE_LOADED and INCREMENTAL_REPORT:
+            try:
+                with ReportStore(REPORT_STORE_FILE) as store:
+                    changes = store.sync_records(image_data, cols_to_write, scan_root=scan_root)
+                    print(
+                        f"报告数据库已增量更新 {store.db_path}: 新增 {len(changes['added'])}, 更新 {len(changes['updated'])}, "
+                        f"路径变化 {len(changes['renamed'])}, 删除 {len(changes['removed'])}, 未变化 {changes['unchanged']}"
+                    )
+                    if not EXPORT_EXCEL_REPORT:
+                        return None
+                    if not (changes["added"] or changes["updated"] or changes["renamed"] or changes["removed"]):
+                        print("报告没有变更，不生成变更报告。")
+                        write_duplicate_report(duplicate_sheets, base_filename, timestamp)
+                        return None
+                    changes_filepath = os.path.abspath(f"{base_filename}_变更_{timestamp}.xlsx")
+                    engine = store.export_changes_excel(changes_filepath, changes)
+                    print(f"本次变更已保存到 {changes_filepath} (流式写入引擎: {engine})")
+                    write_duplicate_report(duplicate_sheets, base_filename, timestamp)
+                    return changes_filepath
+            except Exception as e:
+                log_error(f"增量更新报告数据库失败，改为生成完整报告: {e}")
+        if REPORT_STORE_LOADED:
+            try:
+                with ReportStore(REPORT_STORE_FILE) as store:
+                    store.write_records(image_data, cols_to_write)
+                    print(f"报告数据已保存到数据库 {store.db_path} (共 {len(image_data)} 行)")
+                    if not EXPORT_EXCEL_REPORT:
+                        return None
+                    if REPORT_SHARD_BY or len(image_data) > EXCEL_MAX_DATA_ROWS:
+                        index_path = store.export_excel_sharded(output_filepath, shard_by=REPORT_SHARD_BY or "rows")
+                        print(f"报告已分片导出，索引文件: {index_path}")
+                        write_duplicate_report(duplicate_sheets, base_filename, timestamp)
+                        return index_path
+                    # 数据库刚刚整表写入，rowid 即报告中的行号
+                    cell_pointer = make_cell_pointer(store.db_path, store.table)
+            except Exception as e:
+                log_error(f"保存报告数据库失败: {e}")
+            if not EXPORT_EXCEL_REPORT:
+                return None
+        engine = write_report_streaming(
+            image_data, cols_to_write, output_filepath, row_count=len(image_data), cell_pointer=cell_pointer, extra_sheets=duplicate_sheets
+        )
+        print(f"数据已成功保存到 {output_filepath} (流式写入引擎: {engine})")
+        return output_filepath
 
     df = pd.DataFrame(image_data)
 
@@ -173,6 +339,10 @@ def create_excel_report(image_data: List[Dict[str, Any]], base_filename="图片
                 cell.value = "点击查看原图"
                 cell.font = Font(color=Color("0000FF"), underline="single")
 
+    for sheet_name, columns, records in duplicate_sheets:
+        # [2026-10-19] 新增: 重复文件工作表 (超链接列保留路径文本)
+        pd.DataFrame(records, columns=columns).to_excel(writer, index=False, sheet_name=sheet_name)
+
     writer.close()
     print(f"数据已成功保存到 {output_filepath}")
 
@@ -181,7 +351,51 @@ def create_excel_report(image_data: List[Dict[str, Any]], base_filename="图片
     return output_filepath
 
 
+# [2026-10-19] 新增函数: 完全重复文件查找
+# [2026-10-19] 修改: 同时支持感知哈希近似重复查找 (FIND_NEAR_DUPLICATES)，返回全部重复文件工作表
+def find_duplicate_sheets(image_data: List[Dict[str, Any]]) -> List[tuple]:
+    """
+    FIND_DUPLICATES 为 True 时在扫描到的图片中查找内容完全相同的文件；
+    FIND_NEAR_DUPLICATES 为 True 时用感知哈希查找近似重复的图片 (PNG 与 WebP/JPEG 转换副本等)。
+
+    :param image_data: 扫描结果 (使用 '图片的绝对路径' 列)。
+    :return: 报告的附加工作表 [(工作表名称, 列名, 记录列表)]；未开启或模块缺失时为空列表。
+    """
+    sheets = []
+    paths = [data["图片的绝对路径"] for data in image_data if data.get("图片的绝对路径")]
+    if FIND_DUPLICATES and DUPLICATE_FINDER_LOADED:
+        try:
+            result = find_exact_duplicates(paths)
+            print_duplicate_summary(result["stats"])
+            sheets.append((DUPLICATE_SHEET_NAME, DUPLICATE_COLUMNS, duplicate_sheet_records(result)))
+        except Exception as e:
+            log_error(f"查找重复文件失败: {e}")
+    if FIND_NEAR_DUPLICATES and PERCEPTUAL_HASH_LOADED:
+        try:
+            result = find_near_duplicates(paths, NEAR_DUPLICATE_DISTANCE)
+            print_near_duplicate_summary(result["stats"])
+            sheets.append((NEAR_DUPLICATE_SHEET_NAME, NEAR_DUPLICATE_COLUMNS, near_duplicate_sheet_records(result)))
+        except Exception as e:
+            log_error(f"查找近似重复图片失败: {e}")
+    return sheets
+
+
+def write_duplicate_report(duplicate_sheets: List[tuple], base_filename: str, timestamp: str) -> str | None:
+    """
+    增量/分片报告不重写完整报告，重复文件列表单独写入 <base_filename>_重复文件_<时间>.xlsx。
+    """
+    duplicate_sheets = [sheet for sheet in duplicate_sheets if sheet[2]]
+    if not duplicate_sheets:
+        return None
+    duplicate_filepath = os.path.abspath(f"{base_filename}_重复文件_{timestamp}.xlsx")
+    (sheet_name, columns, records), extra_sheets = duplicate_sheets[0], duplicate_sheets[1:]
+    write_report_streaming(records, columns, duplicate_filepath, sheet_name=sheet_name, row_count=len(records), extra_sheets=extra_sheets)
+    print(f"重复文件列表已保存到 {duplicate_filepath}")
+    return duplicate_filepath
+
+
 # [2025-10-27] 新增函数: 用于调用 image_scorer_supervised 实现 Excel 添加两列 (难度系数: 1)
+# [2026-10-19] 修改: 主流程改为在内存中评分 (add_scoring_columns_to_dataframe)，本函数不再被调用，保留供单独对报告文件评分使用
 def add_scoring_columns_to_excel(excel_filepath: str) -> pd.DataFrame | None:
     """
     【难度系数: 1】调用 image_scorer_supervised 模块，对指定的 Excel 文件进行
@@ -222,9 +436,37 @@ def add_scoring_columns_to_excel(excel_filepath: str) -> pd.DataFrame | None:
 # [2025-10-27] End 新增函数
 
 
+# [2026-10-19] 新增函数: 在内存中评分，不经过 Excel 的写入/重新读取
+def add_scoring_columns_to_dataframe(df: pd.DataFrame) -> pd.DataFrame | None:
+    """
+    调用 image_scorer_supervised 模块，直接对内存中的 DataFrame 进行个性化推荐评分。
+    
+    列顺序与报告 Excel 一致 (A 列为路径来源，L 列为核心词汇)，因此结果与 add_scoring_columns_to_excel 相同。
+    
+    :param df: 扫描结果 DataFrame (可包含 TF-IDF 列)。
+    :return: 添加了评分列的新 DataFrame, 失败返回 None。
+    """
+    if not SCORER_MODULE_LOADED:
+        print("\n【评分功能跳过】'image_scorer_supervised.py' 模块未成功加载。")
+        return None
+
+    print("\n--- 开始执行个性化推荐评分 (内存中计算，将添加'偏好定标分'和'个性化推荐预估评分'两列) ---")
+    try:
+        scorer = ImageScorer(ScorerConfig())
+        scored_df = scorer.score_dataframe(df)
+        if scored_df is not None:
+            print("--- 个性化推荐评分计算完成 ---")
+        return scored_df
+    except Exception as e:
+        print(f"【评分功能异常】调用 ImageScorer 失败，发生错误: {e}")
+        return None
+# [2026-10-19] End 新增函数
+
+
 # [2025-10-31] 新增函数: 用于重命名图片文件，在文件名后添加评分标记
+# [2026-10-19] 修改: 评分标记改由 tag_files_by_prompt 在同一次重命名中写入，本函数不再被调用，保留旧用法
 # @@    171-171,173-173   @@ 修改函数签名，返回新旧路径映射
-def rename_images_with_score_tag(scored_df: pd.DataFrame, score_column_name: str, path_column_name: str) -> Dict[str, str]:
+def rename_images_with_score_tag(scored_df: pd.DataFrame, score_column_name: str, path_column_name: str, fs=None) -> Dict[str, str]:
     """
     根据DataFrame中的'个性化推荐预估评分'列，对原始图片文件进行重命名，
     在文件名后添加评分标记 '@@@评分{分数}'，并移除/替换旧标记。
@@ -235,15 +477,21 @@ def rename_images_with_score_tag(scored_df: pd.DataFrame, score_column_name: str
         scored_df (pd.DataFrame): 包含 '个性化推荐预估评分' 和 '图片的绝对路径' 的DataFrame。
         score_column_name (str): 评分列的名称。
         path_column_name (str): 图片绝对路径列的名称。
+        fs: [2026-10-19 新增] 文件系统 (默认真实文件系统；传入 virtual_fs.VirtualFileSystem 时只在内存中模拟)。
         
     Returns:
         Dict[str, str]: 旧路径到新路径的映射字典 {old_path: new_path}。
     """
+    from tqdm import tqdm # [2026-10-19] 修改: 只有本函数使用进度条，不在 load_pipeline_modules 中导入
+
     # 评分前缀需要在两边保持一致，这里硬编码以匹配 image_scorer_supervised.py 中的配置
     SCORE_PREFIX = "@@@评分"
     
     # [核心新增] 用于存储旧路径到新路径的映射
     path_map: Dict[str, str] = {}
+    # [2026-10-19] 新增: 文件系统抽象，默认直接操作磁盘
+    path_exists = fs.exists if fs is not None else os.path.exists
+    rename_path = fs.rename if fs is not None else os.rename
     
     if scored_df is None or score_column_name not in scored_df.columns or path_column_name not in scored_df.columns:
         print("【评分标记重命名跳过】缺少必要的DataFrame或评分列。")
@@ -263,7 +511,7 @@ def rename_images_with_score_tag(scored_df: pd.DataFrame, score_column_name: str
             original_path = str(row[path_column_name])
             
             # 检查文件是否存在，防止重命名失败
-            if not os.path.exists(original_path):
+            if not path_exists(original_path):
                  # 路径可能在标记阶段已被更新，但如果此时文件不存在，则跳过
                  continue
                  
@@ -288,7 +536,7 @@ def rename_images_with_score_tag(scored_df: pd.DataFrame, score_column_name: str
             
             # 4. 执行重命名
             if original_path.lower() != new_path.lower():
-                os.rename(original_path, new_path)
+                rename_path(original_path, new_path)
                 count_success += 1
                 
                 # [核心修改] 记录路径映射
@@ -360,6 +608,16 @@ if __name__ == "__main__":
         exit()
     # --- 核心修改结束 ---
 
+    # [2026-10-19] 新增: 选择了有效操作后才导入各功能模块
+    load_pipeline_modules()
+    metrics_exporter.configure(METRICS_TEXTFILE, METRICS_JSONL)
+    # [2026-10-19] 新增: 先完成上次中断的批量重命名 (否则新的重命名会被拒绝)
+    from rename_planner import recover_pending_renames
+    recovery = recover_pending_renames()
+    if recovery and recovery["unresolved"]:
+        print("存在无法自动恢复的重命名，程序结束。")
+        exit()
+
     # 路径输入现在只在选择了有效操作后才执行
     folder_to_scan = input(f"请输入要扫描的主文件夹路径 (回车使用默认路径: {DEFAULT_FOLDER_PATH}): ").strip()
 
@@ -406,7 +664,12 @@ if __name__ == "__main__":
             print(f"非特殊文件夹，仅扫描用户指定文件夹: {folder_to_scan_actual}")
             
         # 调用从 image_scanner 导入的函数
-        image_info = get_image_info(folder_to_scan_actual) 
+        # [2026-10-19] 新增: 增量报告模式下复用报告数据库中未变化图片的扫描结果
+        scan_cache = None
+        if INCREMENTAL_REPORT and REPORT_STORE_LOADED and os.path.exists(REPORT_STORE_FILE):
+            with ReportStore(REPORT_STORE_FILE) as store:
+                scan_cache = store.make_scan_cache(SCAN_RESULT_COLUMNS)
+        image_info = get_image_info(folder_to_scan_actual, scan_cache=scan_cache) 
         
         if not image_info:
             print("没有扫描到任何图片信息，程序结束。")
@@ -459,72 +722,53 @@ if __name__ == "__main__":
                     print("\n--- 非特殊文件夹，跳过 TF-IDF 分析 ---")
             # --- End TF-IDF 功能 ---
 
-            # 5. 将处理后的 DataFrame 转换回 list of dicts，包含新增的 TF-IDF 列
+            # [2026-10-19] 修改: 评分提前到重命名之前，在内存中完成 (不再写入/重读 Excel)，
+            # 随后标记 tag、TF-IDF tag 和评分 tag 合并为每个文件一次重命名，不再需要 path_update_map 修补路径。
+            PREDICTED_SCORE_COLUMN = '个性化推荐预估评分'
+            scored_df: Union[pd.DataFrame, None] = None 
+            
+            # --- 评分功能调用逻辑 ---
+            print("\n--- 个性化推荐评分选项 (影响文件重命名) ---")
+            
+            # [2025-10-31] 调整提示：非特殊文件夹回车默认跳过评分
+            prompt_options = "1/回车: 添加评分, 2/no: 跳过评分" if IS_SPECIAL_FOLDER else "1: 添加评分, 2/回车/no: 跳过评分"
+            score_choice = input(f"是否为生成的 Excel 报告添加个性化推荐评分列？({prompt_options}): ").strip().lower()
+            
+            # [2025-10-31] 评分触发条件: 手动输入 "1" 或 特殊文件夹且输入为空
+            enable_scoring = (score_choice == "1") or (score_choice == "" and IS_SPECIAL_FOLDER)
+            
+            if enable_scoring:
+                print("\n您选择了添加个性化推荐评分。")
+                scored_df = add_scoring_columns_to_dataframe(df_for_process)
+                if scored_df is not None:
+                    df_for_process = scored_df
+            elif score_choice in ["2", "no", ""]: # 统一跳过逻辑
+                print("\n您选择了跳过个性化推荐评分。")
+            else:
+                print("\n评分输入无效，默认跳过个性化推荐评分。")
+            # --- 评分功能调用逻辑结束 ---
+
+            # 5. 将处理后的 DataFrame 转换回 list of dicts，包含新增的 TF-IDF 列和评分列
             # 这一步是为了 tag_files_by_prompt 函数的兼容性
             image_info_for_tagging = df_for_process.to_dict('records')
 
-            # 6. 执行文件名标记操作 (仅在特殊文件夹下运行自定义和TF-IDF文件名标记)
-            # 标记后缀顺序: 文件名 -> 自定义tag -> TF-IDF自动标记tag
+            # 6. 执行文件名标记操作 (仅在特殊文件夹下运行自定义、TF-IDF 和评分文件名标记)
+            # 标记后缀顺序: 文件名 -> 自定义tag -> TF-IDF自动标记tag -> 评分tag
             if IS_SPECIAL_FOLDER:
                 print(f"\n当前文件名标记关键词列表 (从 filename_tagger 导入): {TAGGING_KEYWORDS} (定界符: ___ )")
-                print("\n--- 检测到特殊文件夹，执行文件名标记 (第一阶段 I/O: 自定义Tag和TF-IDF Tag) ---")
-                # 将 TF-IDF 临时列名传入，实现二次附加后缀
-                image_info_for_tagging = tag_files_by_prompt(image_info_for_tagging, TAGGING_KEYWORDS, tfidf_suffix_col=TFIDF_SUFFIX_COLUMN)
-                # 重新转换为 DataFrame 以便生成报告和评分
+                print("\n--- 检测到特殊文件夹，执行文件名标记 (单次 I/O: 自定义Tag、TF-IDF Tag 和评分Tag) ---")
+                # 将 TF-IDF 临时列名和评分列名传入，一次重命名写入全部后缀
+                score_col = PREDICTED_SCORE_COLUMN if (scored_df is not None and PREDICTED_SCORE_COLUMN in scored_df.columns) else None
+                image_info_for_tagging = tag_files_by_prompt(image_info_for_tagging, TAGGING_KEYWORDS, tfidf_suffix_col=TFIDF_SUFFIX_COLUMN, score_col=score_col)
+                # 重新转换为 DataFrame 以便生成报告
                 df_for_process = pd.DataFrame(image_info_for_tagging)
             else:
-                print("\n--- 非特殊文件夹，跳过文件名标记 (自定义Tag/TF-IDF Tag 默认不启用) ---")
+                print("\n--- 非特殊文件夹，跳过文件名标记 (自定义Tag/TF-IDF Tag/评分Tag 默认不启用) ---")
             
-            # 7. 生成报告 (此时 df_for_process 已经是最新的，且路径已更新)
+            # 7. 生成报告 (此时 df_for_process 已经是最新的：路径已更新，且包含评分列)
             print("\n--- 报告生成 ---")
-            report_path = create_excel_report(df_for_process.to_dict('records')) # 接收返回的路径
+            report_path = create_excel_report(df_for_process.to_dict('records'), scan_root=folder_to_scan_actual) # 接收返回的路径
             
-            # [2025-10-31] 新增变量: 用于存储评分后的 DataFrame 和路径映射
-            scored_df: Union[pd.DataFrame, None] = None 
-            path_update_map: Dict[str, str] = {} # 用于存储旧路径 -> 新路径的映射
-            
-            # --- 评分功能调用逻辑 ---
-            if report_path: # 确保报告文件生成成功
-                print("\n--- 个性化推荐评分选项 (影响文件重命名) ---")
-                
-                # [2025-10-31] 调整提示：非特殊文件夹回车默认跳过评分
-                prompt_options = "1/回车: 添加评分, 2/no: 跳过评分" if IS_SPECIAL_FOLDER else "1: 添加评分, 2/回车/no: 跳过评分"
-                score_choice = input(f"是否为生成的 Excel 报告添加个性化推荐评分列？({prompt_options}): ").strip().lower()
-                
-                # [2025-10-31] 评分触发条件: 手动输入 "1" 或 特殊文件夹且输入为空
-                enable_scoring = (score_choice == "1") or (score_choice == "" and IS_SPECIAL_FOLDER)
-                
-                if enable_scoring:
-                    print("\n您选择了添加个性化推荐评分。")
-                    # 调用评分函数，它现在会修改 Excel 文件并返回评分后的 DataFrame
-                    scored_df = add_scoring_columns_to_excel(report_path) 
-                    
-                    # [2025-10-31] 新增: 评分标记重命名也仅在特殊文件夹下执行
-                    if IS_SPECIAL_FOLDER:
-                        if scored_df is not None and '个性化推荐预估评分' in scored_df.columns:
-                            PREDICTED_SCORE_COLUMN = '个性化推荐预估评分'
-                            # 确保找到正确的路径列名
-                            PATH_COLUMN_NAME = '图片的绝对路径' 
-                            
-                            # @@    538-538,541-541   @@ 执行评分标记重命名 (返回路径映射)
-                            path_update_map = rename_images_with_score_tag(scored_df, PREDICTED_SCORE_COLUMN, PATH_COLUMN_NAME)
-                        
-                elif score_choice in ["2", "no", ""]: # 统一跳过逻辑
-                    print("\n您选择了跳过个性化推荐评分。")
-                else:
-                    print("\n评分输入无效，默认跳过个性化推荐评分。")
-            # --- 评分功能调用逻辑结束 ---
-            
-            # [核心新增] 使用路径映射更新 image_info 列表 (解决分类失败问题)
-            if path_update_map:
-                print("\n--- 更新内存中的文件路径 (解决分类找不到文件问题) ---")
-                # 更新 image_info_for_tagging 列表
-                for item in image_info_for_tagging:
-                    old_path = item["图片的绝对路径"]
-                    if old_path in path_update_map:
-                        new_path = path_update_map[old_path]
-                        item["图片的绝对路径"] = new_path
-                        
             # 将最终处理过的 image_info_for_tagging 赋值给 image_info，以便后续流程（如果有）
             image_info = image_info_for_tagging
 
@@ -535,10 +779,10 @@ if __name__ == "__main__":
             
             # 7. 生成报告 (在分类前生成，报告中路径为分类前路径)
             print("\n--- 报告生成 (分类前) ---")
-            report_path = create_excel_report(image_info) 
+            report_path = create_excel_report(image_info, scan_root=folder_to_scan_actual) 
             
             # 3. 定义默认分类关键词 (用于分类文件夹，不是用于文件名标记)
-            default_keywords = "skeleton,penis,pussy,nipple,vagina,censor,nude,green_hair,blue_hair,red_hair,purple_hair,yellow_hair,pink_hair,white_hair,grey_hair,brown_hair,black_hair,blonde_hair,aqua_hair"
+            default_keywords = DEFAULT_CLASSIFY_KEYWORDS
             keyword_list = [kw.strip() for kw in default_keywords.split(',')]
             print(f"\n当前默认分类关键词列表 (用于文件夹分类): {default_keywords}")
 
@@ -597,7 +841,7 @@ if __name__ == "__main__":
             
             # 直接使用原始扫描结果生成报告
             print("\n--- 报告生成 ---")
-            report_path = create_excel_report(image_info) 
+            report_path = create_excel_report(image_info, scan_root=folder_to_scan_actual) 
 
 
         # --- 5. 最终报告打开逻辑 (无论选择哪个流程，报告生成后都尝试打开) ---
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 图片文件哈希缓存 (SQLite 单文件数据库，只依赖标准库)。
+
+以 (路径, 文件大小, 修改时间纳秒) 为键保存去重用的哈希；文件大小或修改时间变化后缓存自动失效。
+每种哈希一列 (HASH_COLUMNS)，缺少的列在打开时自动添加，旧缓存文件可以继续使用。
+"""
+import os
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+# 默认的缓存文件名 (与报告数据库一样放在当前工作目录)
+HASH_CACHE_FILE = "图片哈希缓存.sqlite"
+HASH_TABLE = "hashes"
+# 缓存的哈希列: 首尾块哈希、完整内容哈希、
+# [2026-10-19] 新增: 感知哈希 (dHash/pHash，16 位十六进制) 和图片信息 ("宽,高,格式"，perceptual_hash 使用)
+HASH_COLUMNS = ["head_tail", "full", "dhash", "phash", "image_info"]
+# SQLite 单条语句的参数个数上限 (旧版本为 999)
+SQL_MAX_VARIABLES = 900
+
+
+class HashCache:
+    """
+    哈希缓存。用法:
+
+        with HashCache() as cache:
+            cached = cache.lookup(signatures)                  # {路径: {列: 值}}
+            cache.store([(路径, 大小, 修改时间, {"full": 哈希})])
+    """
+    def __init__(self, db_path: str = HASH_CACHE_FILE):
+        self.db_path = os.path.abspath(db_path)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {HASH_TABLE} (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)")
+        existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({HASH_TABLE})")}
+        for column in HASH_COLUMNS:
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE {HASH_TABLE} ADD COLUMN {column} TEXT")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def lookup(self, signatures: Dict[str, Tuple[int, int]]) -> Dict[str, Dict[str, Optional[str]]]:
+        """
+        :param signatures: {路径: (文件大小, 修改时间纳秒)}。
+        :return: {路径: {哈希列: 值或 None}}，只包含签名与缓存一致的路径。
+        """
+        paths = list(signatures)
+        result = {}
+        columns = ", ".join(HASH_COLUMNS)
+        for start in range(0, len(paths), SQL_MAX_VARIABLES):
+            chunk = paths[start:start + SQL_MAX_VARIABLES]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT path, size, mtime_ns, {columns} FROM {HASH_TABLE} WHERE path IN ({placeholders})", chunk
+            )
+            for path, size, mtime_ns, *values in rows:
+                if signatures[path] == (size, mtime_ns):
+                    result[path] = dict(zip(HASH_COLUMNS, values))
+        return result
+
+    def store(self, entries: Iterable[Tuple[str, int, int, Dict[str, str]]]):
+        """
+        写入哈希。签名变化的旧记录被替换；签名相同时只更新给出的列，其他列保留。
+
+        :param entries: [(路径, 文件大小, 修改时间纳秒, {哈希列: 值})]。
+        """
+        for path, size, mtime_ns, hashes in entries:
+            self.conn.execute(
+                f"DELETE FROM {HASH_TABLE} WHERE path = ? AND (size != ? OR mtime_ns != ?)", (path, size, mtime_ns)
+            )
+            self.conn.execute(f"INSERT OR IGNORE INTO {HASH_TABLE} (path, size, mtime_ns) VALUES (?, ?, ?)", (path, size, mtime_ns))
+            assignments = ", ".join(f"{column} = ?" for column in hashes)
+            if assignments:
+                self.conn.execute(f"UPDATE {HASH_TABLE} SET {assignments} WHERE path = ?", (*hashes.values(), path))
+        self.conn.commit()
+
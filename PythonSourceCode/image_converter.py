@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: PNG 批量转换为 WebP/JPEG (对应主程序 TODO "PNG转格式JPG(jpeg)/WEBP，压缩以前的PNG图片")。
+
+按日期文件夹 (YYYY-MM-DD) 选择要转换的 PNG，在进程池中重新编码:
+- PNG 的 parameters 文本写入 EXIF UserComment ("UNICODE\\0" + UTF-16BE，与 A1111 保存 WebP/JPEG 时相同)，
+  image_scanner.process_single_image 可以照常读取生成信息；ICC 色彩配置一并保留；
+- 转换结果先写入临时文件并校验: 格式和尺寸一致、感知哈希距离不超过 VERIFY_MAX_DISTANCE (无损 WebP 要求像素完全一致)、
+  process_single_image 从新文件读到的生成信息与原图完全相同；校验通过后才替换为正式文件名并恢复修改时间；
+- 默认保留原 PNG，--delete-source 时校验通过后删除原图；
+- 任务日志 (SQLite，CONVERT_JOURNAL_FILE) 记录每个文件的状态，中断后重新运行会跳过已完成的文件，可以分多天执行；
+- 已存在的目标文件从不覆盖 (包括转换期间被其他程序创建的目标，用 os.link 发布)。[2026-10-19] 修改: 上次中断时正在转换的文件，如果目标文件的修改时间等于任务日志中
+  记录的原图修改时间 (转换在替换为正式文件名之前恢复修改时间)，说明目标是那次已校验并写入的结果，直接记为完成；
+- I/O 限速 (--max-mbps，按读取和写入的字节数计算) 和子进程降低优先级，可以与出图同时运行。
+
+注意: Windows 上新文件的创建时间为转换时间 (修改时间会恢复为原图的修改时间)，
+扫描报告的 '创建日期目录' 来自创建时间，转换后的文件请以所在的日期文件夹为准。
+
+用法:
+    python image_converter.py <图片根目录> [--folders 2025-01-01 2025-01-02] [--before 2025-06-01]
+                              [--format webp|jpeg] [--quality 90] [--lossless] [--delete-source] [--max-mbps 50]
+"""
+import os
+import re
+import sys
+import errno
+import time
+import sqlite3
+import argparse
+import threading
+import concurrent.futures
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+import structured_log
+import metrics_exporter
+from image_scanner import process_single_image
+from perceptual_hash import image_hashes, hamming_distance
+
+CONVERT_JOURNAL_FILE = "图片转换任务.sqlite"
+JOURNAL_TABLE = "conversions"
+FORMAT_WEBP = "webp"
+FORMAT_JPEG = "jpeg"
+TARGET_EXTENSIONS = {FORMAT_WEBP: ".webp", FORMAT_JPEG: ".jpg"}
+WEBP_QUALITY = 90
+# WebP 编码速度与压缩率的折中 (0 最快，6 最慢)
+WEBP_METHOD = 4
+JPEG_QUALITY = 92
+CONVERT_WORKERS = max(1, (os.cpu_count() or 4) - 1) # 留一个核心给出图
+# 每个工作进程最多同时提交的任务数 (限速时控制预读量)
+TASKS_PER_WORKER = 2
+# 子进程的 nice 值增量 (仅 Unix)
+WORKER_NICE = 10
+# 有损转换允许的感知哈希 (pHash/dHash) 最大汉明距离
+VERIFY_MAX_DISTANCE = 4
+# 生成信息校验使用的列
+METADATA_COLUMN = "stable diffusion的 ai图片的生成信息"
+# 临时文件名中的标记 (临时文件保留目标扩展名，process_single_image 才能读取)
+TEMP_MARK = ".converting"
+# JPEG 的 EXIF 段最大 65,533 字节
+JPEG_MAX_EXIF_BYTES = 65533
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+DATE_FOLDER_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def user_comment(text: str) -> bytes:
+    """EXIF UserComment 的 Unicode 编码 (与 A1111 / piexif 相同)。"""
+    return b"UNICODE\0" + text.encode("utf-16-be")
+
+
+def target_path_for(source: str, target_format: str) -> str:
+    return os.path.splitext(source)[0] + TARGET_EXTENSIONS[target_format]
+
+
+def _temp_path(target: str) -> str:
+    stem, ext = os.path.splitext(target)
+    return f"{stem}{TEMP_MARK}{ext}"
+
+
+class ConversionJournal:
+    """
+    转换任务日志: 每个源文件一行 (路径, 大小, 修改时间, 状态, 目标文件, 字节数, CPU 时间, 错误)。
+    """
+    def __init__(self, db_path: str = CONVERT_JOURNAL_FILE):
+        self.db_path = os.path.abspath(db_path)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {JOURNAL_TABLE} (source TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "status TEXT, target TEXT, source_bytes INTEGER, target_bytes INTEGER, cpu_seconds REAL, error TEXT, updated_at TEXT)"
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def statuses(self) -> Dict[str, Tuple[str, int, int]]:
+        """:return: {源文件: (状态, 大小, 修改时间纳秒)}"""
+        return {row[0]: row[1:] for row in self.conn.execute(f"SELECT source, status, size, mtime_ns FROM {JOURNAL_TABLE}")}
+
+    def mark_running(self, source: str, size: int, mtime_ns: int, target: str):
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {JOURNAL_TABLE} (source, size, mtime_ns, status, target, source_bytes, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (source, size, mtime_ns, STATUS_RUNNING, target, size, datetime.now().isoformat(timespec="seconds")),
+        )
+        self.conn.commit()
+
+    def record(self, result: Dict[str, Any]):
+        self.conn.execute(
+            f"UPDATE {JOURNAL_TABLE} SET status = ?, target_bytes = ?, cpu_seconds = ?, error = ?, updated_at = ? WHERE source = ?",
+            (result["status"], result.get("target_bytes"), result.get("cpu_seconds"), result.get("error"),
+             datetime.now().isoformat(timespec="seconds"), result["source"]),
+        )
+        self.conn.commit()
+
+
+class IoThrottle:
+    """
+    令牌桶 I/O 限速: acquire(n) 在超出速率时等待。bytes_per_second 为 None 时不限速。
+    """
+    def __init__(self, bytes_per_second: Optional[float]):
+        self.rate = bytes_per_second
+        self.allowance = 0.0
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # 最多积攒 1 秒的额度
+            self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate) - size
+            self.last = now
+            wait = -self.allowance / self.rate if self.allowance < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def select_date_folders(root: str, folders: Optional[List[str]] = None, after: Optional[str] = None, before: Optional[str] = None) -> List[str]:
+    """
+    选择 root 下的日期文件夹 (YYYY-MM-DD)。
+
+    :param folders: 指定的文件夹名，None 表示全部日期文件夹。
+    :param after: 只选择不早于该日期的文件夹 (含)。
+    :param before: 只选择早于该日期的文件夹 (不含)。
+    """
+    names = sorted(name for name in os.listdir(root) if DATE_FOLDER_PATTERN.match(name) and os.path.isdir(os.path.join(root, name)))
+    if folders:
+        wanted = set(folders)
+        names = [name for name in names if name in wanted]
+    if after:
+        names = [name for name in names if name >= after]
+    if before:
+        names = [name for name in names if name < before]
+    return [os.path.join(root, name) for name in names]
+
+
+def collect_png_files(folders: Iterable[str]) -> List[str]:
+    paths = []
+    for folder in folders:
+        for dirpath, _, filenames in os.walk(folder):
+            paths.extend(os.path.abspath(os.path.join(dirpath, name)) for name in filenames if name.lower().endswith(".png"))
+    return sorted(paths)
+
+
+def _init_worker(log_queue):
+    structured_log.init_worker(log_queue)
+    if hasattr(os, "nice"):
+        try:
+            os.nice(WORKER_NICE)
+        except OSError:
+            pass
+
+
+def _flatten(image: Image.Image, keep_alpha: bool) -> Image.Image:
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    if has_alpha and keep_alpha:
+        return image.convert("RGBA")
+    if has_alpha:
+        # JPEG 不支持透明: 透明区域填充白色
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+        return Image.alpha_composite(background, image).convert("RGB")
+    return image.convert("RGB")
+
+
+def _verify(source_image: Image.Image, source_path: str, temp_path: str, target_format: str, lossless: bool) -> Optional[str]:
+    """
+    校验转换结果。:return: 失败原因，通过时为 None。
+    """
+    with Image.open(temp_path) as converted:
+        if converted.format != target_format.upper():
+            return f"格式不符: {converted.format}"
+        if converted.size != source_image.size:
+            return f"尺寸不符: {converted.size} != {source_image.size}"
+        converted.load()
+        if lossless:
+            if converted.convert("RGBA").tobytes() != source_image.convert("RGBA").tobytes():
+                return "无损转换后像素不一致"
+        else:
+            source_dhash, source_phash = image_hashes(source_image)
+            dhash, phash = image_hashes(converted)
+            distance = max(hamming_distance(source_dhash, dhash), hamming_distance(source_phash, phash))
+            if distance > VERIFY_MAX_DISTANCE:
+                return f"画面差异过大 (感知哈希距离 {distance})"
+    source_info = process_single_image(source_path) or {}
+    converted_info = process_single_image(temp_path) or {}
+    if source_info.get(METADATA_COLUMN) != converted_info.get(METADATA_COLUMN):
+        return "转换后读取的生成信息与原图不一致"
+    return None
+
+
+def _publish(temp_path: str, target: str):
+    """
+    [2026-10-19] 新增: 把校验通过的临时文件发布为目标文件，目标已存在时抛出 FileExistsError (不覆盖)。
+    os.link 在目标已存在时原子地失败 (os.replace 会覆盖转换期间被创建的文件)；
+    文件系统不支持硬链接时 (FAT/exFAT 等) 退化为检查后 os.rename (Windows 的 os.rename 本身不覆盖)。
+    """
+    try:
+        os.link(temp_path, target)
+    except FileExistsError:
+        raise
+    except OSError:
+        if os.path.exists(target):
+            raise FileExistsError(errno.EEXIST, "目标文件已存在", target)
+        os.rename(temp_path, target)
+        return
+    os.remove(temp_path)
+
+
+def convert_one(source: str, target: str, target_format: str, quality: int, lossless: bool, delete_source: bool) -> Dict[str, Any]:
+    """
+    子进程任务: 转换并校验单个 PNG (目标文件已存在时跳过，不覆盖)。
+
+    :return: {"source", "target", "status", "source_bytes", "target_bytes", "cpu_seconds", "error"}。
+    """
+    cpu_start = time.process_time()
+    result = {"source": source, "target": target, "status": STATUS_FAILED, "source_bytes": 0, "target_bytes": None, "error": None}
+    temp_path = _temp_path(target)
+    try:
+        stat = os.stat(source)
+        result["source_bytes"] = stat.st_size
+        if os.path.exists(target):
+            result["status"] = STATUS_SKIPPED
+            result["error"] = "目标文件已存在"
+            return result
+        with Image.open(source) as image:
+            image.load()
+            parameters = image.info.get("parameters")
+            icc_profile = image.info.get("icc_profile")
+            encoded = _flatten(image, keep_alpha=target_format == FORMAT_WEBP)
+            exif = Image.Exif()
+            if parameters:
+                exif.get_ifd(0x8769)[0x9286] = user_comment(parameters)
+            exif_bytes = exif.tobytes()
+            save_options = {"exif": exif_bytes}
+            if icc_profile:
+                save_options["icc_profile"] = icc_profile
+            if target_format == FORMAT_WEBP:
+                save_options.update(quality=100 if lossless else quality, lossless=lossless, method=WEBP_METHOD)
+                encoded.save(temp_path, format="WEBP", **save_options)
+            else:
+                if len(exif_bytes) > JPEG_MAX_EXIF_BYTES:
+                    result["error"] = f"生成信息过长，超过 JPEG EXIF 上限 ({len(exif_bytes)} 字节)"
+                    return result
+                encoded.save(temp_path, format="JPEG", quality=quality, optimize=True, **save_options)
+            error = _verify(image, source, temp_path, target_format, lossless and target_format == FORMAT_WEBP)
+        if error:
+            result["error"] = error
+            return result
+        os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        try:
+            _publish(temp_path, target)
+        except FileExistsError:
+            # 转换期间其他程序创建了目标文件
+            result["status"] = STATUS_SKIPPED
+            result["error"] = "目标文件已存在"
+            return result
+        result["target_bytes"] = os.path.getsize(target)
+        if delete_source:
+            os.remove(source)
+        result["status"] = STATUS_DONE
+        return result
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    finally:
+        if os.path.exists(temp_path):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        result["cpu_seconds"] = time.process_time() - cpu_start
+
+
+def _finish_interrupted(journal: ConversionJournal, source: str, stat: os.stat_result, previous: Tuple[str, int, int],
+                        target_format: str, delete_source: bool) -> bool:
+    """
+    [2026-10-19] 新增: 处理上次中断时状态仍为 running 的文件。
+    convert_one 校验通过后先把临时文件的修改时间恢复为原图的修改时间，再替换为正式文件名，
+    因此目标文件存在、原图未变化且目标的修改时间等于任务日志记录的原图修改时间时，目标就是那次转换写入的结果。
+
+    :return: 已记为完成时返回 True；否则返回 False (重新转换，已存在的其他目标文件仍会被跳过)。
+    """
+    if previous[1:] != (stat.st_size, stat.st_mtime_ns):
+        return False
+    target = target_path_for(source, target_format)
+    try:
+        target_stat = os.stat(target)
+    except OSError:
+        return False
+    if target_stat.st_mtime_ns != previous[2]:
+        return False
+    if delete_source:
+        os.remove(source)
+    journal.record({"source": source, "status": STATUS_DONE, "target_bytes": target_stat.st_size})
+    return True
+
+
+def convert_pngs(
+    sources: List[str],
+    target_format: str = FORMAT_WEBP,
+    quality: Optional[int] = None,
+    lossless: bool = False,
+    delete_source: bool = False,
+    journal_path: str = CONVERT_JOURNAL_FILE,
+    max_bytes_per_second: Optional[float] = None,
+    max_workers: int = CONVERT_WORKERS,
+) -> Dict[str, Any]:
+    """
+    批量转换 PNG (可中断，重新运行时跳过任务日志中已完成的文件)。
+
+    :return: 统计 {待转换, 已完成跳过, 转换成功, 失败, 跳过, 原图字节数, 转换后字节数, CPU时间(秒), 墙钟时间(秒)}。
+    """
+    if quality is None:
+        quality = WEBP_QUALITY if target_format == FORMAT_WEBP else JPEG_QUALITY
+    stats = {"待转换": 0, "已完成跳过": 0, "转换成功": 0, "失败": 0, "跳过": 0, "原图字节数": 0, "转换后字节数": 0, "CPU时间(秒)": 0.0}
+    started = time.monotonic()
+    throttle = IoThrottle(max_bytes_per_second)
+    with ConversionJournal(journal_path) as journal:
+        statuses = journal.statuses()
+        jobs = []
+        for source in sources:
+            try:
+                stat = os.stat(source)
+            except OSError:
+                continue
+            previous = statuses.get(source)
+            if previous and previous[0] == STATUS_DONE and previous[1:] == (stat.st_size, stat.st_mtime_ns):
+                stats["已完成跳过"] += 1
+                continue
+            if previous and previous[0] == STATUS_RUNNING and _finish_interrupted(journal, source, stat, previous, target_format, delete_source):
+                stats["已完成跳过"] += 1
+                continue
+            jobs.append((source, stat.st_size, stat.st_mtime_ns))
+        stats["待转换"] = len(jobs)
+        print(f"待转换 {len(jobs)} 个 PNG (任务日志中已完成 {stats['已完成跳过']} 个)，使用 {max_workers} 个进程 -> {target_format}")
+
+        progress = metrics_exporter.stage_progress("convert", len(jobs))
+        from tqdm import tqdm
+        max_in_flight = max(1, max_workers) * TASKS_PER_WORKER
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max(1, max_workers), initializer=_init_worker, initargs=(structured_log.get_queue(),)
+        )
+        pending = set()
+        try:
+            with tqdm(total=len(jobs), desc="转换 PNG") as progress_bar:
+                job_iter = iter(jobs)
+                while True:
+                    # 限制同时提交的任务数，限速才能作用于实际读盘
+                    while len(pending) < max_in_flight:
+                        job = next(job_iter, None)
+                        if job is None:
+                            break
+                        source, size, mtime_ns = job
+                        target = target_path_for(source, target_format)
+                        throttle.acquire(size)
+                        journal.mark_running(source, size, mtime_ns, target)
+                        pending.add(executor.submit(
+                            convert_one, source, target, target_format, quality, lossless, delete_source
+                        ))
+                    if not pending:
+                        break
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        journal.record(result)
+                        progress_bar.update(1)
+                        progress.advance(bytes_processed=result["source_bytes"], error=result["status"] == STATUS_FAILED)
+                        stats["CPU时间(秒)"] += result.get("cpu_seconds") or 0.0
+                        if result["status"] == STATUS_DONE:
+                            stats["转换成功"] += 1
+                            stats["原图字节数"] += result["source_bytes"]
+                            stats["转换后字节数"] += result["target_bytes"]
+                            throttle.acquire(result["target_bytes"])
+                        elif result["status"] == STATUS_SKIPPED:
+                            stats["跳过"] += 1
+                            structured_log.log_event(
+                                f"跳过转换 {result['source']}: {result['error']}", level=structured_log.LEVEL_WARNING,
+                                stage="convert", file=result["source"],
+                            )
+                        else:
+                            stats["失败"] += 1
+                            structured_log.log_event(f"转换失败 {result['source']}: {result['error']}", stage="convert", file=result["source"])
+        except KeyboardInterrupt:
+            print("\n转换已中断，已完成的文件记录在任务日志中，重新运行会从中断处继续。")
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            progress.finish()
+    stats["墙钟时间(秒)"] = time.monotonic() - started
+    return stats
+
+
+def print_conversion_summary(stats: Dict[str, Any]):
+    saved = stats["原图字节数"] - stats["转换后字节数"]
+    ratio = stats["转换后字节数"] / stats["原图字节数"] if stats["原图字节数"] else 0.0
+    print("\n--- PNG 转换 ---")
+    print(f"成功 {stats['转换成功']}，失败 {stats['失败']}，跳过 {stats['跳过']}，任务日志中已完成 {stats['已完成跳过']}")
+    print(
+        f"原图 {stats['原图字节数'] / 1024 ** 2:.1f} MB -> {stats['转换后字节数'] / 1024 ** 2:.1f} MB "
+        f"(为原来的 {ratio:.1%}，节省 {saved / 1024 ** 2:.1f} MB)"
+    )
+    print(f"CPU 时间 {stats['CPU时间(秒)']:.1f} 秒，墙钟时间 {stats['墙钟时间(秒)']:.1f} 秒")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="把日期文件夹中的 PNG 转换为 WebP/JPEG (保留生成信息，可中断续传)")
+    parser.add_argument("root", help="图片根目录 (包含 YYYY-MM-DD 日期文件夹)")
+    parser.add_argument("--folders", nargs="+", help="只转换这些日期文件夹 (文件夹名)")
+    parser.add_argument("--after", help="只转换不早于该日期的文件夹 (YYYY-MM-DD，含)")
+    parser.add_argument("--before", help="只转换早于该日期的文件夹 (YYYY-MM-DD，不含)")
+    parser.add_argument("--format", choices=[FORMAT_WEBP, FORMAT_JPEG], default=FORMAT_WEBP, help="目标格式")
+    parser.add_argument("--quality", type=int, help=f"有损压缩质量 (默认 WebP {WEBP_QUALITY} / JPEG {JPEG_QUALITY})")
+    parser.add_argument("--lossless", action="store_true", help="无损 WebP (校验要求像素完全一致)")
+    parser.add_argument("--delete-source", action="store_true", help="校验通过后删除原 PNG")
+    parser.add_argument("--max-mbps", type=float, help="I/O 限速 (MB/秒，读取和写入合计)")
+    parser.add_argument("--workers", type=int, default=CONVERT_WORKERS, help="进程数")
+    parser.add_argument("--journal", default=CONVERT_JOURNAL_FILE, help="任务日志数据库路径")
+    parser.add_argument("--dry-run", action="store_true", help="只列出选中的文件夹和文件数，不转换")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.root):
+        parser.error(f"文件夹 '{args.root}' 不存在。")
+    if args.lossless and args.format != FORMAT_WEBP:
+        parser.error("--lossless 只适用于 WebP。")
+
+    folders = select_date_folders(args.root, args.folders, args.after, args.before)
+    sources = collect_png_files(folders)
+    print(f"选中 {len(folders)} 个日期文件夹，共 {len(sources)} 个 PNG ({sum(os.path.getsize(p) for p in sources) / 1024 ** 2:.1f} MB)")
+    if args.dry_run or not sources:
+        return 0
+    stats = convert_pngs(
+        sources, args.format, args.quality, args.lossless, args.delete_source, args.journal,
+        args.max_mbps * 1024 * 1024 if args.max_mbps else None, args.workers,
+    )
+    print_conversion_summary(stats)
+    return 1 if stats["失败"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,9 +5,14 @@ from PIL import Image, ImageFile
 from datetime import datetime
 import concurrent.futures 
 import warnings 
-from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE # 导入用于清理非法字符的正则
-from typing import List, Dict, Any 
-from tqdm import tqdm # [2025-10-31] 新增导入: 用于显示进度条和计数器
+from typing import List, Dict, Any, Callable, Iterator, Optional
+from scan_profiler import ScanProfile, PhaseTimer # [2026-10-19] 新增: 分阶段计时 (可选)
+import metrics_exporter # [2026-10-19] 新增: 实时吞吐指标 (可选)
+import structured_log # [2026-10-19] 新增: 基于队列的批量结构化日志
+
+# [2026-10-19] 修改: 清理 Excel 不支持的非法字符的正则直接在本模块定义 (与 openpyxl.cell.cell.ILLEGAL_CHARACTERS_RE 相同)，
+# 扫描子进程不再导入 openpyxl；tqdm 只在主进程的 get_image_info 中导入
+ILLEGAL_CHARACTERS_RE = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
 
 # 允许 Pillow 加载截断的图像文件，避免程序崩溃。
 ImageFile.LOAD_TRUNCATED_IMAGES = True
@@ -18,6 +23,18 @@ _current_processing_file = None
 # 定义最大并发进程数 (通常是CPU核心数)
 MAX_WORKERS = os.cpu_count() or 4
 
+# [2026-10-19] 新增: 是否默认开启扫描分阶段计时 (get_image_info 的 profile 参数未指定时使用)
+SCAN_PROFILE_ENABLED = False
+# 最近一次开启计时的扫描结果 (ScanProfile)，供基准测试等读取
+LAST_SCAN_PROFILE: Optional[ScanProfile] = None
+
+# [2026-10-19] 新增: process_single_image 返回的列 (增量扫描时只复用这些列)
+SCAN_RESULT_COLUMNS = [
+    "所在文件夹", "图片的绝对路径", "图片超链接", "stable diffusion的 ai图片的生成信息",
+    "去掉换行符的生成信息", "正面提示词", "负面提示词", "其他设置", "正面提示词字数",
+    "模型", "创建日期目录", "提取正向词的核心词",
+]
+
 # --- 正向提示词的停用词列表 (用于提取核心词) ---
 POSITIVE_PROMPT_STOP_WORDS = [
     # ----------------------------------------------------
@@ -62,17 +79,18 @@ POSITIVE_PROMPT_STOP_WORDS = [
 # ------------------------------------------------------
 
 
-def log_error(message: str):
+def log_error(message: str, file: Optional[str] = None, error: Optional[BaseException] = None):
     """
     记录错误信息到控制台和日志文件。
     
     注意: 最终应根据用户要求使用 loguru/logger_obj 进行隐性注入。
+    [2026-10-19] 修改: 不再每条消息打开一次日志文件，记录放入 structured_log 的队列，由主进程按批写入
+    image_scan_error.log (格式不变) 和 image_scan_error.jsonl，控制台输出限速。
+
+    :param file: [2026-10-19 新增] 相关的图片路径 (写入结构化日志)。
+    :param error: [2026-10-19 新增] 捕获的异常 (结构化日志记录其类型名)。
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"{timestamp} - {message}\n"
-    print(message) # 在控制台打印错误信息
-    with open("image_scan_error.log", "a", encoding="utf-8") as log_file:
-        log_file.write(log_entry)
+    structured_log.log_event(message, stage="scan", file=file, error=error)
 
 
 def custom_warning_formatter(message, category, filename, lineno, file=None, line=None):
@@ -93,10 +111,29 @@ def custom_warning_formatter(message, category, filename, lineno, file=None, lin
 warnings.formatwarning = custom_warning_formatter
 
 
-def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
+def decode_unicode_user_comment(value: bytes) -> str | None:
+    """
+    [2026-10-19] 新增: 解码 Unicode 编码的 EXIF UserComment ("UNICODE\\0" + UTF-16)。
+    A1111 和 image_converter 写入 UTF-16BE；个别工具写入 UTF-16LE，BE 解码后找不到 "Steps:" 时再按 LE 解码。
+
+    :return: 解码后的文本；不是 Unicode 编码时返回 None。
+    """
+    if not value.startswith(b"UNICODE\0"):
+        return None
+    text = value[8:].decode("utf-16-be", errors="ignore")
+    if "Steps:" not in text:
+        text_le = value[8:].decode("utf-16-le", errors="ignore")
+        if "Steps:" in text_le:
+            return text_le
+    return text
+
+
+def process_single_image(absolute_path: str, timer: Optional[PhaseTimer] = None) -> Dict[str, Any] | None:
     """
     处理单个图片文件，提取元数据并返回结构化数据。
     此函数设计为独立运行，用于多进程并行处理。
+
+    :param timer: [2026-10-19 新增] 分阶段计时器 (scan_profiler.PhaseTimer)，None 表示不计时。
     """
     global _current_processing_file # 声明使用全局变量
 
@@ -104,6 +141,8 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
     
     # 确保文件存在且是图片扩展名
     if not os.path.exists(absolute_path) or not absolute_path.lower().endswith(image_extensions):
+        if timer is not None:
+            timer.mark("stat")
         return None # 不是图片或文件不存在，返回None
     
     # 定义一个更通用的正则表达式，用于从原始文本中捕获 Stable Diffusion 的信息块
@@ -139,9 +178,13 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
         except Exception:
             # 这里的错误不严重，不使用log_error，仅设置默认值
             pass 
+        if timer is not None:
+            timer.mark("stat")
         
         # --- 开始图像元数据提取 ---
         with Image.open(absolute_path) as img:
+            if timer is not None:
+                timer.mark("open")
             # --- 阶段 1: 尝试从标准位置获取原始元数据字符串 ---
             if "png" in img.format.lower() and "parameters" in img.info:
                 raw_metadata_string = img.info["parameters"]
@@ -152,7 +195,10 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
                         for tag, value in exif_data.items():
                             if tag in [0x9286, 0x010E]: # UserComment (0x9286) or ImageDescription (0x010E)
                                 try:
-                                    if isinstance(value, bytes):
+                                    # [2026-10-19] 新增: Unicode 编码的 UserComment 按 UTF-16 解码 (原来按 UTF-8/Latin-1 解码，非 ASCII 字符会乱码)
+                                    if isinstance(value, bytes) and value.startswith(b"UNICODE\0"):
+                                        raw_metadata_string = decode_unicode_user_comment(value)
+                                    elif isinstance(value, bytes):
                                         raw_metadata_string = value.decode('utf-8', errors='ignore')
                                         if not re.search(r'Steps:', raw_metadata_string):
                                             raw_metadata_string = value.decode('latin-1', errors='ignore')
@@ -161,6 +207,8 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
                                     break
                                 except Exception:
                                     pass
+            if timer is not None:
+                timer.mark("metadata")
             
             # --- 阶段 2: 清理并使用更强大的正则表达式提取有效信息 ---
             if isinstance(raw_metadata_string, str) and raw_metadata_string:
@@ -207,6 +255,8 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
                 else:
                     sd_info = "没有扫描到生成信息"
                     sd_info_no_newlines = "没有扫描到生成信息"
+            if timer is not None:
+                timer.mark("parse")
 
             # --- 阶段 4: 提取正向提示词的核心词 (新增功能) ---
             core_positive_prompt = positive_prompt
@@ -237,17 +287,19 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
             model_match = re.search(r'Model: ([^,]+)', other_settings)
             if model_match:
                 model_name = model_match.group(1).strip()
+            if timer is not None:
+                timer.mark("core_prompt")
 
 
     except Exception as e:
         # 如果Image.open()或后续操作因文件损坏而失败，这里的e会包含详细错误信息
-        log_error(f"Error processing image file '{absolute_path}' : {e}") # 明确指出是哪个文件出了问题
+        log_error(f"Error processing image file '{absolute_path}' : {e}", file=absolute_path, error=e) # 明确指出是哪个文件出了问题
         # 发生任何错误时都保持默认值
     finally:
         _current_processing_file = None # 处理完一个文件后重置全局变量
 
     # 返回结果字典
-    return {
+    result = {
         "所在文件夹": containing_folder_absolute_path,
         "图片的绝对路径": absolute_path,
         "图片超链接": f'={absolute_path}',
@@ -261,18 +313,36 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
         "创建日期目录": creation_date_dir, # 新增列
         "提取正向词的核心词": core_positive_prompt # 新增列
     }
+    if timer is not None:
+        timer.mark("build")
+    return result
 
-def get_image_info(folder_path: str) -> List[Dict[str, Any]]:
+
+def _process_image_chunk_profiled(image_paths: List[str]) -> tuple:
     """
-    (多进程优化) 扫描文件夹获取所有图片路径，并使用进程池并行提取元数据。
-    
+    [2026-10-19] 新增: 在子进程中处理一批图片并汇总每个阶段的耗时。
+
+    :return: (结果列表, ScanProfile)。
+    """
+    profile = ScanProfile()
+    timer = PhaseTimer(profile)
+    results = []
+    for path in image_paths:
+        timer.start(path)
+        results.append(process_single_image(path, timer))
+        timer.finish()
+    return results, profile
+
+def collect_image_paths(folder_path: str) -> List[str]:
+    """
+    [2026-10-19] 新增: 从 get_image_info 中拆分出的路径收集阶段 (单线程 os.walk，跳过 '.bf' 文件夹)。
+
     :param folder_path: 要扫描的根目录路径。
-    :return: 包含所有图片元数据字典的列表。
+    :return: 图片绝对路径列表 (os.walk 顺序)。
     """
     image_paths = []
     image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
 
-    # 1. 阶段：单线程快速收集所有图片路径
     for root, dirs, files in os.walk(folder_path):
         
         # [2025-10-27] 新增: 排除名为 '.bf' 的文件夹
@@ -284,38 +354,166 @@ def get_image_info(folder_path: str) -> List[Dict[str, Any]]:
         for file in files:
             if file.lower().endswith(image_extensions):
                 image_paths.append(os.path.abspath(os.path.join(root, file)))
+    return image_paths
+
+
+def _iter_scan_results(
+    image_paths: List[str],
+    scan_cache: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+    max_workers: int = MAX_WORKERS,
+    scan_profile: Optional[ScanProfile] = None,
+) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    [2026-10-19] 新增: get_image_info 和 iter_image_info_batches 共用的扫描执行器。
+
+    按 image_paths 的顺序逐个产出扫描结果 (处理失败为 None): 未变化的图片直接复用 scan_cache 的结果，
+    其余图片按块提交到进程池 (每块一次进程间往返)；传入 scan_profile 时子进程分阶段计时，
+    各块的耗时合并到 scan_profile。同时更新 "scan" 阶段的吞吐指标 (未开启时为空操作)。
+
+    :param image_paths: collect_image_paths 收集的图片路径。
+    :param scan_cache: 增量扫描缓存 (见 get_image_info)。
+    :param max_workers: 扫描进程数。
+    :param scan_profile: 分阶段计时的汇总对象，None 表示不计时。
+    :return: 扫描结果的迭代器，与 image_paths 一一对应。
+    """
+    cached_results: Dict[int, Dict[str, Any]] = {}
+    if scan_cache is not None:
+        for index, path in enumerate(image_paths):
+            cached = scan_cache(path)
+            if cached is not None:
+                cached_results[index] = cached
+        print(f"增量扫描: {len(cached_results)} 个图片未变化，复用上次的扫描结果。")
+    paths_to_scan = [path for index, path in enumerate(image_paths) if index not in cached_results]
+
+    progress = metrics_exporter.stage_progress("scan", len(image_paths))
+    scanned_count = 0
+    # [2026-10-19] 修改: 子进程的错误日志通过队列交给主进程批量写入
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=structured_log.init_worker, initargs=(structured_log.get_queue(),)
+    ) as executor:
+        chunksize = max(1, min(64, len(paths_to_scan) // (max_workers * 8)))
+        if scan_profile is not None:
+            chunks = [paths_to_scan[i:i + chunksize] for i in range(0, len(paths_to_scan), chunksize)]
+
+            def _merge_chunks(chunk_results):
+                for chunk_result, chunk_profile in chunk_results:
+                    scan_profile.merge(chunk_profile)
+                    yield from chunk_result
+            scanned = _merge_chunks(executor.map(_process_image_chunk_profiled, chunks))
+        else:
+            scanned = executor.map(process_single_image, paths_to_scan, chunksize=chunksize)
+
+        for index, path in enumerate(image_paths):
+            if index in cached_results:
+                result = cached_results[index]
+                progress.advance()
+            else:
+                result = next(scanned)
+                scanned_count += 1
+                progress.advance_file(path, error=not result)
+                progress.set_queue_depth(len(paths_to_scan) - scanned_count)
+            yield result
+    progress.finish()
+
+
+def _finish_scan_profile(scan_profile: Optional[ScanProfile]):
+    """[2026-10-19] 新增: 打印分阶段耗时汇总并保存到 LAST_SCAN_PROFILE。"""
+    global LAST_SCAN_PROFILE
+    if scan_profile is not None:
+        scan_profile.print_summary()
+        LAST_SCAN_PROFILE = scan_profile
+
+
+def get_image_info(
+    folder_path: str,
+    scan_cache: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+    profile: Optional[bool] = None,
+) -> List[Dict[str, Any]]:
+    """
+    (多进程优化) 扫描文件夹获取所有图片路径，并使用进程池并行提取元数据。
+    
+    :param folder_path: 要扫描的根目录路径。
+    :param scan_cache: [2026-10-19 新增] 增量扫描缓存 (report_store.ReportStore.make_scan_cache)，
+                       对未变化的图片返回上次的扫描结果，这些图片不再读取。
+    :param profile: [2026-10-19 新增] 是否分阶段计时 (None 时使用 SCAN_PROFILE_ENABLED)。开启后子进程按批处理并汇总耗时，
+                    扫描结束时打印各阶段 p50/p95/p99 和最慢的文件，结果保存在 LAST_SCAN_PROFILE。
+    :return: 包含所有图片元数据字典的列表。
+    """
+    if profile is None:
+        profile = SCAN_PROFILE_ENABLED
+    # 1. 阶段：单线程快速收集所有图片路径
+    image_paths = collect_image_paths(folder_path)
 
     if not image_paths:
         return []
+
+    from tqdm import tqdm # [2025-10-31] 新增导入: 用于显示进度条和计数器
     
     image_data = []
     
     # 2. 阶段：多进程并行处理每个图片文件
+    # [2026-10-19] 修改: 缓存复用、分块提交和分阶段计时由 _iter_scan_results 统一处理
     print(f"检测到 {len(image_paths)} 个图片文件。使用 {MAX_WORKERS} 个进程并行扫描元数据...")
     
     # [2025-10-31] 新增：计数器，用于统计成功和失败
     success_count = 0
     failure_count = 0
-    
-    with concurrent.futures.ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # 使用 executor.map 将所有文件路径映射到 process_single_image 函数
-        results = executor.map(process_single_image, image_paths)
-        
-        # 3. 阶段：收集和过滤结果 (使用 tqdm 包装结果进行进度条展示)
-        # [2025-10-31] 新增: 使用 tqdm 实现任务实时预览/计数器
-        for result in tqdm(results, total=len(image_paths), desc="扫描图片元数据"):
-            # 过滤掉返回 None 的结果 (非图片或路径问题)
-            if result:
-                # 只要 result 不是 None，就将其添加到数据列表中。
-                image_data.append(result)
-                success_count += 1 # 成功获取元数据
-            else:
-                failure_count += 1 # 失败/跳过 (非图片、路径不存在等)
+
+    scan_profile = ScanProfile() if profile else None
+    results = _iter_scan_results(image_paths, scan_cache=scan_cache, scan_profile=scan_profile)
+
+    # 3. 阶段：收集和过滤结果 (使用 tqdm 包装结果进行进度条展示)
+    # [2025-10-31] 新增: 使用 tqdm 实现任务实时预览/计数器
+    for result in tqdm(results, total=len(image_paths), desc="扫描图片元数据"):
+        # 过滤掉返回 None 的结果 (非图片或路径问题)
+        if result:
+            # 只要 result 不是 None，就将其添加到数据列表中。
+            image_data.append(result)
+            success_count += 1 # 成功获取元数据
+        else:
+            failure_count += 1 # 失败/跳过 (非图片、路径不存在等)
 
     # 4. 阶段：打印最终计数器日志 (符合用户要求)
     print("\n--- 元数据扫描计数器总结 ---")
     print(f"总数量: {len(image_paths)}, 成功: {success_count}, 失败/跳过: {failure_count}")
+    _finish_scan_profile(scan_profile)
 
     return image_data
 
+
+def iter_image_info_batches(
+    folder_path: str,
+    batch_size: int = 2000,
+    scan_cache: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+    max_workers: int = MAX_WORKERS,
+    profile: Optional[bool] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    [2026-10-19] 新增: 流式扫描。与 get_image_info 的结果和顺序相同，但每完成 batch_size 个图片就产出一批，
+    下游步骤 (例如 TF-IDF 预处理) 可以在扫描进行时开始处理。
+
+    :param folder_path: 要扫描的根目录路径。
+    :param batch_size: 每批的图片数。
+    :param scan_cache: 增量扫描缓存 (见 get_image_info)。
+    :param max_workers: 扫描进程数。
+    :param profile: 是否分阶段计时 (见 get_image_info)，全部批次产出后打印汇总。
+    :return: 图片元数据字典列表的迭代器 (跳过处理失败的图片)。
+    """
+    if profile is None:
+        profile = SCAN_PROFILE_ENABLED
+    image_paths = collect_image_paths(folder_path)
+    if not image_paths:
+        return
+    scan_profile = ScanProfile() if profile else None
+    batch = []
+    for result in _iter_scan_results(image_paths, scan_cache=scan_cache, max_workers=max_workers, scan_profile=scan_profile):
+        if result:
+            batch.append(result)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+    _finish_scan_profile(scan_profile)
+
 # 注意: 此模块不包含 __main__ 块，因为它是一个工具函数模块
\ No newline at end of file
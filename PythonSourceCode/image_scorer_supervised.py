@@ -1,17 +1,93 @@
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
 from sklearn.linear_model import Ridge # 引入岭回归模型用于权重学习
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import normalize
+from scipy import sparse
 from loguru import logger
 import os
 import datetime
 import warnings
 import re # 引入正则表达式库用于新的评分提取功能
 from tqdm import tqdm 
+from typing import Iterator
+from openpyxl import Workbook, load_workbook # [2026-10-19] 新增: 分块模式使用只读/只写流式读写
+from report_store import ReportStore, REPORT_STORE_EXTENSIONS # [2026-10-19] 新增: 报告数据库 (按列读写)
 
 # 忽略 openpyxl 相关的警告，保持日志简洁
 warnings.simplefilter(action='ignore', category=UserWarning)
 
+# [2026-10-19] 新增: '00'..'99' 查找表，用于向量化格式化两位小数
+_TWO_DIGIT_TABLE = np.array([f"{i:02d}" for i in range(100)], dtype=object)
+
+
+def _top_k_per_row(contrib: sparse.csr_matrix, top_k: int, positive: bool) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    [2026-10-19] 新增: 在 CSR 行段上向量化地取每行贡献最大的 top_k 个元素。
+    
+    每一轮用 reduceat 一次性求出所有行的当前最大值，共 top_k 轮 (k 很小)，不使用逐行 Python 循环。
+    
+    :return: 每一轮一个 (行号, 特征列号, 贡献值) 元组；第 j 轮的行是第 j-1 轮的子集。
+    """
+    segment_lengths = np.diff(contrib.indptr)
+    nonempty_rows = np.flatnonzero(segment_lengths)
+    if len(nonempty_rows) == 0:
+        return []
+    starts = contrib.indptr[:-1][nonempty_rows]
+    lengths = segment_lengths[nonempty_rows]
+    # 统一转换为 "越大越重要"，非该方向的元素置 0
+    work = contrib.data if positive else -contrib.data
+    work = np.where(work > 0, work, 0.0)
+    positions = np.arange(len(work))
+    sentinel = len(work)
+
+    rounds = []
+    for _ in range(top_k):
+        row_max = np.maximum.reduceat(work, starts)
+        hit = row_max > 0
+        if not hit.any():
+            break
+        # 每行取第一个等于最大值的位置
+        candidates = np.where((work == np.repeat(row_max, lengths)) & (work > 0), positions, sentinel)
+        selected = np.minimum.reduceat(candidates, starts)[hit]
+        rounds.append((nonempty_rows[hit], contrib.indices[selected], contrib.data[selected]))
+        work[selected] = 0.0
+    return rounds
+
+
+def _format_signed(values: np.ndarray) -> np.ndarray:
+    """
+    [2026-10-19] 新增: 向量化地把浮点数格式化为 '+1.23' / '-0.45' 形式的字符串 (object 数组)。
+    """
+    cents = np.rint(np.abs(values) * 100).astype(np.int64)
+    signs = np.where(values < 0, '-', '+').astype(object)
+    return signs + (cents // 100).astype(str).astype(object) + '.' + _TWO_DIGIT_TABLE[cents % 100]
+
+
+def explain_contributions(contrib: sparse.csr_matrix, feature_names_getter, top_k: int) -> pd.Series:
+    """
+    [2026-10-19] 新增: 根据贡献矩阵 (TF-IDF 矩阵 x 模型权重) 为所有行批量生成评分解释字符串。
+    
+    :param contrib: 每行每个词对评分的贡献 (CSR 稀疏矩阵)。
+    :param feature_names_getter: 接收特征列号数组、返回特征名称数组的函数。
+    :param top_k: 每个方向列出的词汇数量。
+    :return: 与行顺序一致的解释字符串 Series，例如 '正向: a(+1.20), b(+0.50) | 负向: c(-0.80)'。
+    """
+    n_rows = contrib.shape[0]
+    parts = []
+    for positive in (True, False):
+        texts = np.full(n_rows, '', dtype=object)
+        for round_index, (rows, cols, values) in enumerate(_top_k_per_row(contrib, top_k, positive)):
+            # 只为出现过的特征列生成名称
+            unique_cols, inverse = np.unique(cols, return_inverse=True)
+            names = np.asarray(feature_names_getter(unique_cols), dtype=object)[inverse]
+            labels = names + '(' + _format_signed(values) + ')'
+            texts[rows] = labels if round_index == 0 else texts[rows] + ', ' + labels
+        parts.append(texts)
+    return pd.Series('正向: ' + parts[0] + ' | 负向: ' + parts[1])
+
+
 # 定义配置类，用于集中管理所有常量和参数 (难度: 1)
 class ScorerConfig:
     """个性化推荐评分系统的配置参数"""
@@ -32,8 +108,20 @@ class ScorerConfig:
     L_COLUMN_INDEX = 11
     # 最终预测评分的列名
     PREDICTED_SCORE_COLUMN = '个性化推荐预估评分'
+    # [2026-10-19] 新增: 单图评分解释列 (正/负贡献最大的词汇)
+    EXPLANATION_COLUMN = '评分解释(正负贡献词)'
+    # 每个方向 (正向/负向) 列出的贡献词数量，设为 0 关闭该列
+    EXPLANATION_TOP_K = 3
     # 训练目标分数的列名 (用户已敲定)
     TARGET_SCORE_COLUMN = '偏好定标分'
+    # [2026-10-19] 新增: 固定宽度特征空间 (HashingVectorizer)，词表内存不再随语料增长
+    USE_HASHING_VECTORIZER = False
+    # 哈希特征空间宽度 (2^20 个桶，约 8MB 的 IDF/权重向量)
+    HASHING_N_FEATURES = 2 ** 20
+    # [2026-10-19] 新增: 分块(out-of-core)评分模式，按固定行数流式读取、预测并写回
+    OUT_OF_CORE = False
+    # 每个分块的行数，决定峰值内存 (与归档总量无关)
+    CHUNK_SIZE = 20000
 
 
 class ImageScorer:
@@ -45,6 +133,8 @@ class ImageScorer:
         self.config = config
         self.df: pd.DataFrame = None # 存储处理中的DataFrame
         self.vectorizer: TfidfVectorizer = None # 存储TF-IDF向量化器
+        self.model: Ridge | None = None # [2026-10-19] 新增: 存储训练好的模型，用于评分解释
+        self.bucket_names: dict[int, str] = {} # [2026-10-19] 新增: 哈希模式下 桶编号 -> 词汇 (只含训练样本中出现的词)
         self.A_COLUMN_NAME: str | None = None
         self.TAG_COLUMN_NAME: str | None = None
 
@@ -89,6 +179,61 @@ class ImageScorer:
         # --- 3. 未匹配到任何明确评分，返回中性分 ---
         return self.config.DEFAULT_NEUTRAL_SCORE 
 
+    def _build_vectorizer(self):
+        """
+        [2026-10-19] 新增: 根据配置构建向量化器。
+        默认使用 TfidfVectorizer (词表随语料增长)；开启 USE_HASHING_VECTORIZER 后改为
+        HashingVectorizer + TfidfTransformer，特征空间固定为 HASHING_N_FEATURES 维。
+        """
+        # token_pattern=r'(?u)\b\w+\b' 确保正确分离标签，stop_words=None 避免移除任何标签
+        if self.config.USE_HASHING_VECTORIZER:
+            return make_pipeline(
+                self._build_hashing_vectorizer(),
+                TfidfTransformer(),
+            )
+        return TfidfVectorizer(token_pattern=r'(?u)\b\w+\b', stop_words=None)
+
+    def _build_hashing_vectorizer(self) -> HashingVectorizer:
+        """
+        构建只输出原始词频的 HashingVectorizer (无状态，无需 fit，可直接分块 transform)。
+        alternate_sign=False 保证词频非负，便于后续计算 IDF。
+        """
+        return HashingVectorizer(
+            n_features=self.config.HASHING_N_FEATURES,
+            token_pattern=r'(?u)\b\w+\b',
+            alternate_sign=False,
+            norm=None,
+        )
+
+    def _record_bucket_names(self, hasher: HashingVectorizer, texts) -> None:
+        """
+        [2026-10-19] 新增: 把训练样本中出现的词汇记入 桶编号 -> 词汇 的反向映射 (哈希冲突的词用 '/' 连接)。
+        权重只在训练样本出现过的桶上非零，其余桶的贡献恒为 0，不会出现在评分解释中，
+        因此只需记录训练样本的词汇，映射大小与训练集词汇量相同，与归档总量无关。
+        """
+        analyzer = hasher.build_analyzer()
+        tokens = sorted({token for text in texts for token in analyzer(text)})
+        if not tokens:
+            return
+        # 每个词单独作为一个文档，结果矩阵的每行恰好有一个非零桶
+        buckets = hasher.transform(tokens).indices
+        for token, bucket in zip(tokens, buckets.tolist()):
+            existing = self.bucket_names.get(bucket)
+            if existing is None:
+                self.bucket_names[bucket] = token
+            elif token not in existing.split('/'):
+                self.bucket_names[bucket] = f"{existing}/{token}"
+
+    def _get_feature_names(self, indices: np.ndarray) -> np.ndarray:
+        """
+        [2026-10-19] 新增: 获取指定特征列的名称。
+        [2026-10-19] 修改: 哈希特征空间使用训练时记录的 桶编号 -> 词汇 反向映射，
+        未记录的桶 (不应出现在解释中) 才使用 '特征#桶编号'。
+        """
+        if self.config.USE_HASHING_VECTORIZER or not hasattr(self.vectorizer, 'get_feature_names_out'):
+            return np.array([self.bucket_names.get(i, f"特征#{i}") for i in indices.tolist()], dtype=object)
+        return self.vectorizer.get_feature_names_out()[indices]
+
     def _setup_and_vectorize(self, input_df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
         """
         数据准备阶段：接受DataFrame、提取评分、TF-IDF向量化。
@@ -134,13 +279,15 @@ class ImageScorer:
         corpus = self.df[self.TAG_COLUMN_NAME].tolist() # 已经是 str 类型
         
         logger.info("开始进行 TF-IDF 向量化（特征工程）...")
-        # token_pattern=r'(?u)\b\w+\b' 确保正确分离标签，stop_words=None 避免移除任何标签
-        self.vectorizer = TfidfVectorizer(token_pattern=r'(?u)\b\w+\b', stop_words=None)
+        self.vectorizer = self._build_vectorizer()
         X_all = self.vectorizer.fit_transform(corpus) # 稀疏矩阵
         logger.info(f"TF-IDF 矩阵维度: {X_all.shape} (总样本数 x 总词汇数)")
         
         # 找出明确的高分样本索引用于训练（排除默认中性分 50.0 的样本）
         train_indices = np.where(Y_all != self.config.DEFAULT_NEUTRAL_SCORE)[0]
+        self.bucket_names = {}
+        if self.config.USE_HASHING_VECTORIZER:
+            self._record_bucket_names(self.vectorizer.steps[0][1], [corpus[i] for i in train_indices])
         
         return X_all, Y_all, train_indices
 
@@ -172,6 +319,8 @@ class ImageScorer:
 
             # 3. 结果合并与返回
             self.df[self.config.PREDICTED_SCORE_COLUMN] = final_scores
+            if self.config.EXPLANATION_TOP_K > 0:
+                self.df[self.config.EXPLANATION_COLUMN] = self._explain_scores(X_all, self.model).values
             return self.df
             
         except Exception as e:
@@ -198,11 +347,8 @@ class ImageScorer:
         train_percentage = (num_train_samples / num_total_samples) * 100
         logger.info(f"模型训练数据量：{num_train_samples} 样本 (占总样本 {num_total_samples} 的 {train_percentage:.2f}%)")
         
-        # 训练岭回归模型
-        logger.info("开始训练岭回归模型以学习个性化词汇权重...")
-        model = Ridge(alpha=1.0) # alpha=1.0 是常用的正则化参数
-        model.fit(X_train, Y_train)
-        logger.info("模型训练完成。")
+        model = self._train_model(X_train, Y_train)
+        self.model = model
         
         # 预测所有图片的评分
         logger.info(f"开始使用学到的权重预测所有 {num_total_samples} 张图片的个性化评分...")
@@ -212,18 +358,50 @@ class ImageScorer:
         final_scores = np.clip(predicted_scores, 0.0, 100.0).round().astype(int)
 
         # 打印学习到的高权重词汇，帮助您理解模型的偏好
-        feature_names = self.vectorizer.get_feature_names_out()
-        weights = pd.Series(model.coef_, index=feature_names)
-        top_weights = weights.sort_values(ascending=False).head(10)
-        logger.info(f"学到的 Top 10 正向权重词汇（影响评分提升，即您偏好的特征）:\n{top_weights.to_string()}")
+        self._log_top_weights(model)
         
         return final_scores
 
+    def _train_model(self, X_train, Y_train: np.ndarray) -> Ridge:
+        """
+        训练岭回归模型 (内存模式与分块模式共用)。
+        """
+        logger.info("开始训练岭回归模型以学习个性化词汇权重...")
+        model = Ridge(alpha=1.0) # alpha=1.0 是常用的正则化参数
+        model.fit(X_train, Y_train)
+        logger.info("模型训练完成。")
+        return model
+
+    def _explain_scores(self, X, model: Ridge) -> pd.Series:
+        """
+        [2026-10-19] 新增: 计算贡献矩阵 X * coef_ (逐元素乘积)，批量提取每张图片的正负贡献词。
+        """
+        logger.info(f"开始批量生成评分解释 (每个方向 Top {self.config.EXPLANATION_TOP_K})...")
+        contrib = sparse.csr_matrix(X @ sparse.diags(model.coef_))
+        return explain_contributions(contrib, self._get_feature_names, self.config.EXPLANATION_TOP_K)
+
+    def _log_top_weights(self, model: Ridge) -> None:
+        """
+        打印学习到的 Top 10 正向权重词汇。
+        """
+        top_indices = np.argsort(model.coef_)[::-1][:10]
+        top_weights = pd.Series(model.coef_[top_indices], index=self._get_feature_names(top_indices))
+        logger.info(f"学到的 Top 10 正向权重词汇（影响评分提升，即您偏好的特征）:\n{top_weights.to_string()}")
+
     def run_scoring_from_file(self, file_path: str) -> None:
         """
         文件评分工作流：负责文件I/O，调用 score_dataframe 进行核心处理，并保存结果。
         [2025-10-31] 更新: 遵循用户要求，直接在原文件上修改，不再创建副本。
         """
+        # [2026-10-19] 新增: 报告数据库 (.sqlite) 按列读取、只写回评分列
+        if file_path.lower().endswith(REPORT_STORE_EXTENSIONS):
+            self.run_scoring_from_store(file_path)
+            return
+        # [2026-10-19] 新增: 分块模式下改为流式读取/写回，峰值内存与文件行数无关
+        if self.config.OUT_OF_CORE:
+            self.run_scoring_from_file_chunked(file_path)
+            return
+
         total_count = 0
         success_count = 0
         
@@ -261,6 +439,180 @@ class ImageScorer:
             failure_count = total_count - success_count
             logger.info(f"总任务量: {total_count}, 成功处理量: {success_count}, 失败处理量: {failure_count}")
 
+    def run_scoring_from_store(self, db_path: str) -> None:
+        """
+        [2026-10-19] 新增: 报告数据库评分工作流。读取报告表，评分后只把新增的评分列写回原表
+        (ALTER TABLE + 批量 UPDATE)，不重写其他列。
+        """
+        total_count = 0
+        success_count = 0
+        try:
+            logger.info(f"开始读取报告数据库: {db_path}")
+            with ReportStore(db_path) as store:
+                if not store.exists():
+                    logger.error(f"报告数据库中没有报告表: {db_path}")
+                    return
+                initial_df = store.read_dataframe()
+                total_count = len(initial_df)
+
+                scored_df = self.score_dataframe(initial_df)
+                if scored_df is None:
+                    logger.error("核心评分处理失败，未生成评分结果。")
+                    return
+                self.df = scored_df
+
+                new_columns = [self.config.TARGET_SCORE_COLUMN, self.config.PREDICTED_SCORE_COLUMN]
+                if self.config.EXPLANATION_COLUMN in scored_df.columns:
+                    new_columns.append(self.config.EXPLANATION_COLUMN)
+                store.write_columns(scored_df[new_columns])
+            logger.success(f"成功写回评分列 {new_columns} 到报告数据库: {db_path}")
+            success_count = total_count
+        except Exception as e:
+            logger.error(f"处理报告数据库时发生错误: {e}")
+        finally:
+            failure_count = total_count - success_count
+            logger.info(f"总任务量: {total_count}, 成功处理量: {success_count}, 失败处理量: {failure_count}")
+
+    def _iter_excel_chunks(self, file_path: str) -> Iterator[pd.DataFrame]:
+        """
+        [2026-10-19] 新增: 以只读流模式逐行读取 Excel 第一个工作表，每 CHUNK_SIZE 行产出一个 DataFrame。
+        """
+        chunk_size = max(1, int(self.config.CHUNK_SIZE))
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+            width = len(columns)
+            buffer = []
+            for row in rows:
+                if row is None or all(v is None for v in row):
+                    continue # 与 pd.read_excel 一致，跳过空行
+                row = tuple(row[:width]) + (None,) * (width - len(row))
+                buffer.append(row)
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame(buffer, columns=columns)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=columns)
+        finally:
+            workbook.close()
+
+    def _prepare_chunk(self, chunk: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray] | None:
+        """
+        [2026-10-19] 新增: 分块模式下的数据准备：确定列名、统一类型、提取目标分数 (Y)。
+        """
+        if self.TAG_COLUMN_NAME is None:
+            self.A_COLUMN_NAME = chunk.columns[0]
+            self.TAG_COLUMN_NAME = self._get_l_column_name(chunk)
+            if self.TAG_COLUMN_NAME is None:
+                return None
+            logger.info(f"已识别的核心词汇列名（特征 X）：'{self.TAG_COLUMN_NAME}'")
+            logger.info(f"已识别的路径/文件名列名（评分提取源）：'{self.A_COLUMN_NAME}'")
+
+        chunk[self.A_COLUMN_NAME] = chunk[self.A_COLUMN_NAME].fillna('').astype(str)
+        chunk[self.TAG_COLUMN_NAME] = chunk[self.TAG_COLUMN_NAME].fillna('').astype(str)
+        chunk[self.config.TARGET_SCORE_COLUMN] = chunk[self.A_COLUMN_NAME].apply(self._extract_score_from_path)
+        return chunk, chunk[self.config.TARGET_SCORE_COLUMN].values
+
+    @staticmethod
+    def _apply_idf(counts: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+        """
+        [2026-10-19] 新增: 对原始词频矩阵应用全局 IDF 并做 L2 归一化 (等价于 TfidfTransformer 默认参数)。
+        """
+        return normalize(sparse.csr_matrix(counts.multiply(idf)), norm='l2', copy=False)
+
+    def run_scoring_from_file_chunked(self, file_path: str) -> None:
+        """
+        [2026-10-19] 新增: 分块(out-of-core)文件评分工作流。
+        
+        固定使用 HashingVectorizer 特征空间 (无需常驻词表)，分两遍流式处理 Excel：
+        1. 第一遍：逐块统计文档频率 (IDF)，只保留有明确基准分的训练样本；
+        2. 第二遍：逐块 transform + predict，以 openpyxl 只写模式增量写入临时文件，完成后替换原文件。
+        峰值内存只取决于 CHUNK_SIZE、HASHING_N_FEATURES 和训练样本数，与归档总量无关。
+        """
+        self.TAG_COLUMN_NAME = None
+        self.A_COLUMN_NAME = None
+        total_count = 0
+        success_count = 0
+        n_features = self.config.HASHING_N_FEATURES
+        hasher = self._build_hashing_vectorizer()
+        self.bucket_names = {}
+        temp_path = f"{file_path}.scoring.tmp.xlsx"
+
+        try:
+            # --- 1. 第一遍: 统计 IDF 并收集训练样本 ---
+            logger.info(f"开始分块读取 Excel 文件 (每块 {self.config.CHUNK_SIZE} 行): {file_path}")
+            doc_freq = np.zeros(n_features, dtype=np.int64)
+            train_X_parts, train_Y_parts = [], []
+            for chunk in tqdm(self._iter_excel_chunks(file_path), desc="分块评分(1/2 统计IDF)", unit="块"):
+                prepared = self._prepare_chunk(chunk)
+                if prepared is None:
+                    return
+                chunk, Y_chunk = prepared
+                counts = hasher.transform(chunk[self.TAG_COLUMN_NAME])
+                # HashingVectorizer 的输出已合并重复项，每行每个桶只出现一次
+                doc_freq += np.bincount(counts.indices, minlength=n_features)
+                total_count += counts.shape[0]
+                train_rows = np.where(Y_chunk != self.config.DEFAULT_NEUTRAL_SCORE)[0]
+                if len(train_rows):
+                    train_X_parts.append(counts[train_rows])
+                    train_Y_parts.append(Y_chunk[train_rows])
+                    self._record_bucket_names(hasher, chunk[self.TAG_COLUMN_NAME].iloc[train_rows])
+
+            if total_count == 0:
+                logger.warning("输入的Excel文件中无数据，跳过处理。")
+                return
+            if not train_X_parts:
+                logger.error(f"未找到任何明确的 '{self.config.TARGET_SCORE_COLUMN}' 样本用于训练。请检查文件夹命名或自定义标记。")
+                return
+
+            # smooth_idf 公式，与 TfidfVectorizer 默认行为一致
+            idf = np.log((1 + total_count) / (1 + doc_freq)) + 1.0
+            X_train = self._apply_idf(sparse.vstack(train_X_parts, format='csr'), idf)
+            Y_train = np.concatenate(train_Y_parts)
+            del train_X_parts, train_Y_parts
+            train_percentage = (len(Y_train) / total_count) * 100
+            logger.info(f"模型训练数据量：{len(Y_train)} 样本 (占总样本 {total_count} 的 {train_percentage:.2f}%)")
+            model = self._train_model(X_train, Y_train)
+            self.model = model
+            del X_train, Y_train
+            self._log_top_weights(model)
+
+            # --- 2. 第二遍: 分块预测并增量写入 ---
+            logger.info(f"开始分块预测并增量写入临时文件: {temp_path}")
+            out_workbook = Workbook(write_only=True)
+            out_sheet = out_workbook.create_sheet()
+            header_written = False
+            for chunk in tqdm(self._iter_excel_chunks(file_path), desc="分块评分(2/2 预测写入)", unit="块"):
+                chunk, _ = self._prepare_chunk(chunk)
+                X_chunk = self._apply_idf(hasher.transform(chunk[self.TAG_COLUMN_NAME]), idf)
+                chunk[self.config.PREDICTED_SCORE_COLUMN] = np.clip(model.predict(X_chunk), 0.0, 100.0).round().astype(int)
+                if self.config.EXPLANATION_TOP_K > 0:
+                    chunk[self.config.EXPLANATION_COLUMN] = self._explain_scores(X_chunk, model).values
+                if not header_written:
+                    out_sheet.append(list(chunk.columns))
+                    header_written = True
+                for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+                    out_sheet.append(row)
+            out_workbook.save(temp_path)
+            os.replace(temp_path, file_path)
+            logger.success(f"成功添加列 '{self.config.TARGET_SCORE_COLUMN}' 和 '{self.config.PREDICTED_SCORE_COLUMN}' 并保存到原文件: {file_path}")
+            success_count = total_count
+
+        except FileNotFoundError:
+            logger.error(f"文件未找到: {file_path}")
+        except Exception as e:
+            logger.error(f"分块处理 Excel 文件时发生错误: {e}")
+            logger.critical(f"异常警报：分块评分计算失败，请检查内存、磁盘空间或数据格式。错误信息: {e}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            failure_count = total_count - success_count
+            logger.info(f"总任务量: {total_count}, 成功处理量: {success_count}, 失败处理量: {failure_count}")
+
 # --- 主执行逻辑 ---
 def main():
     """
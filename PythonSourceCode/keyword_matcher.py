@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 多模式关键词匹配模块 (文件名标记 / 文件分类共用)。
+
+把关键词列表一次性编译为 Aho-Corasick 自动机 (需要可选依赖 pyahocorasick)，
+未安装时退化为按前缀树合并的单个正则表达式。每条提示词只扫描一遍，
+即可按关键词列表顺序返回全部命中 (与原来的 `keyword in all_prompts` 子串语义一致)。
+"""
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, Optional, Set
+
+# 可选依赖: pyahocorasick (C 扩展，速度最快)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    ahocorasick = None
+    AHOCORASICK_AVAILABLE = False
+
+
+def _build_trie_pattern(words: Iterable[str]) -> str:
+    """
+    把关键词集合构建为前缀树形式的正则 (公共前缀只匹配一次)，同一位置优先匹配最长的关键词。
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True # 结束标记
+
+    def _generate(node: Dict[str, Any]) -> str:
+        branches = [re.escape(ch) + _generate(child) for ch, child in sorted(node.items()) if ch != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # 当前节点本身是一个完整关键词时，后续分支可选 (贪婪匹配保证优先取最长)
+        return f'(?:{body})?' if '' in node else body
+
+    return _generate(trie)
+
+
+class KeywordMatcher:
+    """
+    编译一次、反复使用的多关键词子串匹配器。
+
+    匹配不区分大小写；返回结果使用关键词列表中的原始写法，并保持列表顺序
+    (列表中重复出现的关键词会重复返回，保证生成的文件名与旧逻辑完全一致)。
+    """
+    def __init__(self, keyword_list: List[str], strip_backslash: bool = False):
+        """
+        :param keyword_list: 关键词列表 (顺序即优先级)。
+        :param strip_backslash: 是否在匹配前移除提示词中的转义符 (\\)，文件名标记需要开启。
+        """
+        self.keyword_list = list(keyword_list)
+        self.strip_backslash = strip_backslash
+
+        # 按列表顺序记录 (小写关键词, 原始关键词)，原始写法取该关键词第一次出现时的写法
+        first_original: Dict[str, str] = {}
+        self._ordered: List[tuple[str, str]] = []
+        for keyword in self.keyword_list:
+            lower_keyword = keyword.strip().lower()
+            if not lower_keyword:
+                continue
+            first_original.setdefault(lower_keyword, keyword)
+            self._ordered.append((lower_keyword, first_original[lower_keyword]))
+
+        # 每个小写关键词在列表中的所有位置，用于按顺序输出
+        self._positions: Dict[str, List[int]] = {}
+        for position, (lower_keyword, _) in enumerate(self._ordered):
+            self._positions.setdefault(lower_keyword, []).append(position)
+
+        unique_keywords = list(self._positions)
+        self._automaton = None
+        self._regex = None
+        self._implied: Dict[str, Set[str]] = {}
+        if not unique_keywords:
+            return
+
+        if AHOCORASICK_AVAILABLE:
+            self._automaton = ahocorasick.Automaton()
+            for lower_keyword in unique_keywords:
+                self._automaton.add_word(lower_keyword, lower_keyword)
+            self._automaton.make_automaton()
+        else:
+            # 正则在每个位置只返回最长的关键词；被它包含的其他关键词必然同时出现，预先算好包含关系
+            self._regex = re.compile(f'(?=({_build_trie_pattern(unique_keywords)}))')
+            self._implied = {
+                keyword: {other for other in unique_keywords if other in keyword}
+                for keyword in unique_keywords
+            }
+
+    def normalize(self, positive_prompt: Any, negative_prompt: Any) -> str:
+        """
+        把正/负面提示词合并为一条小写文本 (与旧逻辑一致，用空格连接)。
+        """
+        positive = positive_prompt.lower() if isinstance(positive_prompt, str) else ""
+        negative = negative_prompt.lower() if isinstance(negative_prompt, str) else ""
+        if self.strip_backslash:
+            positive = positive.replace("\\", "")
+            negative = negative.replace("\\", "")
+        return f"{positive} {negative}"
+
+    def _present_keywords(self, text: str) -> Set[str]:
+        """
+        一次扫描找出文本 (已小写) 中出现的全部关键词 (小写形式)。
+        """
+        if self._automaton is not None:
+            return {keyword for _, keyword in self._automaton.iter(text)}
+        if self._regex is None:
+            return set()
+        present: Set[str] = set()
+        for longest in set(self._regex.findall(text)):
+            present |= self._implied[longest]
+        return present
+
+    def find_all(self, text: str) -> List[str]:
+        """
+        返回文本 (已 normalize) 命中的全部关键词，按关键词列表顺序排列。
+        """
+        present = self._present_keywords(text)
+        if not present:
+            return []
+        positions = sorted(p for keyword in present for p in self._positions[keyword])
+        return [self._ordered[p][1] for p in positions]
+
+    def find_first(self, text: str) -> Optional[str]:
+        """
+        返回文本 (已 normalize) 命中的第一个关键词 (按关键词列表优先级)，未命中返回 None。
+        """
+        present = self._present_keywords(text)
+        if not present:
+            return None
+        first_position = min(self._positions[keyword][0] for keyword in present)
+        return self._ordered[first_position][1]
+
+    def match_column(self, texts: Iterable[str]) -> List[List[str]]:
+        """
+        批量接口: 对整列文本执行 find_all。相同的提示词只匹配一次 (批量出图时提示词大量重复)。
+        """
+        cache: Dict[str, List[str]] = {}
+        results = []
+        for text in texts:
+            matched = cache.get(text)
+            if matched is None:
+                matched = cache[text] = self.find_all(text)
+            results.append(list(matched))
+        return results
+
+    def first_match_column(self, texts: Iterable[str]) -> List[Optional[str]]:
+        """
+        批量接口: 对整列文本执行 find_first，相同的提示词只匹配一次。
+        """
+        cache: Dict[str, Optional[str]] = {}
+        results = []
+        for text in texts:
+            if text not in cache:
+                cache[text] = self.find_first(text)
+            results.append(cache[text])
+        return results
+
+    def build_prompt_texts(self, image_data: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        从图片信息列表中取出 '正面提示词' 和 '负面提示词'，逐条 normalize 为待匹配文本。
+        """
+        return [self.normalize(data.get("正面提示词", ""), data.get("负面提示词", "")) for data in image_data]
+
+
+@lru_cache(maxsize=32)
+def _cached_matcher(keywords: tuple, strip_backslash: bool) -> KeywordMatcher:
+    return KeywordMatcher(list(keywords), strip_backslash)
+
+
+def get_keyword_matcher(keyword_list: List[str], strip_backslash: bool = False) -> KeywordMatcher:
+    """
+    获取 (并缓存) 关键词列表对应的匹配器，同一列表在多次调用间只编译一次。
+    """
+    return _cached_matcher(tuple(keyword_list), strip_backslash)
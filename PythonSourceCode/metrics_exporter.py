@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 长时间运行的扫描/重命名的实时吞吐指标 (可选，默认关闭)。
+
+tqdm 进度条只显示在控制台上；开启后后台线程每隔 METRICS_INTERVAL_SECONDS 秒把各阶段的进度写入:
+- Prometheus 文本文件 (node-exporter textfile collector 格式，先写临时文件再替换，采集时不会读到半个文件)；
+- JSON Lines 日志 (每次写入每个阶段一行，便于事后分析吞吐曲线)。
+进程退出时再写一次最终状态。
+
+指标 (标签 stage="scan" / "tfidf" / "rename" ...):
+    image_analyzer_items_processed_total   已处理的项目数
+    image_analyzer_items_total             项目总数
+    image_analyzer_errors_total            失败数
+    image_analyzer_bytes_processed_total   已处理文件的字节数 (扫描只读取文件头，实际读盘量更小)
+    image_analyzer_items_per_second        最近一个写入间隔内的处理速度
+    image_analyzer_bytes_per_second        最近一个写入间隔内的字节速度
+    image_analyzer_queue_depth             已提交但尚未取回结果的任务数
+    image_analyzer_eta_seconds             按最近速度估计的剩余时间
+    image_analyzer_stage_running           阶段是否正在运行 (1/0)
+    image_analyzer_last_update_timestamp_seconds  最近一次写入的时间
+
+用法: 在进度循环中
+    progress = metrics_exporter.stage_progress("scan", total)
+    for ...:
+        progress.advance_file(path, error=failed)   # 或 progress.advance(error=failed)
+    progress.finish()
+未调用 configure() 时 stage_progress 返回空操作对象，开销只有一次方法调用。
+"""
+import os
+import json
+import time
+import atexit
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+METRIC_PREFIX = "image_analyzer"
+METRICS_INTERVAL_SECONDS = 10.0
+
+
+class StageProgress:
+    """
+    单个阶段的进度计数。advance() 只在进度循环所在的线程中调用，写入线程只读取。
+    """
+    def __init__(self, name: str, total: int):
+        self.name = name
+        self.total = total
+        self.done = 0
+        self.errors = 0
+        self.bytes_processed = 0
+        self.queue_depth = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        # 上次写入时的 (时间, 已处理数, 字节数)，用于计算最近速度
+        self._last_sample = (self.started_at, 0, 0)
+        self.items_per_second = 0.0
+        self.bytes_per_second = 0.0
+
+    def advance(self, count: int = 1, bytes_processed: int = 0, error: bool = False):
+        self.done += count
+        self.bytes_processed += bytes_processed
+        if error:
+            self.errors += 1
+
+    def advance_file(self, path: str, error: bool = False):
+        """
+        处理完一个文件: 计数并累加文件大小 (只在开启指标时读取文件大小)。
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        self.advance(bytes_processed=size, error=error)
+
+    def set_queue_depth(self, depth: int):
+        self.queue_depth = depth
+
+    def finish(self):
+        self.queue_depth = 0
+        self.finished_at = time.time()
+
+    @property
+    def running(self) -> bool:
+        return self.finished_at is None
+
+    def update_rates(self, now: float):
+        """
+        计算上次写入以来的速度 (阶段结束后保留结束前最后的速度)。
+        """
+        if not self.running:
+            return
+        last_time, last_done, last_bytes = self._last_sample
+        elapsed = now - last_time
+        if elapsed > 0:
+            self.items_per_second = (self.done - last_done) / elapsed
+            self.bytes_per_second = (self.bytes_processed - last_bytes) / elapsed
+        self._last_sample = (now, self.done, self.bytes_processed)
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        if not self.running:
+            return 0.0
+        remaining = max(0, self.total - self.done)
+        if remaining == 0:
+            return 0.0
+        if self.items_per_second <= 0:
+            return None
+        return remaining / self.items_per_second
+
+    def as_dict(self, now: float) -> Dict[str, object]:
+        eta = self.eta_seconds
+        return {
+            "time": datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+            "stage": self.name,
+            "running": self.running,
+            "done": self.done,
+            "total": self.total,
+            "errors": self.errors,
+            "bytes_processed": self.bytes_processed,
+            "items_per_second": round(self.items_per_second, 3),
+            "bytes_per_second": round(self.bytes_per_second, 1),
+            "queue_depth": self.queue_depth,
+            "eta_seconds": None if eta is None else round(eta, 1),
+            "elapsed_seconds": round((self.finished_at or now) - self.started_at, 3),
+        }
+
+
+class _NullProgress:
+    """未开启指标时使用的空操作进度对象。"""
+    def advance(self, count: int = 1, bytes_processed: int = 0, error: bool = False):
+        pass
+
+    def advance_file(self, path: str, error: bool = False):
+        pass
+
+    def set_queue_depth(self, depth: int):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_PROGRESS = _NullProgress()
+
+
+def _label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class MetricsExporter:
+    """
+    定期把各阶段进度写入 Prometheus 文本文件和/或 JSON Lines 日志。
+    """
+    # (指标名, 类型, 说明, 取值函数)
+    METRICS = [
+        ("items_processed_total", "counter", "Items processed by the stage.", lambda s: s.done),
+        ("items_total", "gauge", "Total items the stage will process.", lambda s: s.total),
+        ("errors_total", "counter", "Items that failed in the stage.", lambda s: s.errors),
+        ("bytes_processed_total", "counter", "Size in bytes of the files processed by the stage.", lambda s: s.bytes_processed),
+        ("items_per_second", "gauge", "Items processed per second over the last interval.", lambda s: s.items_per_second),
+        ("bytes_per_second", "gauge", "Bytes processed per second over the last interval.", lambda s: s.bytes_per_second),
+        ("queue_depth", "gauge", "Submitted tasks whose results have not been collected yet.", lambda s: s.queue_depth),
+        ("eta_seconds", "gauge", "Estimated seconds until the stage finishes.", lambda s: s.eta_seconds),
+        ("stage_running", "gauge", "Whether the stage is running.", lambda s: 1 if s.running else 0),
+        ("stage_start_timestamp_seconds", "gauge", "Unix time the stage started.", lambda s: s.started_at),
+    ]
+
+    def __init__(self, textfile: Optional[str] = None, jsonl: Optional[str] = None, interval: float = METRICS_INTERVAL_SECONDS):
+        self.textfile = textfile
+        self.jsonl = jsonl
+        self.interval = interval
+        self.stages: Dict[str, StageProgress] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def stage_progress(self, name: str, total: int) -> StageProgress:
+        """
+        注册 (或重新开始) 一个阶段。同名阶段再次开始时替换旧的计数。
+        """
+        progress = StageProgress(name, total)
+        with self._lock:
+            self.stages[name] = progress
+        return progress
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"【指标写入失败】{e}")
+
+    def write(self):
+        now = time.time()
+        with self._lock:
+            stages: List[StageProgress] = list(self.stages.values())
+        for stage in stages:
+            stage.update_rates(now)
+        if self.textfile:
+            self._write_textfile(stages, now)
+        if self.jsonl and stages:
+            with open(self.jsonl, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(stage.as_dict(now), ensure_ascii=False) + "\n" for stage in stages))
+
+    def render_textfile(self, stages: List[StageProgress], now: float) -> str:
+        lines = []
+        for name, metric_type, help_text, getter in self.METRICS:
+            metric = f"{METRIC_PREFIX}_{name}"
+            samples = [(stage, getter(stage)) for stage in stages]
+            samples = [(stage, value) for stage, value in samples if value is not None]
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for stage, value in samples:
+                lines.append(f'{metric}{{stage="{_label_value(stage.name)}"}} {value!r}')
+        metric = f"{METRIC_PREFIX}_last_update_timestamp_seconds"
+        lines += [f"# HELP {metric} Unix time the metrics were last written.", f"# TYPE {metric} gauge", f"{metric} {now:.3f}"]
+        return "\n".join(lines) + "\n"
+
+    def _write_textfile(self, stages: List[StageProgress], now: float):
+        # 临时文件必须与目标在同一目录 (os.replace 原子替换)，且不能以 .prom 结尾 (避免被采集)
+        temp_path = f"{self.textfile}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_textfile(stages, now))
+        os.replace(temp_path, self.textfile)
+
+
+_exporter: Optional[MetricsExporter] = None
+
+
+def configure(textfile: Optional[str] = None, jsonl: Optional[str] = None, interval: float = METRICS_INTERVAL_SECONDS) -> Optional[MetricsExporter]:
+    """
+    开启全局指标导出 (textfile 和 jsonl 都为空时不开启)。进程退出时自动写入最终状态。
+    """
+    global _exporter
+    if not textfile and not jsonl:
+        return None
+    if _exporter is not None:
+        _exporter.stop()
+    _exporter = MetricsExporter(textfile, jsonl, interval)
+    _exporter.start()
+    atexit.register(_exporter.stop)
+    return _exporter
+
+
+def shutdown():
+    """停止全局指标导出并写入最终状态。"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
+
+
+def stage_progress(name: str, total: int):
+    """
+    返回阶段的进度对象；未开启指标导出时返回空操作对象。
+    """
+    if _exporter is None:
+        return NULL_PROGRESS
+    return _exporter.stage_progress(name, total)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 跨卷感知的文件/文件夹移动引擎。
+
+同一卷内直接 os.rename (只改元数据)；当目标位于其他卷 (os.rename 抛出 EXDEV) 时，
+自动改为内核态复制 (os.copy_file_range / os.sendfile，平台不支持时退化为 shutil 缓冲复制)，
+写入临时文件 -> 校验 -> 改名为最终文件名 -> 删除源文件，复制过程中任何失败都不会删除源文件。
+文件夹跨卷移动时以有限的线程数并行复制，并显示进度和字节速率。
+"""
+import os
+import sys
+import errno
+import shutil
+import hashlib
+import threading
+import time
+import concurrent.futures
+from typing import List, Optional, Tuple
+from tqdm import tqdm
+from virtual_fs import REAL_FS # [2026-10-19] 新增: 文件系统抽象 (支持内存中模拟运行)
+
+# 跨卷复制的最大并行线程数 (机械硬盘/网络共享不宜过大)
+MAX_COPY_WORKERS = 4
+# 单次内核复制调用的最大字节数
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+# 复制过程中使用的临时文件后缀，校验通过后才改为最终文件名
+TEMP_SUFFIX = ".moving.tmp"
+
+# 校验方式
+VERIFY_SIZE = "size" # 只比较文件大小 (默认，几乎无额外开销)
+VERIFY_HASH = "hash" # 比较完整内容哈希 (需要重新读取源文件和目标文件)
+
+
+class MoveStats:
+    """
+    移动操作统计 (线程安全)，用于报告进度和字节速率。
+    """
+    def __init__(self):
+        self.renamed = 0       # 同卷 os.rename 的次数
+        self.copied_files = 0  # 跨卷复制的文件数
+        self.copied_bytes = 0  # 跨卷复制的字节数
+        self.failed = 0        # 失败的文件数
+        self.copy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_rename(self):
+        with self._lock:
+            self.renamed += 1
+
+    def add_copy(self, size: int):
+        with self._lock:
+            self.copied_files += 1
+            self.copied_bytes += size
+
+    def add_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.copied_bytes / self.copy_seconds if self.copy_seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"同卷重命名: {self.renamed} 次, 跨卷复制: {self.copied_files} 个文件 / "
+            f"{self.copied_bytes / 1024 / 1024:.1f} MB, 耗时 {self.copy_seconds:.1f} 秒, "
+            f"速率 {self.bytes_per_second / 1024 / 1024:.1f} MB/s, 失败: {self.failed} 个"
+        )
+
+
+def _copy_fd_range(src_fd: int, dst_fd: int, size: int, progress: Optional[tqdm]) -> None:
+    """
+    在两个文件描述符之间复制 size 字节，优先使用内核态零拷贝接口。
+    """
+    copied = 0
+
+    # 1. copy_file_range (Linux 4.5+，5.3+ 支持跨文件系统)
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                n = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK_SIZE, size - copied))
+                if n == 0:
+                    break
+                copied += n
+                if progress is not None:
+                    progress.update(n)
+            if copied == size:
+                return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                raise
+
+    # 2. sendfile (Linux 2.6.33+ 支持文件到文件)
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        try:
+            while copied < size:
+                n = os.sendfile(dst_fd, src_fd, copied, min(COPY_CHUNK_SIZE, size - copied))
+                if n == 0:
+                    break
+                copied += n
+                if progress is not None:
+                    progress.update(n)
+            if copied == size:
+                return
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EINVAL):
+                raise
+
+    # 3. 用户态缓冲复制 (Windows 等平台)
+    os.lseek(src_fd, copied, os.SEEK_SET)
+    os.lseek(dst_fd, copied, os.SEEK_SET)
+    while copied < size:
+        buffer = os.read(src_fd, min(COPY_CHUNK_SIZE, size - copied))
+        if not buffer:
+            break
+        view = memoryview(buffer)
+        while view:
+            written = os.write(dst_fd, view)
+            view = view[written:]
+        copied += len(buffer)
+        if progress is not None:
+            progress.update(len(buffer))
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def copy_file_verified(
+    source_path: str,
+    target_path: str,
+    verify: str = VERIFY_SIZE,
+    progress: Optional[tqdm] = None,
+) -> int:
+    """
+    把单个文件复制到 target_path (目标不得已存在)：先写临时文件，校验通过后再改为最终文件名，
+    并复制时间戳/权限。不会删除源文件。
+
+    :return: 复制的字节数。
+    :raises OSError: 复制或校验失败 (此时临时文件已被清理)。
+    """
+    if os.path.exists(target_path):
+        raise FileExistsError(errno.EEXIST, "目标文件已存在", target_path)
+
+    temp_path = target_path + TEMP_SUFFIX
+    try:
+        with open(source_path, "rb") as src, open(temp_path, "wb") as dst:
+            size = os.fstat(src.fileno()).st_size
+            _copy_fd_range(src.fileno(), dst.fileno(), size, progress)
+            dst.flush()
+            os.fsync(dst.fileno())
+            if os.fstat(dst.fileno()).st_size != size:
+                raise OSError(errno.EIO, f"复制后文件大小不一致 (源 {size} 字节)", target_path)
+        if verify == VERIFY_HASH and _file_digest(source_path) != _file_digest(temp_path):
+            raise OSError(errno.EIO, "复制后内容哈希不一致", target_path)
+        shutil.copystat(source_path, temp_path)
+        os.rename(temp_path, target_path)
+        return size
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _move_file_across_devices(source_path: str, target_path: str, verify: str, stats: MoveStats, progress: Optional[tqdm]) -> None:
+    size = copy_file_verified(source_path, target_path, verify, progress)
+    # 只有复制并校验成功后才删除源文件
+    os.remove(source_path)
+    stats.add_copy(size)
+
+
+def _move_tree_across_devices(source_dir: str, target_dir: str, verify: str, stats: MoveStats, max_workers: int) -> None:
+    """
+    跨卷移动整个文件夹：重建目录结构，以有限并行度复制文件，全部成功后自底向上删除源文件夹。
+    """
+    file_jobs: List[Tuple[str, str, int]] = []
+    source_dirs: List[str] = []
+    for root, _, files in os.walk(source_dir):
+        source_dirs.append(root)
+        target_root = os.path.join(target_dir, os.path.relpath(root, source_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            source_path = os.path.join(root, name)
+            file_jobs.append((source_path, os.path.join(target_root, name), os.path.getsize(source_path)))
+
+    total_bytes = sum(size for _, _, size in file_jobs)
+    errors: List[str] = []
+    with tqdm(total=total_bytes, unit="B", unit_scale=True, unit_divisor=1024, desc=f"跨卷移动 {os.path.basename(source_dir)}") as progress:
+        lock = threading.Lock()
+
+        def _job(job: Tuple[str, str, int]):
+            source_path, target_path, _ = job
+            try:
+                _move_file_across_devices(source_path, target_path, verify, stats, None)
+                with lock:
+                    progress.update(job[2])
+            except OSError as e:
+                stats.add_failure()
+                errors.append(f"{source_path}: {e}")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            list(executor.map(_job, file_jobs))
+
+    if errors:
+        raise OSError(errno.EIO, f"跨卷移动文件夹时有 {len(errors)} 个文件失败 (源文件已保留)，第一个错误: {errors[0]}", source_dir)
+
+    # 全部文件已转移，自底向上删除源文件夹
+    for directory in sorted(source_dirs, key=lambda d: d.count(os.sep), reverse=True):
+        os.rmdir(directory)
+
+
+def move_path(
+    source_path: str,
+    target_path: str,
+    stats: Optional[MoveStats] = None,
+    verify: str = VERIFY_SIZE,
+    max_workers: int = MAX_COPY_WORKERS,
+    fs=REAL_FS,
+) -> None:
+    """
+    移动文件或文件夹 (os.rename 的跨卷安全替代品)。
+
+    同卷时等价于 os.rename；跨卷 (EXDEV) 时复制 -> 校验 -> 删除源，文件夹内文件并行复制。
+
+    :param source_path: 源文件/文件夹路径。
+    :param target_path: 目标路径 (不得已存在)。
+    :param stats: 可选的统计对象，多次调用可累计。
+    :param verify: VERIFY_SIZE 或 VERIFY_HASH。
+    :param max_workers: 跨卷复制文件夹时的最大并行线程数。
+    :param fs: 文件系统 (REAL_FS 或 virtual_fs.VirtualFileSystem，虚拟文件系统不存在跨卷的情况)。
+    :raises OSError: 移动失败 (跨卷失败时源文件保持不变)。
+    """
+    stats = stats if stats is not None else MoveStats()
+    try:
+        fs.rename(source_path, target_path)
+        stats.add_rename()
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    start_time = time.perf_counter()
+    try:
+        if os.path.isdir(source_path):
+            _move_tree_across_devices(source_path, target_path, verify, stats, max_workers)
+        else:
+            try:
+                _move_file_across_devices(source_path, target_path, verify, stats, None)
+            except OSError:
+                stats.add_failure()
+                raise
+    finally:
+        stats.copy_seconds += time.perf_counter() - start_time
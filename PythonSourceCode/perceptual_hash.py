@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 感知哈希近似重复查找 (对应主程序 TODO "webp和png格式转换后去重")。
+
+PNG 转换为 WebP/JPEG 后文件内容完全不同，duplicate_finder 的内容哈希找不到这类副本。这里为每张图片计算
+64 位感知哈希，转换/有损压缩只会改变少数几位:
+- dHash: 缩小到 9x8 灰度图，比较相邻像素的明暗；
+- pHash: 缩小到 32x32 灰度图做二维 DCT，取左上角 8x8 低频系数 (去掉直流分量) 与中位数比较。
+只需要缩小后的图像: JPEG 使用 Image.draft 让解码器直接按 1/2~1/8 缩小解码，其他格式用 thumbnail
+(reducing_gap) 先快速缩小再精确重采样。哈希在进程池中计算，结果与内容哈希一起保存在 hash_cache.HashCache 中
+(按路径 + 大小 + 修改时间失效)。不放在报告数据库的扫描缓存 (report_store.make_scan_cache) 中: 扫描缓存只在
+增量模式下存在，它的列就是报告的列 (会写入 Excel)，非增量报告每次整表重写；哈希缓存与报告模式无关，
+并且与 duplicate_finder 共用同一个文件签名。
+
+近似重复对的查找使用多索引哈希 (multi-index hashing): 把 64 位哈希分成 d+1 段，汉明距离不超过 d 的两个哈希
+至少有一段完全相同 (抽屉原理)。每段建一个 {段值: [编号]} 的桶，只比较落在同一个桶里的哈希，
+避免 O(N²) 的两两比较；桶的平均大小为 N / 2^(64/(d+1))，距离阈值较小时接近线性。
+"""
+import os
+import concurrent.futures
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import structured_log
+from hash_cache import HashCache, HASH_CACHE_FILE
+
+# 两张图片的 pHash 和 dHash 汉明距离都不超过该值时视为近似重复 (64 位中)
+NEAR_DUPLICATE_DISTANCE = 6
+HASH_BITS = 64
+# 计算 pHash 的缩小尺寸
+PHASH_SIZE = 32
+# 计算感知哈希的进程数
+PHASH_WORKERS = os.cpu_count() or 4
+# 每个子进程任务包含的图片数
+PHASH_CHUNKSIZE = 32
+
+NEAR_DUPLICATE_SHEET_NAME = "近似重复"
+NEAR_DUPLICATE_COLUMNS = ["近似组", "组内文件数", "建议", "格式", "宽", "高", "文件大小(字节)", "与保留图片的距离", "图片超链接", "图片的绝对路径"]
+SUGGEST_KEEP = "保留"
+SUGGEST_REVIEW = "近似副本"
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """正交 DCT-II 变换矩阵 (二维 DCT = M @ X @ M.T)，避免依赖 scipy。"""
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def _reduced_grayscale(image: Image.Image) -> Image.Image:
+    """
+    缩小解码并转为灰度图 (不小于 PHASH_SIZE x PHASH_SIZE)。
+    """
+    if image.format == "JPEG":
+        # JPEG 解码器直接输出缩小 (1/2~1/8) 的灰度图，不解码全尺寸图像
+        image.draft("L", (PHASH_SIZE * 2, PHASH_SIZE * 2))
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        # 透明区域按白色背景处理 (PNG 转 JPEG 时透明区域同样变为纯色)
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    image = image.convert("L")
+    image.thumbnail((PHASH_SIZE * 2, PHASH_SIZE * 2), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return image
+
+
+def image_hashes(image: Image.Image) -> Tuple[int, int]:
+    """
+    计算 (dHash, pHash)，均为 64 位整数。
+    """
+    gray = _reduced_grayscale(image)
+    pixels = np.asarray(gray.resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    dhash = _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+    pixels = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.LANCZOS), dtype=np.float64)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:8, :8].ravel()[1:]
+    # 去掉直流分量后剩 63 位，最高位固定为 0
+    phash = _bits_to_int(coefficients > np.median(coefficients))
+    return dhash, phash
+
+
+def hash_file(path: str) -> Tuple[str, Optional[Tuple[int, int, int, int, str]], Optional[str]]:
+    """
+    子进程任务: 计算单个文件的感知哈希。
+
+    :return: (路径, (dHash, pHash, 宽, 高, 格式) 或 None, 错误信息或 None)。
+    """
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            image_format = image.format or ""
+            dhash, phash = image_hashes(image)
+        return path, (dhash, phash, width, height, image_format), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def _hash_chunk(paths: List[str]) -> List[tuple]:
+    return [hash_file(path) for path in paths]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHammingIndex:
+    """
+    多索引哈希: 查找所有汉明距离不超过 max_distance 的哈希对。
+    """
+    def __init__(self, hashes: List[int], max_distance: int, bits: int = HASH_BITS):
+        self.hashes = hashes
+        self.max_distance = max_distance
+        segments = max_distance + 1
+        # 各段的 (起始位, 位数)，尽量等长
+        bounds = [round(i * bits / segments) for i in range(segments + 1)]
+        self.segments = [(start, end - start) for start, end in zip(bounds, bounds[1:]) if end > start]
+        self.buckets: List[Dict[int, List[int]]] = []
+        for start, width in self.segments:
+            mask = (1 << width) - 1
+            buckets = defaultdict(list)
+            for index, value in enumerate(hashes):
+                buckets[(value >> start) & mask].append(index)
+            self.buckets.append(buckets)
+
+    def pairs(self) -> Iterable[Tuple[int, int, int]]:
+        """
+        :return: 生成 (编号 i, 编号 j, 距离)，i < j，每对只生成一次。
+        """
+        hashes, max_distance = self.hashes, self.max_distance
+        for segment_number, buckets in enumerate(self.buckets):
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                for position, i in enumerate(members):
+                    hash_i = hashes[i]
+                    for j in members[position + 1:]:
+                        distance = (hash_i ^ hashes[j]).bit_count()
+                        if distance > max_distance:
+                            continue
+                        # 同一对可能在多个段中相同: 只在第一个相同的段中生成
+                        if self._first_equal_segment(hash_i, hashes[j]) == segment_number:
+                            yield i, j, distance
+
+    def _first_equal_segment(self, a: int, b: int) -> int:
+        diff = a ^ b
+        for segment_number, (start, width) in enumerate(self.segments):
+            if (diff >> start) & ((1 << width) - 1) == 0:
+                return segment_number
+        return -1
+
+
+def compute_perceptual_hashes(
+    paths: Iterable[str],
+    cache_path: Optional[str] = HASH_CACHE_FILE,
+    max_workers: int = PHASH_WORKERS,
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+    """
+    计算 (或从缓存读取) 图片的感知哈希。
+
+    :return: ({路径: {"dhash", "phash", "width", "height", "format", "size"}}, 统计 {图片数, 缓存命中, 计算数, 失败数})。
+    """
+    signatures: Dict[str, Tuple[int, int]] = {}
+    for path in dict.fromkeys(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signatures[path] = (stat.st_size, stat.st_mtime_ns)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    stats = {"图片数": len(signatures), "缓存命中": 0, "计算数": 0, "失败数": 0}
+    cache = HashCache(cache_path) if cache_path else None
+    try:
+        if cache:
+            for path, values in cache.lookup(signatures).items():
+                if values.get("dhash") and values.get("phash") and values.get("image_info"):
+                    width, height, image_format = values["image_info"].split(",", 2)
+                    results[path] = {
+                        "dhash": int(values["dhash"], 16), "phash": int(values["phash"], 16),
+                        "width": int(width), "height": int(height), "format": image_format, "size": signatures[path][0],
+                    }
+        stats["缓存命中"] = len(results)
+        todo = [path for path in signatures if path not in results]
+        stats["计算数"] = len(todo)
+        new_entries = []
+        if todo:
+            chunks = [todo[i:i + PHASH_CHUNKSIZE] for i in range(0, len(todo), PHASH_CHUNKSIZE)]
+            from tqdm import tqdm
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max(1, max_workers), initializer=structured_log.init_worker, initargs=(structured_log.get_queue(),)
+            ) as executor:
+                with tqdm(total=len(todo), desc="计算感知哈希") as progress_bar:
+                    for chunk_result in executor.map(_hash_chunk, chunks):
+                        for path, hashes, error in chunk_result:
+                            progress_bar.update(1)
+                            if hashes is None:
+                                stats["失败数"] += 1
+                                structured_log.log_event(f"计算感知哈希失败 {path}: {error}", stage="phash", file=path)
+                                continue
+                            dhash, phash, width, height, image_format = hashes
+                            results[path] = {
+                                "dhash": dhash, "phash": phash, "width": width, "height": height,
+                                "format": image_format, "size": signatures[path][0],
+                            }
+                            new_entries.append((path, *signatures[path], {
+                                "dhash": f"{dhash:016x}", "phash": f"{phash:016x}", "image_info": f"{width},{height},{image_format}",
+                            }))
+        if cache and new_entries:
+            cache.store(new_entries)
+    finally:
+        if cache:
+            cache.close()
+    return results, stats
+
+
+def _group_pairs(count: int, pairs: Iterable[Tuple[int, int]]) -> List[List[int]]:
+    """并查集: 把近似重复对合并为组。"""
+    parent = list(range(count))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[root_j] = root_i
+    groups = defaultdict(list)
+    for index in range(count):
+        groups[find(index)].append(index)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def find_near_duplicates(
+    paths: Iterable[str],
+    max_distance: int = NEAR_DUPLICATE_DISTANCE,
+    cache_path: Optional[str] = HASH_CACHE_FILE,
+    max_workers: int = PHASH_WORKERS,
+) -> Dict[str, Any]:
+    """
+    查找近似重复的图片 (例如同一张图片的 PNG 原图和 WebP/JPEG 转换副本)。
+
+    以 pHash 建立多索引，候选对再要求 dHash 距离也不超过 max_distance；近似关系按传递性合并为组。
+    组内保留像素最多的图片 (像素相同时保留文件最小的，即通常保留转换后的副本)，其余标为近似副本。
+
+    :param paths: 图片路径 (通常是扫描结果的 '图片的绝对路径' 列)。
+    :param max_distance: 汉明距离阈值 (0~63)。
+    :param cache_path: 哈希缓存数据库路径，None 表示不使用缓存。
+    :param max_workers: 计算哈希的进程数。
+    :return: {"groups": [[路径, ...], ...] (每组第一个为保留的图片), "hashes": {路径: 哈希信息},
+              "distances": {路径: 与保留图片的 pHash 距离}, "stats": {...}}。
+    """
+    hashes, stats = compute_perceptual_hashes(paths, cache_path, max_workers)
+    ordered_paths = list(hashes)
+    phashes = [hashes[path]["phash"] for path in ordered_paths]
+    index = MultiIndexHammingIndex(phashes, max_distance)
+    pairs = [
+        (i, j) for i, j, _ in index.pairs()
+        if hamming_distance(hashes[ordered_paths[i]]["dhash"], hashes[ordered_paths[j]]["dhash"]) <= max_distance
+    ]
+    stats["近似对数"] = len(pairs)
+
+    groups = []
+    distances: Dict[str, int] = {}
+    for members in _group_pairs(len(ordered_paths), pairs):
+        group = sorted(
+            (ordered_paths[i] for i in members),
+            key=lambda path: (-hashes[path]["width"] * hashes[path]["height"], hashes[path]["size"], path),
+        )
+        keep = hashes[group[0]]["phash"]
+        for path in group:
+            distances[path] = hamming_distance(keep, hashes[path]["phash"])
+        groups.append(group)
+    groups.sort(key=lambda group: sum(hashes[path]["size"] for path in group[1:]), reverse=True)
+    stats["近似组数"] = len(groups)
+    stats["近似副本数"] = sum(len(group) - 1 for group in groups)
+    stats["副本字节数"] = sum(hashes[path]["size"] for group in groups for path in group[1:])
+    return {"groups": groups, "hashes": hashes, "distances": distances, "stats": stats}
+
+
+def near_duplicate_sheet_records(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    把 find_near_duplicates 的结果转换为报告工作表的行 (每个文件一行，同组相邻)。
+    """
+    hashes, distances = result["hashes"], result["distances"]
+    records = []
+    for group_number, group in enumerate(result["groups"], start=1):
+        for position, path in enumerate(group):
+            info = hashes[path]
+            records.append({
+                "近似组": group_number,
+                "组内文件数": len(group),
+                "建议": SUGGEST_KEEP if position == 0 else SUGGEST_REVIEW,
+                "格式": info["format"],
+                "宽": info["width"],
+                "高": info["height"],
+                "文件大小(字节)": info["size"],
+                "与保留图片的距离": distances[path],
+                "图片超链接": path,
+                "图片的绝对路径": path,
+            })
+    return records
+
+
+def print_near_duplicate_summary(stats: Dict[str, Any]):
+    print("\n--- 近似重复图片查找 (感知哈希) ---")
+    print(f"图片 {stats['图片数']} 张；缓存命中 {stats['缓存命中']}，计算 {stats['计算数']}，失败 {stats['失败数']}")
+    print(f"近似对 {stats['近似对数']} 个，近似组 {stats['近似组数']} 个，近似副本 {stats['近似副本数']} 个 ({stats['副本字节数'] / 1024 ** 2:.1f} MB)")
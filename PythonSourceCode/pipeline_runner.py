@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 无交互的流水线运行器 (可用于计划任务 / cron)。
+
+getIMGINFOandClassify.py 的 __main__ 通过 input() 提问并严格串行执行；本模块用命令行参数或 JSON 配置文件
+描述同样的流程，并把它组织为阶段图 (StageGraph): 每个阶段声明依赖，依赖完成即开始执行，互不依赖的阶段并行:
+- 扫描按批产出结果，TF-IDF 预处理在扫描进行时逐批消费 (BatchChannel)；
+- TF-IDF 与评分并行 (评分只使用扫描结果的 A 列和 L 列)；
+- 分类模式下报告写入与文件分类并行 (报告记录分类前的路径，与交互流程一致)。
+结束时打印每个阶段的开始时间、墙钟时间和 CPU 时间。
+[2026-10-19] 新增: --memory-profile 记录每个阶段的 Python 分配峰值、主进程/子进程 RSS 峰值和 (阶段内存创新高时) 该阶段新增最多的分配位置
+(见 stage_memory.py)。
+[2026-10-19] 新增: --scan-profile 扫描分阶段计时 (与交互流程的 SCAN_PROFILE_ENABLED 相同，见 scan_profiler.py)。
+
+用法:
+    python pipeline_runner.py <扫描文件夹> --mode tag
+    python pipeline_runner.py <扫描文件夹> --mode classify --yes
+    python pipeline_runner.py --config pipeline.json --timing-json timing.json
+    python pipeline_runner.py <扫描文件夹> --mode tag --memory-profile
+    python pipeline_runner.py <扫描文件夹> --metrics-textfile /var/lib/node_exporter/textfile/image_analyzer.prom --metrics-jsonl metrics.jsonl
+
+配置文件为 JSON 对象，键与命令行参数的长名称一致 (连字符换成下划线)，例如
+{"folder": "D:/outputs/历史", "mode": "tag", "score": true, "incremental": true}；命令行参数优先于配置文件。
+"""
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import concurrent.futures
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+# resource 模块只在类 Unix 系统上可用，用于统计子进程 (扫描/TF-IDF 进程池) 的 CPU 时间
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import metrics_exporter
+import getIMGINFOandClassify as driver
+from image_scanner import iter_image_info_batches, log_error, SCAN_RESULT_COLUMNS
+from rename_planner import recover_pending_renames
+
+MODE_TAG = "tag"           # 对应交互菜单 1: 标记 & 评分重命名 & 生成报告
+MODE_CLASSIFY = "classify" # 对应交互菜单 2: 文件分类 & 生成报告
+MODE_REPORT = "report"     # 对应交互菜单 3: 只生成报告
+
+STAGE_DONE = "完成"
+STAGE_FAILED = "失败"
+STAGE_SKIPPED = "跳过"
+
+SCAN_BATCH_SIZE = 2000
+PREDICTED_SCORE_COLUMN = "个性化推荐预估评分"
+
+
+def _children_cpu_time() -> float:
+    """已结束的子进程累计 CPU 时间 (用户态 + 内核态)；不支持时返回 0。"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class BatchChannel:
+    """
+    阶段之间传递数据批次的单消费者通道。生产者 put() 若干批后必须 close() (通常放在 finally 中)，
+    消费者迭代通道直到关闭。
+    """
+    _CLOSED = object()
+
+    def __init__(self, max_batches: int = 8):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_batches)
+
+    def put(self, batch: Any):
+        self._queue.put(batch)
+
+    def close(self):
+        self._queue.put(self._CLOSED)
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            batch = self._queue.get()
+            if batch is self._CLOSED:
+                return
+            yield batch
+
+
+class Stage:
+    """
+    阶段: func(results) 的返回值保存在 results[name] 中，results 包含全部已完成阶段的结果。
+    """
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = ()):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.status: Optional[str] = None
+        self.start = 0.0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.error: Optional[str] = None
+
+
+class StageGraph:
+    """
+    阶段图调度器: 依赖全部完成的阶段立即提交到线程池；依赖失败或被跳过的阶段标记为跳过。
+
+    CPU 时间 = 阶段线程自身的 CPU 时间 + 阶段运行期间结束的子进程的 CPU 时间。
+    并行阶段各自的进程池同时结束时，子进程时间可能计入其中任意一个阶段 (近似值)。
+
+    [2026-10-19] 新增: 传入 memory_monitor (stage_memory.StageMemoryMonitor) 时同时记录各阶段的内存峰值。
+    """
+    def __init__(self, memory_monitor=None):
+        self.memory_monitor = memory_monitor
+        self.stages: Dict[str, Stage] = {}
+        self.results: Dict[str, Any] = {}
+        self.started_at = 0.0
+        self.total_wall = 0.0
+
+    def add(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = ()) -> Stage:
+        deps = [dep for dep in deps if dep]
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"阶段 '{name}' 依赖的阶段 '{dep}' 不存在 (依赖必须先添加)。")
+        stage = Stage(name, func, deps)
+        self.stages[name] = stage
+        return stage
+
+    def _run_stage(self, stage: Stage) -> Any:
+        stage.start = time.perf_counter() - self.started_at
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        children_start = _children_cpu_time()
+        if self.memory_monitor is not None:
+            self.memory_monitor.stage_started(stage.name)
+        try:
+            return stage.func(self.results)
+        finally:
+            stage.wall = time.perf_counter() - wall_start
+            stage.cpu = (time.thread_time() - cpu_start) + (_children_cpu_time() - children_start)
+            if self.memory_monitor is not None:
+                self.memory_monitor.stage_finished(stage.name)
+
+    def run(self, max_workers: Optional[int] = None) -> bool:
+        """
+        执行全部阶段。
+
+        :param max_workers: 同时运行的最大阶段数 (默认为阶段总数)。
+        :return: 全部阶段都完成时返回 True。
+        """
+        self.started_at = time.perf_counter()
+        pending = dict(self.stages)
+        running: Dict[concurrent.futures.Future, Stage] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or max(1, len(self.stages))) as executor:
+            while pending or running:
+                for name in list(pending):
+                    stage = pending[name]
+                    dep_status = [self.stages[dep].status for dep in stage.deps]
+                    if any(status in (STAGE_FAILED, STAGE_SKIPPED) for status in dep_status):
+                        stage.status = STAGE_SKIPPED
+                        del pending[name]
+                    elif all(status == STAGE_DONE for status in dep_status):
+                        running[executor.submit(self._run_stage, stage)] = stage
+                        del pending[name]
+                if not running:
+                    if pending:
+                        # 只剩依赖未满足的阶段 (不应发生: add() 要求依赖先添加，不会形成环)
+                        for stage in pending.values():
+                            stage.status = STAGE_SKIPPED
+                        pending.clear()
+                    break
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        self.results[stage.name] = future.result()
+                        stage.status = STAGE_DONE
+                    except Exception as e:
+                        stage.status = STAGE_FAILED
+                        stage.error = str(e)
+                        log_error(f"流水线阶段 '{stage.name}' 失败: {e}")
+        self.total_wall = time.perf_counter() - self.started_at
+        return all(stage.status == STAGE_DONE for stage in self.stages.values())
+
+    def timings(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "阶段": stage.name,
+                "依赖": stage.deps,
+                "状态": stage.status,
+                "开始(秒)": round(stage.start, 3),
+                "墙钟(秒)": round(stage.wall, 3),
+                "CPU(秒)": round(stage.cpu, 3),
+                "错误": stage.error,
+            }
+            for stage in self.stages.values()
+        ]
+
+    def print_summary(self):
+        print("\n--- 流水线阶段耗时 ---")
+        print(f"{'阶段':<16}{'状态':<6}{'开始(秒)':>10}{'墙钟(秒)':>10}{'CPU(秒)':>10}")
+        for stage in self.stages.values():
+            print(f"{stage.name:<16}{stage.status or '-':<6}{stage.start:>10.2f}{stage.wall:>10.2f}{stage.cpu:>10.2f}")
+        serial_wall = sum(stage.wall for stage in self.stages.values())
+        print(f"总墙钟时间: {self.total_wall:.2f} 秒 (各阶段串行合计 {serial_wall:.2f} 秒)")
+
+
+def _final_records(results: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    合并扫描结果、TF-IDF 列和评分列，列顺序与交互流程一致: 扫描列 -> TF-IDF 列 -> 评分列。
+    """
+    df = pd.DataFrame(results["scan"])
+    if "tfidf" in results:
+        excel_features, suffixes = results["tfidf"]
+        df[driver.TFIDF_NEW_COLUMN_NAME] = excel_features
+        df[driver.TFIDF_SUFFIX_COLUMN] = suffixes
+    scored = results.get("score")
+    if scored is not None:
+        for column in scored.columns:
+            if column not in df.columns:
+                df[column] = scored[column].values
+    return df.to_dict("records")
+
+
+def build_pipeline(args: argparse.Namespace, memory_monitor=None) -> StageGraph:
+    """
+    按参数构建阶段图。
+    """
+    graph = StageGraph(memory_monitor)
+    folder = os.path.abspath(args.folder)
+    use_tfidf = args.tfidf and args.mode == MODE_TAG
+    use_score = args.score and args.mode == MODE_TAG
+    channel = BatchChannel() if use_tfidf else None
+
+    archive_stage = None
+    if args.archive_from:
+        graph.add("archive", lambda results: driver.archive_date_folders(os.path.abspath(args.archive_from), folder))
+        archive_stage = "archive"
+
+    def _scan(results):
+        scan_cache = None
+        if args.incremental and driver.REPORT_STORE_LOADED and os.path.exists(driver.REPORT_STORE_FILE):
+            with driver.ReportStore(driver.REPORT_STORE_FILE) as store:
+                scan_cache = store.make_scan_cache(SCAN_RESULT_COLUMNS)
+        records = []
+        try:
+            for batch in iter_image_info_batches(folder, batch_size=args.batch_size, scan_cache=scan_cache, profile=args.scan_profile):
+                records.extend(batch)
+                if channel is not None:
+                    channel.put(batch)
+        finally:
+            if channel is not None:
+                channel.close()
+        print(f"扫描完成: {len(records)} 个图片。")
+        if not records:
+            raise RuntimeError(f"没有扫描到任何图片信息: {folder}")
+        return records
+    graph.add("scan", _scan, [archive_stage])
+
+    if use_tfidf:
+        def _tfidf_prepare(results):
+            # 预处理是逐行的，按批处理的结果与整列一次处理相同
+            cleaned_parts = []
+            offset = 0
+            batches = iter(channel)
+            try:
+                for batch in batches:
+                    series = pd.Series([record.get(driver.TFIDF_TARGET_COLUMN) for record in batch], index=range(offset, offset + len(batch)))
+                    cleaned_parts.append(driver.preprocess_tags(series)[1])
+                    offset += len(batch)
+            except Exception:
+                # 继续取完剩余批次，避免扫描阶段阻塞在已满的通道上
+                for _ in batches:
+                    pass
+                raise
+            return pd.concat(cleaned_parts) if cleaned_parts else pd.Series(dtype=str)
+
+        def _tfidf(results):
+            cleaned = results["tfidf_prepare"]
+            corpus = cleaned[cleaned != ""].tolist()
+            df = pd.DataFrame(results["scan"])
+            if not corpus:
+                print("警告: TF-IDF 语料库为空，跳过计算。")
+                return ["语料为空"] * len(df), [""] * len(df)
+            excel_features, tag_lists = driver.calculate_and_extract_tfidf(df, corpus, cleaned, driver.TFIDF_TOP_N_FEATURES)
+            return excel_features, [driver.format_tfidf_tags_for_filename(tag_list) for tag_list in tag_lists]
+
+        graph.add("tfidf_prepare", _tfidf_prepare, [archive_stage])
+        graph.add("tfidf", _tfidf, ["scan", "tfidf_prepare"])
+
+    if use_score:
+        def _score(results):
+            scored = driver.add_scoring_columns_to_dataframe(pd.DataFrame(results["scan"]))
+            if scored is None:
+                raise RuntimeError("评分失败。")
+            return scored
+        graph.add("score", _score, ["scan"])
+
+    def _report(records):
+        return driver.create_excel_report(records, scan_root=folder)
+
+    if args.mode == MODE_TAG:
+        merge_deps = ["scan", "tfidf" if use_tfidf else None, "score" if use_score else None]
+        if args.tag:
+            def _tag(results):
+                score_col = PREDICTED_SCORE_COLUMN if use_score else None
+                return driver.tag_files_by_prompt(
+                    _final_records(results), driver.TAGGING_KEYWORDS,
+                    tfidf_suffix_col=driver.TFIDF_SUFFIX_COLUMN, score_col=score_col,
+                )
+            graph.add("tag", _tag, merge_deps)
+            # 报告记录重命名后的路径，必须在标记之后
+            graph.add("report", lambda results: _report(results["tag"]), ["tag"])
+        else:
+            graph.add("report", lambda results: _report(_final_records(results)), merge_deps)
+    elif args.mode == MODE_CLASSIFY:
+        keyword_list = [kw.strip() for kw in args.keywords.split(",") if kw.strip()]
+        # 报告记录分类前的路径。查找重复图片 (计算哈希) 和增量报告 (读取文件签名) 会读取分类要移动的文件，
+        # 这时分类必须在报告之后 (与交互模式的顺序相同)；否则两者互不依赖
+        graph.add("report", lambda results: _report(results["scan"]), ["scan"])
+        reads_files = args.duplicates or args.near_duplicates or args.incremental
+        graph.add("classify", lambda results: driver.categorize_images(results["scan"], keyword_list, folder),
+                  ["scan", "report"] if reads_files else ["scan"])
+    else:
+        graph.add("report", lambda results: _report(results["scan"]), ["scan"])
+    return graph
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    解析命令行参数；--config 指定的 JSON 文件提供默认值。
+    """
+    config_parser = argparse.ArgumentParser(add_help=False)
+    config_parser.add_argument("--config")
+    config_args, _ = config_parser.parse_known_args(argv)
+
+    parser = argparse.ArgumentParser(description="AI 图片信息提取与分类工具 (无交互流水线)", parents=[config_parser])
+    parser.add_argument("folder", nargs="?", help="要扫描的主文件夹路径")
+    parser.add_argument("--mode", choices=[MODE_TAG, MODE_CLASSIFY, MODE_REPORT], default=MODE_REPORT,
+                        help="tag: 标记 & 评分重命名；classify: 文件分类；report: 只生成报告")
+    parser.add_argument("--tfidf", action=argparse.BooleanOptionalAction, default=True, help="tag 模式下计算 TF-IDF 区分度关键词")
+    parser.add_argument("--score", action=argparse.BooleanOptionalAction, default=True, help="tag 模式下计算个性化推荐评分")
+    parser.add_argument("--tag", action=argparse.BooleanOptionalAction, default=True, help="tag 模式下执行文件名标记重命名")
+    parser.add_argument("--keywords", default=driver.DEFAULT_CLASSIFY_KEYWORDS, help="classify 模式的分类关键词 (逗号分隔)")
+    parser.add_argument("--yes", action="store_true", help="确认执行 classify 模式的文件移动 (高风险操作)")
+    parser.add_argument("--archive-from", help="扫描前先把该项目目录下的日期文件夹归档到扫描文件夹")
+    parser.add_argument("--incremental", action=argparse.BooleanOptionalAction, default=driver.INCREMENTAL_REPORT, help="增量报告模式")
+    parser.add_argument("--excel", action=argparse.BooleanOptionalAction, default=driver.EXPORT_EXCEL_REPORT, help="导出 Excel 报告")
+    parser.add_argument("--shard-by", choices=["rows", "date"], default=driver.REPORT_SHARD_BY, help="报告分片方式")
+    parser.add_argument("--duplicates", action=argparse.BooleanOptionalAction, default=driver.FIND_DUPLICATES,
+                        help="查找内容完全相同的文件，写入报告的 '重复文件' 工作表")
+    parser.add_argument("--near-duplicates", action=argparse.BooleanOptionalAction, default=driver.FIND_NEAR_DUPLICATES,
+                        help="用感知哈希查找近似重复的图片 (PNG 与 WebP/JPEG 转换副本)，写入 '近似重复' 工作表")
+    parser.add_argument("--near-duplicate-distance", type=int, default=driver.NEAR_DUPLICATE_DISTANCE, help="近似重复的汉明距离阈值 (64 位)")
+    parser.add_argument("--batch-size", type=int, default=SCAN_BATCH_SIZE, help="流式扫描每批的图片数")
+    parser.add_argument("--scan-profile", action="store_true", help="扫描分阶段计时，结束时打印 p50/p95/p99 和最慢的文件")
+    parser.add_argument("--timing-json", help="把各阶段耗时写入该 JSON 文件")
+    parser.add_argument("--metrics-textfile", default=driver.METRICS_TEXTFILE, help="定期写入 Prometheus 文本文件 (node-exporter textfile 格式)")
+    parser.add_argument("--metrics-jsonl", default=driver.METRICS_JSONL, help="定期追加 JSON Lines 吞吐日志")
+    parser.add_argument("--metrics-interval", type=float, default=metrics_exporter.METRICS_INTERVAL_SECONDS, help="指标写入间隔 (秒)")
+    parser.add_argument("--memory-profile", action="store_true", help="记录各阶段的峰值内存和主要分配位置 (会明显变慢)")
+
+    if config_args.config:
+        with open(config_args.config, "r", encoding="utf-8") as f:
+            parser.set_defaults(**json.load(f))
+    args = parser.parse_args(argv)
+    if not args.folder:
+        parser.error("必须指定扫描文件夹 (命令行参数或配置文件中的 folder)。")
+    if not os.path.isdir(args.folder):
+        parser.error(f"文件夹 '{args.folder}' 不存在。")
+    if args.mode == MODE_CLASSIFY and not args.yes:
+        parser.error("classify 模式会移动文件，请添加 --yes 确认。")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    driver.load_pipeline_modules()
+    # 报告相关的配置写入主程序模块的全局配置 (create_excel_report 读取这些配置)
+    driver.INCREMENTAL_REPORT = args.incremental
+    driver.EXPORT_EXCEL_REPORT = args.excel
+    driver.REPORT_SHARD_BY = args.shard_by
+    driver.FIND_DUPLICATES = args.duplicates
+    driver.FIND_NEAR_DUPLICATES = args.near_duplicates
+    driver.NEAR_DUPLICATE_DISTANCE = args.near_duplicate_distance
+
+    # 先完成上次中断的批量重命名 (预写日志未恢复时新的重命名会被拒绝)
+    recovery = recover_pending_renames()
+    if recovery and recovery["unresolved"]:
+        print("存在无法自动恢复的重命名，流水线未执行。")
+        return 1
+
+    metrics_exporter.configure(args.metrics_textfile, args.metrics_jsonl, args.metrics_interval)
+    memory_monitor = None
+    if args.memory_profile:
+        from stage_memory import StageMemoryMonitor
+        memory_monitor = StageMemoryMonitor()
+        memory_monitor.start()
+
+    graph = build_pipeline(args, memory_monitor)
+    print(f"流水线: 模式 {args.mode}，阶段 {', '.join(graph.stages)}")
+    try:
+        success = graph.run()
+    finally:
+        if memory_monitor is not None:
+            memory_monitor.stop()
+    metrics_exporter.shutdown()
+    graph.print_summary()
+    if memory_monitor is not None:
+        memory_monitor.print_summary()
+    if graph.results.get("report"):
+        print(f"报告文件: {graph.results['report']}")
+
+    if args.timing_json:
+        with open(args.timing_json, "w", encoding="utf-8") as f:
+            timing = {"总墙钟(秒)": round(graph.total_wall, 3), "阶段": graph.timings()}
+            if memory_monitor is not None:
+                timing["内存"] = memory_monitor.results()
+            json.dump(timing, f, ensure_ascii=False, indent=2)
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
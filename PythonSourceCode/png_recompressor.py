@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: PNG 无损重压缩 (后台运行，按空间预算调度)。
+
+很多出图工具为了速度以较低的 zlib 压缩级别保存 PNG。这里只重新压缩 IDAT 数据:
+解压全部 IDAT 得到滤波后的扫描行，再用 zlib 9 级 (依次尝试 ZLIB_STRATEGIES 中的策略) 压缩，取最小的结果。
+扫描行数据不变，像素必然完全一致；IDAT 以外的所有块 (IHDR、调色板、parameters 文本块等) 按原字节 (含 CRC) 原样写回，
+parameters 文本块逐字节不变。写入临时文件后校验 (解压结果与原数据一致、其他块逐字节相同)，再替换原文件并恢复修改时间。
+
+调度:
+- 候选文件来自扫描数据 (报告数据库的 '图片的绝对路径' / '创建日期目录')，或直接遍历文件夹；
+- 优先级 = 文件大小 × (1 + 文件年龄天数 / PRIORITY_AGE_DAYS)，越大、越旧的文件越先处理；
+- 预算: 本次最多读取的字节数 (--budget-gb) 和最多使用的 CPU 时间 (--cpu-budget)，用完即停止提交新任务；
+- 结果记录在 RECOMPRESS_CACHE_FILE 中: 节省不足 MIN_SAVING_RATIO 的文件记为 "无收益"，
+  文件未变化时以后不再尝试；已重压缩的文件同样跳过。
+结束时报告节省的字节数和消耗的 CPU 时间 (以及每 CPU 秒节省的字节数)，用于调整预算。
+
+用法:
+    python png_recompressor.py [图片文件夹] [--report 图片信息报告.sqlite] [--budget-gb 50] [--cpu-budget 3600] [--workers 4]
+"""
+import os
+import sys
+import time
+import zlib
+import struct
+import sqlite3
+import argparse
+import concurrent.futures
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import structured_log
+import metrics_exporter
+
+RECOMPRESS_CACHE_FILE = "PNG重压缩记录.sqlite"
+RECOMPRESS_TABLE = "recompress"
+# 依次尝试的 zlib 策略 (9 级)，取最小的结果
+ZLIB_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+ZLIB_LEVEL = 9
+# 每个 IDAT 块的最大长度
+IDAT_CHUNK_BYTES = 1 << 20
+# 节省比例低于该值时保留原文件并记为无收益
+MIN_SAVING_RATIO = 0.01
+# 年龄每增加该天数，优先级相当于文件大小增加一倍
+PRIORITY_AGE_DAYS = 365
+RECOMPRESS_WORKERS = max(1, (os.cpu_count() or 4) - 1) # 留一个核心给出图
+TASKS_PER_WORKER = 2
+WORKER_NICE = 10
+TEMP_SUFFIX = ".recompress.tmp"
+
+STATUS_SAVED = "saved"
+STATUS_NO_GAIN = "no_gain"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def read_chunks(data: bytes) -> List[Tuple[bytes, bytes]]:
+    """
+    拆分 PNG 数据块。
+
+    :return: [(块类型, 块的完整原始字节 (长度 + 类型 + 数据 + CRC))]。
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("不是 PNG 文件")
+    chunks = []
+    offset = len(PNG_SIGNATURE)
+    while offset < len(data):
+        if offset + 8 > len(data):
+            raise ValueError("PNG 数据块不完整")
+        length, chunk_type = struct.unpack(">I4s", data[offset:offset + 8])
+        end = offset + 12 + length
+        if end > len(data):
+            raise ValueError(f"PNG 数据块 {chunk_type!r} 被截断")
+        chunks.append((chunk_type, data[offset:end]))
+        offset = end
+        if chunk_type == b"IEND":
+            break
+    return chunks
+
+
+def _chunk_bytes(chunk_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload)) + chunk_type + payload + struct.pack(">I", zlib.crc32(chunk_type + payload) & 0xFFFFFFFF)
+
+
+def _compress(raw: bytes) -> bytes:
+    best = None
+    for strategy in ZLIB_STRATEGIES:
+        compressor = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, 15, 9, strategy)
+        candidate = compressor.compress(raw) + compressor.flush()
+        if best is None or len(candidate) < len(best):
+            best = candidate
+    return best
+
+
+def recompress_png_bytes(data: bytes) -> Optional[bytes]:
+    """
+    重新压缩 PNG 的 IDAT 数据，其他数据块逐字节保留。
+
+    :return: 新的 PNG 数据；动画 PNG 或 IDAT 不连续等无法处理的文件返回 None。
+    """
+    chunks = read_chunks(data)
+    types = [chunk_type for chunk_type, _ in chunks]
+    if b"acTL" in types or b"IDAT" not in types:
+        return None
+    first_idat = types.index(b"IDAT")
+    last_idat = len(types) - 1 - types[::-1].index(b"IDAT")
+    if any(chunk_type != b"IDAT" for chunk_type in types[first_idat:last_idat + 1]):
+        return None
+    compressed = b"".join(raw_chunk[8:-4] for _, raw_chunk in chunks[first_idat:last_idat + 1])
+    raw = zlib.decompress(compressed)
+    recompressed = _compress(raw)
+    idat = b"".join(
+        _chunk_bytes(b"IDAT", recompressed[start:start + IDAT_CHUNK_BYTES])
+        for start in range(0, len(recompressed), IDAT_CHUNK_BYTES)
+    )
+    before = b"".join(raw_chunk for _, raw_chunk in chunks[:first_idat])
+    after = b"".join(raw_chunk for _, raw_chunk in chunks[last_idat + 1:])
+    return PNG_SIGNATURE + before + idat + after
+
+
+def _verify(original: bytes, recompressed: bytes) -> Optional[str]:
+    """
+    校验: IDAT 以外的数据块逐字节相同，解压后的扫描行数据相同。:return: 失败原因，通过时为 None。
+    """
+    original_chunks = read_chunks(original)
+    new_chunks = read_chunks(recompressed)
+    if [raw for chunk_type, raw in original_chunks if chunk_type != b"IDAT"] != [raw for chunk_type, raw in new_chunks if chunk_type != b"IDAT"]:
+        return "IDAT 以外的数据块不一致"
+    if zlib.decompress(b"".join(raw[8:-4] for chunk_type, raw in new_chunks if chunk_type == b"IDAT")) != \
+            zlib.decompress(b"".join(raw[8:-4] for chunk_type, raw in original_chunks if chunk_type == b"IDAT")):
+        return "解压后的图像数据不一致"
+    return None
+
+
+def recompress_file(path: str, min_saving_ratio: float = MIN_SAVING_RATIO) -> Dict[str, Any]:
+    """
+    子进程任务: 重新压缩单个 PNG (节省足够时替换原文件)。
+
+    :return: {"path", "status", "original_bytes", "new_bytes", "size", "mtime_ns", "cpu_seconds", "error"}，
+             size/mtime_ns 为处理后文件的签名 (写入缓存)。
+    """
+    cpu_start = time.process_time()
+    result = {"path": path, "status": STATUS_FAILED, "original_bytes": 0, "new_bytes": None, "size": None, "mtime_ns": None, "error": None}
+    temp_path = path + TEMP_SUFFIX
+    try:
+        stat = os.stat(path)
+        result.update(original_bytes=stat.st_size, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        with open(path, "rb") as f:
+            original = f.read()
+        recompressed = recompress_png_bytes(original)
+        if recompressed is None:
+            # 不处理的文件同样记为无收益 (以后不再尝试)
+            result["status"] = STATUS_NO_GAIN
+            result["error"] = "动画 PNG 或 IDAT 不连续"
+            return result
+        result["new_bytes"] = len(recompressed)
+        if len(recompressed) > len(original) * (1 - min_saving_ratio):
+            result["status"] = STATUS_NO_GAIN
+            return result
+        error = _verify(original, recompressed)
+        if error:
+            result["error"] = error
+            return result
+        with open(temp_path, "wb") as f:
+            f.write(recompressed)
+        os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        current = os.stat(path)
+        if (current.st_size, current.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            result["status"] = STATUS_SKIPPED
+            result["error"] = "处理期间文件被修改"
+            return result
+        os.replace(temp_path, path)
+        result.update(status=STATUS_SAVED, size=len(recompressed))
+        return result
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    finally:
+        if os.path.exists(temp_path):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        result["cpu_seconds"] = time.process_time() - cpu_start
+
+
+class RecompressCache:
+    """
+    重压缩结果缓存: (路径, 大小, 修改时间) -> 状态。文件变化后记录自动失效。
+    """
+    def __init__(self, db_path: str = RECOMPRESS_CACHE_FILE):
+        self.db_path = os.path.abspath(db_path)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {RECOMPRESS_TABLE} (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, status TEXT, "
+            "original_bytes INTEGER, new_bytes INTEGER, cpu_seconds REAL, updated_at TEXT)"
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def finished(self) -> Dict[str, Tuple[int, int]]:
+        """:return: 已重压缩或无收益的文件 {路径: (大小, 修改时间纳秒)}。"""
+        rows = self.conn.execute(
+            f"SELECT path, size, mtime_ns FROM {RECOMPRESS_TABLE} WHERE status IN (?, ?)", (STATUS_SAVED, STATUS_NO_GAIN)
+        )
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def record(self, result: Dict[str, Any]):
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {RECOMPRESS_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (result["path"], result["size"], result["mtime_ns"], result["status"], result["original_bytes"], result["new_bytes"],
+             result.get("cpu_seconds"), datetime.now().isoformat(timespec="seconds")),
+        )
+        self.conn.commit()
+
+
+def _age_days(date_text: Optional[str], mtime: float, now: float) -> float:
+    """文件年龄 (天)，优先使用扫描数据中的 '创建日期目录'，无法解析时使用修改时间。"""
+    if date_text:
+        try:
+            return max(0.0, (now - datetime.strptime(str(date_text), "%Y-%m-%d").timestamp()) / 86400)
+        except ValueError:
+            pass
+    return max(0.0, (now - mtime) / 86400)
+
+
+def plan_recompression(
+    candidates: Iterable[Tuple[str, Optional[str]]],
+    finished: Dict[str, Tuple[int, int]],
+    budget_bytes: Optional[int] = None,
+) -> Tuple[List[Tuple[str, int]], Dict[str, int]]:
+    """
+    按优先级 (越大、越旧越先) 排序候选 PNG，去掉缓存中已处理过的文件，并按字节预算截断。
+
+    :param candidates: [(路径, 创建日期 'YYYY-MM-DD' 或 None)]。
+    :param finished: RecompressCache.finished() 的结果。
+    :param budget_bytes: 本次最多处理的原文件字节数，None 表示不限。
+    :return: ([(路径, 大小)], 统计 {候选, 缓存跳过, 计划})。
+    """
+    now = time.time()
+    planned = []
+    stats = {"候选": 0, "缓存跳过": 0, "计划": 0}
+    for path, date_text in dict(candidates).items():
+        if not path.lower().endswith(".png"):
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stats["候选"] += 1
+        if finished.get(path) == (stat.st_size, stat.st_mtime_ns):
+            stats["缓存跳过"] += 1
+            continue
+        priority = stat.st_size * (1 + _age_days(date_text, stat.st_mtime, now) / PRIORITY_AGE_DAYS)
+        planned.append((priority, path, stat.st_size))
+    planned.sort(key=lambda item: (-item[0], item[1]))
+    selected = []
+    total = 0
+    for _, path, size in planned:
+        if budget_bytes is not None and total + size > budget_bytes:
+            if selected:
+                break
+        selected.append((path, size))
+        total += size
+    stats["计划"] = len(selected)
+    return selected, stats
+
+
+def _init_worker(log_queue):
+    structured_log.init_worker(log_queue)
+    if hasattr(os, "nice"):
+        try:
+            os.nice(WORKER_NICE)
+        except OSError:
+            pass
+
+
+def recompress_pngs(
+    candidates: Iterable[Tuple[str, Optional[str]]],
+    cache_path: str = RECOMPRESS_CACHE_FILE,
+    budget_bytes: Optional[int] = None,
+    cpu_budget_seconds: Optional[float] = None,
+    max_workers: int = RECOMPRESS_WORKERS,
+    min_saving_ratio: float = MIN_SAVING_RATIO,
+) -> Dict[str, Any]:
+    """
+    按预算并行重压缩 PNG。
+
+    :param candidates: [(路径, 创建日期 'YYYY-MM-DD' 或 None)]，通常来自扫描数据。
+    :param cpu_budget_seconds: 子进程累计 CPU 时间达到该值后不再提交新任务，None 表示不限。
+    :return: 统计 (含 原文件字节数 / 节省字节数 / CPU时间(秒) / 墙钟时间(秒))。
+    """
+    started = time.monotonic()
+    with RecompressCache(cache_path) as cache:
+        jobs, plan_stats = plan_recompression(candidates, cache.finished(), budget_bytes)
+        stats = dict(plan_stats, 已处理=0, 已重压缩=0, 无收益=0, 跳过=0, 失败=0, 原文件字节数=0, 节省字节数=0)
+        stats["CPU时间(秒)"] = 0.0
+        print(
+            f"候选 PNG {plan_stats['候选']} 个 (缓存中已处理 {plan_stats['缓存跳过']} 个)，本次计划 {len(jobs)} 个 "
+            f"({sum(size for _, size in jobs) / 1024 ** 2:.1f} MB)，使用 {max_workers} 个进程"
+        )
+        progress = metrics_exporter.stage_progress("recompress", len(jobs))
+        from tqdm import tqdm
+        max_in_flight = max(1, max_workers) * TASKS_PER_WORKER
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max(1, max_workers), initializer=_init_worker, initargs=(structured_log.get_queue(),)
+        )
+        pending = set()
+        try:
+            with tqdm(total=len(jobs), desc="重压缩 PNG") as progress_bar:
+                job_iter = iter(jobs)
+                while True:
+                    cpu_exhausted = cpu_budget_seconds is not None and stats["CPU时间(秒)"] >= cpu_budget_seconds
+                    while len(pending) < max_in_flight and not cpu_exhausted:
+                        job = next(job_iter, None)
+                        if job is None:
+                            break
+                        pending.add(executor.submit(recompress_file, job[0], min_saving_ratio))
+                    if not pending:
+                        if cpu_exhausted:
+                            print(f"\n已用完 CPU 预算 ({cpu_budget_seconds:.0f} 秒)，剩余文件留到下次运行。")
+                        break
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        progress_bar.update(1)
+                        progress.advance(bytes_processed=result["original_bytes"], error=result["status"] == STATUS_FAILED)
+                        stats["已处理"] += 1
+                        stats["原文件字节数"] += result["original_bytes"]
+                        stats["CPU时间(秒)"] += result.get("cpu_seconds") or 0.0
+                        if result["status"] == STATUS_SAVED:
+                            stats["已重压缩"] += 1
+                            stats["节省字节数"] += result["original_bytes"] - result["size"]
+                        elif result["status"] == STATUS_NO_GAIN:
+                            stats["无收益"] += 1
+                        elif result["status"] == STATUS_SKIPPED:
+                            stats["跳过"] += 1
+                            structured_log.log_event(
+                                f"跳过重压缩 {result['path']}: {result['error']}", level=structured_log.LEVEL_WARNING,
+                                stage="recompress", file=result["path"],
+                            )
+                        else:
+                            stats["失败"] += 1
+                            structured_log.log_event(f"重压缩失败 {result['path']}: {result['error']}", stage="recompress", file=result["path"])
+                        if result["status"] in (STATUS_SAVED, STATUS_NO_GAIN):
+                            cache.record(result)
+        except KeyboardInterrupt:
+            print("\n重压缩已中断，已完成的文件记录在缓存中，重新运行会跳过这些文件。")
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            progress.finish()
+    stats["墙钟时间(秒)"] = time.monotonic() - started
+    return stats
+
+
+def print_recompress_summary(stats: Dict[str, Any]):
+    saved = stats["节省字节数"]
+    cpu_seconds = stats["CPU时间(秒)"]
+    print("\n--- PNG 无损重压缩 ---")
+    print(f"处理 {stats['已处理']} 个: 重压缩 {stats['已重压缩']}，无收益 {stats['无收益']}，跳过 {stats['跳过']}，失败 {stats['失败']}")
+    print(
+        f"读取 {stats['原文件字节数'] / 1024 ** 2:.1f} MB，节省 {saved / 1024 ** 2:.1f} MB "
+        f"({saved / stats['原文件字节数'] if stats['原文件字节数'] else 0:.1%})"
+    )
+    print(
+        f"CPU 时间 {cpu_seconds:.1f} 秒 (每 CPU 秒节省 {saved / cpu_seconds / 1024 ** 2 if cpu_seconds else 0:.2f} MB)，"
+        f"墙钟时间 {stats['墙钟时间(秒)']:.1f} 秒"
+    )
+
+
+def candidates_from_report(db_path: str) -> List[Tuple[str, Optional[str]]]:
+    """从报告数据库读取扫描数据中的 (图片路径, 创建日期目录)。"""
+    from report_store import ReportStore, KEY_COLUMN
+    with ReportStore(db_path) as store:
+        if not store.exists():
+            return []
+        date_column = "创建日期目录" if "创建日期目录" in store.columns() else None
+        columns = [KEY_COLUMN] + ([date_column] if date_column else [])
+        return [(record[KEY_COLUMN], record.get(date_column) if date_column else None) for record in store.iter_records(columns)]
+
+
+def candidates_from_folder(folder: str) -> List[Tuple[str, Optional[str]]]:
+    candidates = []
+    for dirpath, _, filenames in os.walk(folder):
+        candidates.extend((os.path.abspath(os.path.join(dirpath, name)), None) for name in filenames if name.lower().endswith(".png"))
+    return candidates
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PNG 无损重压缩 (parameters 文本块逐字节保留)")
+    parser.add_argument("folder", nargs="?", help="要处理的图片文件夹 (不指定时使用报告数据库中的扫描数据)")
+    parser.add_argument("--report", help="报告数据库路径 (默认 图片信息报告.sqlite)；与 folder 同时指定时只处理该文件夹中的图片")
+    parser.add_argument("--budget-gb", type=float, help="本次最多处理的原文件大小 (GB)")
+    parser.add_argument("--cpu-budget", type=float, help="本次最多使用的 CPU 时间 (秒)")
+    parser.add_argument("--min-saving", type=float, default=MIN_SAVING_RATIO, help="节省比例低于该值时保留原文件")
+    parser.add_argument("--workers", type=int, default=RECOMPRESS_WORKERS, help="进程数")
+    parser.add_argument("--cache", default=RECOMPRESS_CACHE_FILE, help="重压缩记录数据库路径")
+    args = parser.parse_args(argv)
+
+    if args.report or not args.folder:
+        from report_store import REPORT_STORE_FILE
+    report_path = args.report or (None if args.folder else REPORT_STORE_FILE)
+    if report_path:
+        if not os.path.exists(report_path):
+            parser.error(f"报告数据库 '{report_path}' 不存在，请先扫描生成报告或指定文件夹。")
+        candidates = candidates_from_report(report_path)
+        if args.folder:
+            prefix = os.path.join(os.path.abspath(args.folder), "")
+            candidates = [(path, date) for path, date in candidates if os.path.abspath(path).startswith(prefix)]
+    else:
+        if not os.path.isdir(args.folder):
+            parser.error(f"文件夹 '{args.folder}' 不存在。")
+        candidates = candidates_from_folder(args.folder)
+
+    stats = recompress_pngs(
+        candidates, args.cache, int(args.budget_gb * 1024 ** 3) if args.budget_gb else None, args.cpu_budget, args.workers, args.min_saving,
+    )
+    print_recompress_summary(stats)
+    return 1 if stats["失败"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 先规划、后执行的批量重命名/移动引擎。
+
+1. 规划阶段: 每个涉及的目录只列举一次 (os.scandir)，在内存中的文件名集合上
+   计算完整的 旧路径 -> 新路径 计划，包括 (N) 冲突后缀和幂等跳过，不做任何逐文件探测。
+2. 执行阶段: 先把计划写入预写日志 (write-ahead journal)，再按源目录分组并行执行，
+   每个文件只需一次 os.rename。中途崩溃时可用 recover_rename_journal 继续完成或回滚。
+[2026-10-19] 修改: 预写日志已存在 (上次运行中途崩溃) 时拒绝执行新的计划，不再覆盖恢复所需的日志；
+主程序和 pipeline_runner 启动时调用 recover_pending_renames 先完成上次中断的重命名。
+"""
+import os
+import re
+import errno
+import json
+import threading
+import concurrent.futures
+import contextlib
+from collections import defaultdict
+from typing import List, Dict, Iterable, Optional, Set, Tuple
+from virtual_fs import REAL_FS # [2026-10-19] 新增: 文件系统抽象 (支持内存中模拟运行)
+import metrics_exporter # [2026-10-19] 新增: 吞吐指标 (未开启时为空操作)
+
+# 预写日志文件名 (与 image_scan_error.log 一样放在当前工作目录)
+RENAME_JOURNAL_FILE = "rename_journal.jsonl"
+
+# 并行执行的最大线程数 (重命名是 I/O 操作，线程即可)
+MAX_RENAME_WORKERS = min(8, os.cpu_count() or 4)
+
+# 目标文件名冲突时的处理策略
+CONFLICT_SUFFIX = "suffix" # 添加 (1), (2)... 后缀，与 get_unique_filename 行为一致
+CONFLICT_SKIP = "skip"     # 跳过该文件 (tag_files_by_prompt 的原有行为)
+
+# 操作状态
+STATUS_PLANNED = "planned"             # 待执行
+STATUS_SKIP_SAME = "skip_same"         # 新旧路径相同，幂等跳过
+STATUS_SKIP_CONFLICT = "skip_conflict" # 目标已存在且策略为跳过
+STATUS_MISSING = "missing"             # 源文件不存在
+STATUS_DONE = "done"                   # 执行成功
+STATUS_FAILED = "failed"               # 执行失败
+
+
+class PendingRenameJournalError(RuntimeError):
+    """[2026-10-19] 新增: 上次中断的重命名预写日志尚未恢复。"""
+
+
+def _name_key(name: str) -> str:
+    """
+    文件名比较键。Windows 文件系统不区分大小写，使用 normcase 保持与 os.path.exists 一致。
+    """
+    return os.path.normcase(name)
+
+
+class DirectoryNameIndex:
+    """
+    目录文件名的内存索引: 每个目录在第一次被访问时列举一次，之后的存在性检查都在内存中完成。
+    """
+    def __init__(self, fs=REAL_FS):
+        self._fs = fs
+        self._names: Dict[str, Set[str]] = {}
+        self.listed_directories = 0 # 实际列举目录的次数 (用于统计文件系统往返)
+
+    def names(self, directory: str) -> Set[str]:
+        key = _name_key(os.path.abspath(directory))
+        names = self._names.get(key)
+        if names is None:
+            try:
+                with self._fs.scandir(directory) as entries:
+                    names = {_name_key(entry.name) for entry in entries}
+            except (FileNotFoundError, NotADirectoryError):
+                names = set() # 目录尚不存在 (例如新的分类目标文件夹)
+            self._names[key] = names
+            self.listed_directories += 1
+        return names
+
+    def exists(self, path: str) -> bool:
+        directory, name = os.path.split(path)
+        return _name_key(name) in self.names(directory)
+
+
+def resolve_unique_name(filename: str, occupied: Set[str]) -> str:
+    """
+    在内存中的文件名集合上生成不冲突的文件名，规则与 filename_tagger.get_unique_filename 完全一致:
+    文件名已存在时在末尾添加 (1), (2), (3)...，原有的 (N) 标记会被替换。
+
+    :param filename: 原始文件名。
+    :param occupied: 目标目录中已占用的文件名集合 (normcase 形式)。
+    :return: 唯一的、不冲突的文件名。
+    """
+    base, ext = os.path.splitext(filename)
+    new_filename = filename
+    counter = 1
+
+    while _name_key(new_filename) in occupied:
+        match = re.search(r'\(\d+\)$', base)
+        if match:
+            base = base[:match.start()]
+        new_filename = f"{base}({counter}){ext}"
+        counter += 1
+
+        if counter > 1000: # 与 get_unique_filename 相同的保护措施
+            raise Exception(f"无法为文件 '{filename}' 在目标目录中找到唯一名称。")
+
+    return new_filename
+
+
+class RenameOperation:
+    """
+    重命名计划中的一项操作。
+    """
+    __slots__ = ("source", "target", "desired_target", "status", "error")
+
+    def __init__(self, source: str, target: str, status: str = STATUS_PLANNED, desired_target: Optional[str] = None):
+        self.source = source
+        self.target = target
+        self.desired_target = desired_target or target # 冲突解决之前期望的目标路径
+        self.status = status
+        self.error: Optional[str] = None
+
+    @property
+    def renamed_by_conflict(self) -> bool:
+        """目标文件名是否因冲突被追加了 (N) 后缀。"""
+        return self.target != self.desired_target
+
+    def __repr__(self):
+        return f"RenameOperation({self.source!r} -> {self.target!r}, {self.status})"
+
+
+def plan_renames(
+    requests: Iterable[Tuple[str, str]],
+    on_conflict: str = CONFLICT_SUFFIX,
+    name_index: Optional[DirectoryNameIndex] = None,
+    fs=REAL_FS,
+) -> List[RenameOperation]:
+    """
+    根据 (当前路径, 期望的新路径) 列表计算完整的重命名/移动计划，不执行任何重命名。
+
+    - 新旧路径完全相同: 标记为幂等跳过；
+    - 只改变大小写: 直接计划 (不视为冲突)；
+    - 目标文件名已被占用 (磁盘上已有，或被本计划中更早的操作占用): 按 on_conflict 添加 (N) 后缀或跳过。
+
+    :param requests: (当前绝对路径, 期望的新绝对路径) 的可迭代对象，新路径可以位于其他目录 (即移动)。
+    :param on_conflict: CONFLICT_SUFFIX 或 CONFLICT_SKIP。
+    :param name_index: 可复用的目录索引，默认新建。
+    :param fs: 文件系统 (REAL_FS 或 virtual_fs.VirtualFileSystem)。
+    :return: 与输入顺序一致的 RenameOperation 列表。
+    """
+    index = name_index or DirectoryNameIndex(fs)
+    plan: List[RenameOperation] = []
+
+    for source, desired_target in requests:
+        if source == desired_target:
+            plan.append(RenameOperation(source, desired_target, STATUS_SKIP_SAME))
+            continue
+
+        if not index.exists(source):
+            plan.append(RenameOperation(source, desired_target, STATUS_MISSING))
+            continue
+
+        target_dir, target_name = os.path.split(desired_target)
+        occupied = index.names(target_dir)
+
+        if _name_key(source) == _name_key(desired_target):
+            # 只改变大小写，目标 "已存在" 的正是源文件本身
+            plan.append(RenameOperation(source, desired_target))
+            continue
+
+        if _name_key(target_name) in occupied:
+            if on_conflict == CONFLICT_SKIP:
+                plan.append(RenameOperation(source, desired_target, STATUS_SKIP_CONFLICT))
+                continue
+            target_name = resolve_unique_name(target_name, occupied)
+
+        # 预占目标文件名，保证同一计划内的后续操作不会冲突 (源文件名保守地不释放)
+        occupied.add(_name_key(target_name))
+        plan.append(RenameOperation(source, os.path.join(target_dir, target_name), desired_target=desired_target))
+
+    return plan
+
+
+def _write_journal_records(journal_file, records: List[Dict[str, str]]):
+    journal_file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+
+
+def execute_rename_plan(
+    plan: List[RenameOperation],
+    journal_path: str = RENAME_JOURNAL_FILE,
+    max_workers: int = MAX_RENAME_WORKERS,
+    fs=REAL_FS,
+) -> Dict[str, int]:
+    """
+    批量执行重命名计划。
+
+    1. 把所有待执行操作写入预写日志并 fsync；
+    2. 按源目录分组，不同目录并行执行，同一目录内顺序执行 (每个文件一次 os.rename)；
+    3. 每组完成后批量追加完成记录，全部成功结束后删除日志文件。
+    目标文件夹不存在时会自动创建 (每个目标文件夹只创建一次)。
+    在虚拟文件系统上模拟运行 (fs.is_virtual) 时不写预写日志。
+    [2026-10-19] 修改: 预写日志已存在时抛出 PendingRenameJournalError (先调用 recover_pending_renames)。
+    [2026-10-19] 修改: 输出 "rename" 阶段的吞吐指标 (每个执行的操作计数一次，失败计为错误)。
+    [2026-10-19] 修改: 执行时目标已存在 (规划之后才被创建) 的操作标记为失败，不覆盖该文件
+    (POSIX 的 os.rename 会静默覆盖已存在的目标)。
+
+    :return: 各状态的数量统计。
+    """
+    pending = [op for op in plan if op.status == STATUS_PLANNED]
+    use_journal = not fs.is_virtual
+
+    if pending:
+        if use_journal:
+            try:
+                # "x": 日志已存在时失败，不覆盖上次崩溃留下的日志
+                journal_file = open(journal_path, "x", encoding="utf-8")
+            except FileExistsError:
+                raise PendingRenameJournalError(
+                    f"存在未恢复的重命名预写日志 '{os.path.abspath(journal_path)}' (上次运行中途中断)，"
+                    "请先运行恢复 (recover_pending_renames) 再执行新的重命名。"
+                ) from None
+            with journal_file:
+                _write_journal_records(journal_file, [
+                    {"type": "plan", "source": op.source, "target": op.target} for op in pending
+                ])
+
+        groups: Dict[str, List[RenameOperation]] = defaultdict(list)
+        for op in pending:
+            groups[os.path.dirname(op.source)].append(op)
+
+        created_dirs: Set[str] = set()
+        lock = threading.Lock()
+        # StageProgress 不是线程安全的，各线程在 lock 内计数
+        progress = metrics_exporter.stage_progress("rename", len(pending))
+
+        with (open(journal_path, "a", encoding="utf-8") if use_journal else contextlib.nullcontext()) as journal_file:
+            def _run_group(operations: List[RenameOperation]):
+                done_records = []
+                for op in operations:
+                    target_dir = os.path.dirname(op.target)
+                    try:
+                        if target_dir not in created_dirs:
+                            fs.makedirs(target_dir, exist_ok=True)
+                            with lock:
+                                created_dirs.add(target_dir)
+                        # 只改变大小写时目标 "已存在" 的正是源文件本身
+                        if _name_key(op.source) != _name_key(op.target) and fs.exists(op.target):
+                            raise FileExistsError(errno.EEXIST, "目标文件在规划之后被创建，拒绝覆盖", op.target)
+                        fs.rename(op.source, op.target)
+                        op.status = STATUS_DONE
+                        done_records.append({"type": "done", "source": op.source, "target": op.target})
+                    except OSError as e:
+                        op.status = STATUS_FAILED
+                        op.error = str(e)
+                    with lock:
+                        progress.advance(error=op.status == STATUS_FAILED)
+                if journal_file is not None:
+                    with lock:
+                        _write_journal_records(journal_file, done_records)
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                # list() 确保线程中的异常被抛出
+                list(executor.map(_run_group, groups.values()))
+        progress.finish()
+
+        # 执行阶段正常结束 (无论单个文件成败)，日志已无恢复价值
+        if use_journal:
+            os.remove(journal_path)
+
+    summary: Dict[str, int] = defaultdict(int)
+    for op in plan:
+        summary[op.status] += 1
+    return dict(summary)
+
+
+def recover_rename_journal(journal_path: str = RENAME_JOURNAL_FILE, rollback: bool = False) -> Dict[str, int]:
+    """
+    根据中途崩溃留下的预写日志恢复文件系统状态。
+
+    :param journal_path: 预写日志路径。
+    :param rollback: False 时继续完成未执行的操作；True 时把已执行的操作改回原路径。
+    :return: 恢复统计 {'completed': n, 'rolled_back': n, 'unresolved': n}。
+    """
+    summary = {"completed": 0, "rolled_back": 0, "unresolved": 0}
+    if not os.path.exists(journal_path):
+        return summary
+
+    planned: List[Tuple[str, str]] = []
+    with open(journal_path, "r", encoding="utf-8") as journal_file:
+        for line in journal_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # 崩溃时可能留下不完整的最后一行
+            if record.get("type") == "plan":
+                planned.append((record["source"], record["target"]))
+
+    for source, target in planned:
+        # 完成记录可能因崩溃而缺失 (重命名已执行、记录未写入)，因此以磁盘实际状态为准
+        source_exists, target_exists = os.path.exists(source), os.path.exists(target)
+        try:
+            if rollback and target_exists and not source_exists:
+                os.rename(target, source)
+                summary["rolled_back"] += 1
+            elif not rollback and source_exists and not target_exists:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.rename(source, target)
+                summary["completed"] += 1
+            elif (rollback and source_exists) or (not rollback and target_exists and not source_exists):
+                pass # 已处于期望状态
+            else:
+                summary["unresolved"] += 1
+        except OSError:
+            summary["unresolved"] += 1
+
+    if summary["unresolved"] == 0:
+        os.remove(journal_path)
+    return summary
+
+
+def recover_pending_renames(journal_path: str = RENAME_JOURNAL_FILE) -> Optional[Dict[str, int]]:
+    """
+    [2026-10-19] 新增: 启动时检查上次中断留下的预写日志，存在时继续完成其中未执行的重命名。
+
+    :return: 恢复统计 (没有日志时为 None)。仍有无法恢复的操作时日志保留，之后的重命名会被拒绝。
+    """
+    if not os.path.exists(journal_path):
+        return None
+    print(f"发现上次中断的重命名预写日志 '{os.path.abspath(journal_path)}'，继续完成未执行的重命名...")
+    summary = recover_rename_journal(journal_path)
+    print(f"恢复完成: 补做 {summary['completed']} 个，无法恢复 {summary['unresolved']} 个。")
+    if summary["unresolved"]:
+        print(f"警告: 有 {summary['unresolved']} 个操作的源文件和目标文件状态不明，日志已保留，请手动检查后删除该日志。")
+    return summary
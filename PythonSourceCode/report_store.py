@@ -0,0 +1,566 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 图片信息报告的主存储 (SQLite 单文件数据库)。
+
+报告数据以 SQLite 表保存 (Python 标准库自带，无需额外依赖；Parquet/Feather 需要 pyarrow，不在依赖中)。
+评分、TF-IDF 等步骤按列读取并在原表上追加/更新列，不再需要整份 Excel 的解析和重写；
+Excel 报告只是最后一步可选的导出 (流式写入，见 report_writer)。
+
+表中行的顺序 (rowid) 即报告行顺序，read_dataframe 返回的 DataFrame 以 rowid 为索引，
+write_columns 按索引把新列写回对应的行。
+
+[2026-10-19] 新增: export_excel_sharded 按行数或创建日期目录把报告拆分为多个 Excel 文件 (多进程并行写入)，
+并生成一个链接到各分片的索引文件；超过 Excel 单元格上限的文本被截断并注明在数据库中的位置。
+
+[2026-10-19] 新增: 增量更新 (sync_records)。以图片路径为键与上次的报告比较，只插入新图片、更新内容变化的行、
+删除扫描目录下已不存在的图片 (其他目录的行保留，多个目录可以共用一个数据库)；附表 <表名>_文件状态 按 rowid 保存每张图片的 (文件大小, 修改时间)，
+用于识别重命名/移动 (路径变化但文件未变，原行保留并更新路径) 和在扫描时复用未变化图片的元数据 (make_scan_cache)。
+"""
+import os
+import math
+import sqlite3
+import concurrent.futures
+import pandas as pd
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+from report_writer import write_report_streaming, EXCEL_MAX_DATA_ROWS, ROWID_KEY
+
+# 默认的报告数据库文件名 (与 image_scan_error.log 一样放在当前工作目录)
+REPORT_STORE_FILE = "图片信息报告.sqlite"
+# 报告表名
+REPORT_TABLE = "图片信息"
+# 被识别为报告数据库的文件扩展名
+REPORT_STORE_EXTENSIONS = (".sqlite", ".db")
+# 批量读写的行数
+STORE_BATCH_SIZE = 10000
+
+# [2026-10-19] 新增: 报告分片
+SHARD_BY_ROWS = "rows" # 按行数拆分
+SHARD_BY_DATE = "date" # 按创建日期目录拆分 (单个日期超过行数上限时再按行数拆分)
+SHARD_DATE_COLUMN = "创建日期目录"
+SHARD_INDEX_SHEET_NAME = "报告索引"
+# 并行写入分片的最大进程数 (Excel 写入是纯 Python 的 CPU 密集操作)
+MAX_SHARD_WORKERS = min(4, os.cpu_count() or 1)
+
+# [2026-10-19] 新增: 增量更新
+KEY_COLUMN = "图片的绝对路径"
+FILE_STATE_SUFFIX = "_文件状态"
+CHANGE_TYPE_COLUMN = "变更类型"
+CHANGE_ADDED = "新增"
+CHANGE_UPDATED = "更新"
+CHANGE_RENAMED = "路径变化"
+CHANGE_REMOVED = "已删除"
+# SQLite 单条语句的参数个数上限 (旧版本为 999)
+SQL_MAX_VARIABLES = 900
+
+
+def _quote(identifier: str) -> str:
+    """SQL 标识符转义 (列名包含中文、空格和括号)。"""
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _sql_type(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    return "TEXT"
+
+
+def make_cell_pointer(db_path: str, table: str) -> Callable[[int, str], str]:
+    """
+    [2026-10-19] 新增: 生成超长单元格的截断说明，指向报告数据库中保存的完整文本。
+    """
+    db_name = os.path.basename(db_path)
+    return lambda rowid, column: f"…[已截断，完整内容见报告数据库 {db_name} 表 {table} rowid={rowid} 列 {column}]"
+
+
+def _export_shard(db_path: str, table: str, columns: List[str], where: str, params: tuple, output_filepath: str) -> Tuple[str, int, str]:
+    """
+    [2026-10-19] 新增: 导出单个分片 (在子进程中运行，使用独立的数据库连接)。
+
+    :return: (分片文件路径, 行数, 写入引擎)。
+    """
+    with ReportStore(db_path, table) as store:
+        row_count = store.conn.execute(f"SELECT COUNT(*) FROM {_quote(table)} WHERE {where}", params).fetchone()[0]
+        engine = write_report_streaming(
+            store.iter_records(columns, where=where, params=params, include_rowid=True),
+            columns,
+            output_filepath,
+            row_count=row_count,
+            cell_pointer=make_cell_pointer(db_path, table),
+        )
+    return output_filepath, row_count, engine
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """
+    [2026-10-19] 新增: 文件签名 (文件大小, 修改时间纳秒)。重命名和同一磁盘内移动不改变签名；文件不存在时返回 None。
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _to_sql_value(value: Any) -> Any:
+    """NaN 存为 NULL，numpy 标量转换为 Python 原生类型。"""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+        if isinstance(value, float) and math.isnan(value):
+            return None
+    return value
+
+
+def _same_value(new_value: Any, old_value: Any) -> bool:
+    """比较记录中的值与数据库中的值 (NULL/NaN 视为相同；TEXT 列中保存的数字按字符串比较)。"""
+    new_value, old_value = _to_sql_value(new_value), _to_sql_value(old_value)
+    if new_value is None or old_value is None:
+        return new_value is None and old_value is None
+    if new_value == old_value:
+        return True
+    return isinstance(new_value, str) != isinstance(old_value, str) and str(new_value) == str(old_value)
+
+
+class ReportStore:
+    """
+    报告数据库。用法:
+
+        store = ReportStore("图片信息报告.sqlite")
+        store.write_records(image_data)                 # 覆盖写入全部记录
+        df = store.read_dataframe()                     # 读取 (索引为 rowid)
+        store.write_columns(df[["个性化推荐预估评分"]])   # 追加/更新列
+        store.export_excel("图片信息报告.xlsx")           # 可选: 流式导出 Excel
+    """
+    def __init__(self, db_path: str = REPORT_STORE_FILE, table: str = REPORT_TABLE):
+        self.db_path = os.path.abspath(db_path)
+        self.table = table
+        self.conn = sqlite3.connect(self.db_path)
+        # 报告可随时从图片重新生成，用 WAL + NORMAL 换取写入速度
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    # --- 表结构 ---
+
+    @property
+    def state_table(self) -> str:
+        """[2026-10-19] 新增: 文件状态附表名 (rowid -> 文件大小, 修改时间)。"""
+        return self.table + FILE_STATE_SUFFIX
+
+    def exists(self) -> bool:
+        row = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (self.table,)).fetchone()
+        return row is not None
+
+    def columns(self) -> List[str]:
+        if not self.exists():
+            return []
+        return [row[1] for row in self.conn.execute(f"PRAGMA table_info({_quote(self.table)})")]
+
+    def row_count(self) -> int:
+        if not self.exists():
+            return 0
+        return self.conn.execute(f"SELECT COUNT(*) FROM {_quote(self.table)}").fetchone()[0]
+
+    # --- 写入 ---
+
+    def write_records(self, records: Any, columns: Optional[List[str]] = None) -> int:
+        """
+        用新的记录覆盖整张表 (列顺序即报告列顺序)。
+
+        :param records: DataFrame 或 字典列表。
+        :param columns: 写入的列 (默认全部列)。
+        :return: 写入的行数。
+        """
+        df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+        if columns is not None:
+            df = df.reindex(columns=columns)
+        with self.conn:
+            df.to_sql(self.table, self.conn, if_exists="replace", index=False, chunksize=STORE_BATCH_SIZE)
+            # rowid 重新编号，旧的文件状态失效
+            self.conn.execute(f"DROP TABLE IF EXISTS {_quote(self.state_table)}")
+        return len(df)
+
+    def write_columns(self, df: pd.DataFrame) -> int:
+        """
+        把 df 的列按索引 (rowid) 写回表中: 不存在的列先追加 (ALTER TABLE)，再批量 UPDATE。
+
+        [2026-10-19] 修改: 只 UPDATE 值实际发生变化的行 (例如重新评分后分数不变的行不再写入)。
+
+        :param df: 索引为 rowid 的 DataFrame (通常来自 read_dataframe 的结果)。
+        :return: 更新的行数。
+        """
+        if df.empty or len(df.columns) == 0:
+            return 0
+        existing = set(self.columns())
+        set_clause = ", ".join(f"{_quote(column)} = ?" for column in df.columns)
+        sql = f"UPDATE {_quote(self.table)} SET {set_clause} WHERE rowid = ?"
+        column_values = [df[column].tolist() for column in df.columns]
+        rowids = [int(rowid) for rowid in df.index]
+
+        if all(column in existing for column in df.columns):
+            current = self.read_dataframe(list(df.columns)).reindex([int(rowid) for rowid in df.index])
+            current_values = [current[column].tolist() for column in df.columns]
+            changed = [
+                i for i in range(len(rowids))
+                if any(not _same_value(values[i], old[i]) for values, old in zip(column_values, current_values))
+            ]
+            column_values = [[values[i] for i in changed] for values in column_values]
+            rowids = [rowids[i] for i in changed]
+
+        with self.conn:
+            for column in df.columns:
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE {_quote(self.table)} ADD COLUMN {_quote(column)} {_sql_type(df[column])}")
+            for start in range(0, len(rowids), STORE_BATCH_SIZE):
+                end = start + STORE_BATCH_SIZE
+                batch = [
+                    tuple(_to_sql_value(values[i]) for values in column_values) + (rowids[i],)
+                    for i in range(start, min(end, len(rowids)))
+                ]
+                self.conn.executemany(sql, batch)
+        return len(rowids)
+
+    def _save_file_states(self, states: Dict[int, Optional[Tuple[int, int]]]):
+        """写入/更新文件状态附表 (签名为 None 的行删除状态)。调用方负责事务。"""
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {_quote(self.state_table)} "
+            "(row_id INTEGER PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)"
+        )
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO {_quote(self.state_table)} (row_id, size, mtime_ns) VALUES (?, ?, ?)",
+            [(rowid, sig[0], sig[1]) for rowid, sig in states.items() if sig is not None],
+        )
+        self.conn.executemany(
+            f"DELETE FROM {_quote(self.state_table)} WHERE row_id = ?",
+            [(rowid,) for rowid, sig in states.items() if sig is None],
+        )
+
+    def _load_file_states(self) -> Dict[int, Tuple[int, int]]:
+        exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (self.state_table,)).fetchone()
+        if exists is None:
+            return {}
+        return {row[0]: (row[1], row[2]) for row in self.conn.execute(f"SELECT row_id, size, mtime_ns FROM {_quote(self.state_table)}")}
+
+    def sync_records(self, records: List[Dict[str, Any]], columns: Optional[List[str]] = None, key_column: str = KEY_COLUMN,
+                     scan_root: Optional[str] = None) -> Dict[str, list]:
+        """
+        [2026-10-19] 新增: 增量更新报告表，使其与 records (本次完整的扫描结果) 一致，只写入变化的部分:
+        1. 路径相同且内容变化 (例如评分、TF-IDF 关键词变化) 的行: UPDATE；
+        2. 旧路径的文件已不存在、新路径的文件签名与旧行相同 (重命名/移动) 的行: 保留原 rowid，UPDATE 为新路径和新内容；
+        3. 其余新路径: INSERT (追加到表尾)；
+        4. 不在本次结果中的旧路径: 只有位于 scan_root 下且文件已不存在时才 DELETE，
+           其他目录的行 (其他扫描写入的) 和文件仍存在的行保持不变。
+        表不存在时等同于 write_records。
+
+        :param records: 本次的全部记录 (字典列表)。
+        :param columns: 报告列 (默认按键第一次出现的顺序)，不在表中的列自动追加。
+        :param key_column: 作为键的路径列。
+        :param scan_root: [2026-10-19 新增] 本次扫描的根目录，None 时不限制目录 (仍只删除文件已不存在的行)。
+        :return: {'added': [rowid], 'updated': [rowid], 'renamed': [rowid], 'removed': [旧路径], 'unchanged': 行数}。
+        """
+        columns = list(columns or dict.fromkeys(key for record in records for key in record))
+        signatures = [file_signature(record.get(key_column)) if record.get(key_column) else None for record in records]
+        changes: Dict[str, list] = {"added": [], "updated": [], "renamed": [], "removed": [], "unchanged": 0}
+
+        if not self.exists():
+            self.write_records(records, columns)
+            with self.conn:
+                self._save_file_states({rowid: sig for rowid, sig in enumerate(signatures, start=1)})
+            changes["added"] = list(range(1, len(records) + 1))
+            return changes
+
+        table = _quote(self.table)
+        existing_columns = self.columns()
+        current = self.read_dataframe(existing_columns)
+        old_states = self._load_file_states()
+        rowid_by_path = {path: rowid for rowid, path in zip(current.index, current[key_column])}
+        current_rows = {column: dict(zip(current.index, current[column])) for column in existing_columns}
+
+        incoming_paths = set()
+        same_path, new_indices = [], []
+        for i, record in enumerate(records):
+            path = record.get(key_column)
+            incoming_paths.add(path)
+            if path in rowid_by_path:
+                same_path.append((i, int(rowid_by_path[path])))
+            else:
+                new_indices.append(i)
+
+        # 文件已不存在的旧行 (不在本次结果中的路径文件仍存在时，只是不在本次扫描范围内)，按文件签名建立索引用于识别重命名。
+        # 只检查 scan_root 下的行 (可能被删除) 和签名与本次新路径相同的行 (可能被重命名)，
+        # 其他目录的行既不会被删除也不会被匹配，不需要逐个访问文件系统。
+        root_prefix = os.path.join(os.path.abspath(scan_root), "") if scan_root else None
+        new_signatures = {signatures[i] for i in new_indices if signatures[i] is not None}
+        vanished_by_signature: Dict[Tuple[int, int], List[int]] = {}
+        vanished = []
+        for path, rowid in rowid_by_path.items():
+            if path in incoming_paths or not isinstance(path, str):
+                continue
+            rowid = int(rowid)
+            in_root = root_prefix is None or os.path.abspath(path).startswith(root_prefix)
+            if not in_root and old_states.get(rowid) not in new_signatures:
+                continue
+            if not os.path.exists(path):
+                vanished.append((rowid, path, in_root))
+                if rowid in old_states:
+                    vanished_by_signature.setdefault(old_states[rowid], []).append(rowid)
+
+        renamed_pairs, inserted = [], []
+        for i in new_indices:
+            candidates = vanished_by_signature.get(signatures[i]) if signatures[i] is not None else None
+            if candidates:
+                renamed_pairs.append((i, candidates.pop(0)))
+            else:
+                inserted.append(i)
+        renamed_rowids = {rowid for _, rowid in renamed_pairs}
+
+        update_sql = f"UPDATE {table} SET " + ", ".join(f"{_quote(column)} = ?" for column in columns) + " WHERE rowid = ?"
+        insert_sql = f"INSERT INTO {table} (" + ", ".join(_quote(column) for column in columns) + ") VALUES (" + ", ".join("?" for _ in columns) + ")"
+
+        def _row_values(record: Dict[str, Any]) -> tuple:
+            return tuple(_to_sql_value(record.get(column)) for column in columns)
+
+        states: Dict[int, Optional[Tuple[int, int]]] = {}
+        with self.conn:
+            for column in columns:
+                if column not in existing_columns:
+                    sample = pd.Series([record.get(column) for record in records])
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {_quote(column)} {_sql_type(sample)}")
+
+            updates = []
+            for i, rowid in same_path:
+                record = records[i]
+                if any(not _same_value(record.get(column), current_rows[column][rowid] if column in current_rows else None) for column in columns):
+                    updates.append(_row_values(record) + (rowid,))
+                    changes["updated"].append(rowid)
+                else:
+                    changes["unchanged"] += 1
+                if old_states.get(rowid) != signatures[i]:
+                    states[rowid] = signatures[i]
+            for i, rowid in renamed_pairs:
+                updates.append(_row_values(records[i]) + (rowid,))
+                changes["renamed"].append(rowid)
+            self.conn.executemany(update_sql, updates)
+
+            for i in inserted:
+                rowid = self.conn.execute(insert_sql, _row_values(records[i])).lastrowid
+                changes["added"].append(rowid)
+                states[rowid] = signatures[i]
+
+            removed = [(rowid, path) for rowid, path, in_root in vanished if in_root and rowid not in renamed_rowids]
+            removed_rowids = [(rowid,) for rowid, _ in removed]
+            self.conn.executemany(f"DELETE FROM {table} WHERE rowid = ?", removed_rowids)
+            changes["removed"] = [path for _, path in removed]
+            for (rowid,) in removed_rowids:
+                states[rowid] = None
+            self._save_file_states(states)
+        return changes
+
+    def make_scan_cache(self, columns: List[str], key_column: str = KEY_COLUMN) -> Callable[[str], Optional[Dict[str, Any]]]:
+        """
+        [2026-10-19] 新增: 扫描缓存。返回函数 lookup(path)，文件签名与上次记录的一致时返回上次的扫描结果 (只含 columns 列)，
+        否则返回 None (需要重新读取图片)。
+
+        :param columns: 扫描结果的列 (image_scanner.SCAN_RESULT_COLUMNS)，不包括评分等后续步骤生成的列。
+        """
+        if not self.exists():
+            return lambda path: None
+        columns = [column for column in columns if column in self.columns()]
+        if key_column not in columns:
+            columns = [key_column] + columns
+        states = self._load_file_states()
+        cache = {}
+        for record in self.iter_records(columns, include_rowid=True):
+            rowid = record.pop(ROWID_KEY)
+            if rowid in states:
+                cache[record[key_column]] = (states[rowid], record)
+
+        def lookup(path: str) -> Optional[Dict[str, Any]]:
+            cached = cache.get(path)
+            if cached is None or file_signature(path) != cached[0]:
+                return None
+            return dict(cached[1])
+        return lookup
+
+    def export_changes_excel(self, output_filepath: str, changes: Dict[str, list], columns: Optional[List[str]] = None) -> str:
+        """
+        [2026-10-19] 新增: 把 sync_records 返回的变更导出为 Excel (只含变化的行)，首列为变更类型；
+        已删除的图片只填写路径。
+
+        :return: 使用的写入引擎。
+        """
+        columns = columns or self.columns()
+        pointer = make_cell_pointer(self.db_path, self.table)
+
+        def _iter_changes() -> Iterator[Dict[str, Any]]:
+            for change_key, change_type in (("added", CHANGE_ADDED), ("updated", CHANGE_UPDATED), ("renamed", CHANGE_RENAMED)):
+                rowids = sorted(changes.get(change_key, []))
+                for start in range(0, len(rowids), SQL_MAX_VARIABLES):
+                    chunk = rowids[start:start + SQL_MAX_VARIABLES]
+                    where = "rowid IN (" + ", ".join("?" for _ in chunk) + ")"
+                    for record in self.iter_records(columns, where=where, params=tuple(chunk), include_rowid=True):
+                        record[CHANGE_TYPE_COLUMN] = change_type
+                        yield record
+            for path in changes.get("removed", []):
+                yield {CHANGE_TYPE_COLUMN: CHANGE_REMOVED, KEY_COLUMN: path}
+
+        row_count = sum(len(changes.get(key, [])) for key in ("added", "updated", "renamed", "removed"))
+        return write_report_streaming(
+            _iter_changes(),
+            [CHANGE_TYPE_COLUMN] + [column for column in columns if column != CHANGE_TYPE_COLUMN],
+            output_filepath,
+            row_count=row_count,
+            cell_pointer=pointer,
+        )
+
+    # --- 读取 ---
+
+    def read_dataframe(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        读取报告 (按 rowid 排序)，索引为 rowid，列顺序与表一致。
+
+        :param columns: 只读取这些列 (默认全部列)。
+        """
+        selected = ", ".join(_quote(column) for column in columns) if columns else "*"
+        df = pd.read_sql_query(
+            f"SELECT rowid AS __rowid__, {selected} FROM {_quote(self.table)} ORDER BY rowid",
+            self.conn,
+            index_col="__rowid__",
+        )
+        df.index.name = None
+        return df
+
+    def iter_records(
+        self,
+        columns: Optional[List[str]] = None,
+        batch_size: int = STORE_BATCH_SIZE,
+        where: str = "1",
+        params: tuple = (),
+        include_rowid: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        按 rowid 顺序逐条产出记录 (字典)，每次只从数据库取 batch_size 行。
+
+        :param where: [2026-10-19 新增] 过滤条件 (SQL 表达式，参数用 ? 占位)。
+        :param params: [2026-10-19 新增] 过滤条件的参数。
+        :param include_rowid: [2026-10-19 新增] 是否在记录中附带 rowid (键为 report_writer.ROWID_KEY)。
+        """
+        columns = columns or self.columns()
+        keys = ([ROWID_KEY] if include_rowid else []) + list(columns)
+        selected = ", ".join((["rowid"] if include_rowid else []) + [_quote(column) for column in columns])
+        cursor = self.conn.execute(f"SELECT {selected} FROM {_quote(self.table)} WHERE {where} ORDER BY rowid", params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(keys, row))
+
+    # --- 导出 ---
+
+    def export_excel(self, output_filepath: str, columns: Optional[List[str]] = None) -> str:
+        """
+        把报告流式导出为 Excel (格式与 create_excel_report 一致)。
+
+        :return: 使用的写入引擎名称。
+        """
+        columns = columns or self.columns()
+        return write_report_streaming(
+            self.iter_records(columns, include_rowid=True),
+            columns,
+            output_filepath,
+            row_count=self.row_count(),
+            cell_pointer=make_cell_pointer(self.db_path, self.table),
+        )
+
+    def _plan_shards(self, shard_by: str, max_rows_per_shard: int, date_column: str) -> List[Tuple[str, str, tuple]]:
+        """
+        计算分片: [(分片说明, WHERE 条件, 参数)]，每个分片不超过 max_rows_per_shard 行。
+        """
+        def _split_rowids(rowids: List[int], label: str, where: str, params: tuple) -> List[Tuple[str, str, tuple]]:
+            shards = []
+            for start in range(0, len(rowids), max_rows_per_shard):
+                chunk = rowids[start:start + max_rows_per_shard]
+                chunk_label = label if len(rowids) <= max_rows_per_shard else f"{label} 第 {start + 1}-{start + len(chunk)} 行"
+                shards.append((chunk_label, f"{where} AND rowid BETWEEN ? AND ?", params + (chunk[0], chunk[-1])))
+            return shards
+
+        table = _quote(self.table)
+        if shard_by == SHARD_BY_DATE and date_column in self.columns():
+            shards = []
+            dates = [row[0] for row in self.conn.execute(f"SELECT DISTINCT {_quote(date_column)} FROM {table} ORDER BY 1")]
+            for date in dates:
+                if date is None:
+                    where, params, label = f"{_quote(date_column)} IS NULL", (), "未获取日期"
+                else:
+                    where, params, label = f"{_quote(date_column)} = ?", (date,), str(date)
+                rowids = [row[0] for row in self.conn.execute(f"SELECT rowid FROM {table} WHERE {where} ORDER BY rowid", params)]
+                # 同一日期的 rowid 不一定连续，BETWEEN 之外再加上日期条件
+                shards.extend(_split_rowids(rowids, label, where, params))
+            return shards
+
+        rowids = [row[0] for row in self.conn.execute(f"SELECT rowid FROM {table} ORDER BY rowid")]
+        return _split_rowids(rowids, "全部", "1", ())
+
+    def export_excel_sharded(
+        self,
+        output_filepath: str,
+        shard_by: str = SHARD_BY_ROWS,
+        max_rows_per_shard: int = EXCEL_MAX_DATA_ROWS,
+        date_column: str = SHARD_DATE_COLUMN,
+        max_workers: int = MAX_SHARD_WORKERS,
+        columns: Optional[List[str]] = None,
+    ) -> str:
+        """
+        [2026-10-19] 新增: 把报告拆分为多个 Excel 文件 (<报告名>_分片001.xlsx ...) 并行导出，
+        output_filepath 本身写为索引文件 (每个分片一行，含分片说明、行数和指向分片文件的超链接)。
+
+        :param shard_by: SHARD_BY_ROWS 或 SHARD_BY_DATE。
+        :param max_rows_per_shard: 每个分片的最大行数 (不超过 Excel 上限)。
+        :param max_workers: 并行写入的最大进程数，1 表示在当前进程中顺序写入。
+        :return: 索引文件路径。
+        """
+        columns = columns or self.columns()
+        max_rows_per_shard = max(1, min(max_rows_per_shard, EXCEL_MAX_DATA_ROWS))
+        shards = self._plan_shards(shard_by, max_rows_per_shard, date_column)
+        base, ext = os.path.splitext(os.path.abspath(output_filepath))
+        jobs = [
+            (self.db_path, self.table, columns, where, params, f"{base}_分片{index:03d}{ext}")
+            for index, (_, where, params) in enumerate(shards, start=1)
+        ]
+
+        if max_workers > 1 and len(jobs) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_export_shard, *zip(*jobs)))
+        else:
+            results = [_export_shard(*job) for job in jobs]
+
+        index_records = (
+            {"分片序号": index, "分片说明": label, "行数": row_count, "分片文件": shard_path, "打开分片": None}
+            for index, ((label, _, _), (shard_path, row_count, _)) in enumerate(zip(shards, results), start=1)
+        )
+        write_report_streaming(
+            index_records,
+            ["分片序号", "分片说明", "行数", "分片文件", "打开分片"],
+            output_filepath,
+            sheet_name=SHARD_INDEX_SHEET_NAME,
+            row_count=len(shards),
+            hyperlink_column="打开分片",
+            path_column="分片文件",
+            link_text="点击打开分片",
+        )
+        return output_filepath
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 流式 (恒定内存) Excel 报告写入模块。
+
+按记录迭代器逐行写入，一次遍历同时写入超链接和样式，内存占用与行数无关。
+输出格式与原 create_excel_report (pandas + openpyxl) 完全一致:
+- 表头: 与当前安装的 pandas 一致 (pandas 2.x 为粗体、细边框、水平居中、顶端对齐；pandas 3 起不再设置表头样式)；
+- 所有列宽度 15；
+- '图片超链接' 列: 显示 '点击查看原图'，链接到 file:///<图片的绝对路径>，蓝色单下划线。
+
+[2026-10-19] 新增: 单元格文本超过 Excel 上限 (32,767 字符) 时截断，并在末尾注明完整内容在报告数据库中的位置；
+超过 Excel 行数上限的报告由 report_store.ReportStore.export_excel_sharded 拆分为多个文件。
+
+写入引擎:
+1. xlsxwriter (可选依赖) 的 constant_memory 模式，速度最快。
+   Excel 每个工作表最多 65,530 个超链接 (xlsxwriter 会忽略超出的 write_url)。
+   [2026-10-19] 修改: 超出的链接改为 =HYPERLINK("file:///...", "点击查看原图") 公式 (公式不计入该限制，
+   点击效果相同)，因此大报告也保持 xlsxwriter，不再改用 openpyxl；
+2. openpyxl 的 write-only 模式 (openpyxl 已是必需依赖，未安装 xlsxwriter 时使用)。
+"""
+import math
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Color, Border, Side, Alignment
+from openpyxl.utils import get_column_letter
+from pandas.io.formats.excel import ExcelFormatter
+
+# 可选依赖: xlsxwriter
+try:
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    xlsxwriter = None
+    XLSXWRITER_AVAILABLE = False
+
+REPORT_SHEET_NAME = "图片信息"
+HYPERLINK_COLUMN = "图片超链接"
+PATH_COLUMN = "图片的绝对路径"
+HYPERLINK_TEXT = "点击查看原图"
+COLUMN_WIDTH = 15
+
+# pandas.DataFrame.to_excel 是否为表头设置样式 (pandas 3 移除了默认表头样式)
+PANDAS_HEADER_STYLED = hasattr(ExcelFormatter, "header_style")
+
+# xlsxwriter 每个工作表可写入的最大超链接数量 (超出部分写为 HYPERLINK 公式)
+XLSXWRITER_MAX_URLS = 65530
+# [2026-10-19] 新增: Excel 公式中字符串参数的最大长度 (更长的链接只能写为纯文本)
+EXCEL_MAX_FORMULA_STRING = 255
+# [2026-10-19] 新增: Excel 工作表的上限
+EXCEL_MAX_DATA_ROWS = 1048576 - 1 # 去掉表头行
+EXCEL_MAX_CELL_CHARS = 32767
+# 记录中表示报告数据库 rowid 的键 (不写入 Excel)
+ROWID_KEY = "__rowid__"
+TRUNCATED_MARK = "…[已截断]"
+
+ENGINE_AUTO = "auto"
+ENGINE_XLSXWRITER = "xlsxwriter"
+ENGINE_OPENPYXL = "openpyxl"
+
+
+def _is_missing(value: Any) -> bool:
+    """None 和 NaN 写为空单元格 (与 pandas 的 na_rep='' 一致)。"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def truncate_cell_text(value: str, note: str = TRUNCATED_MARK) -> str:
+    """
+    [2026-10-19] 新增: 把超过 EXCEL_MAX_CELL_CHARS 的文本截断，并在末尾附加说明 (总长度不超过上限)。
+    """
+    if len(value) <= EXCEL_MAX_CELL_CHARS:
+        return value
+    return value[:EXCEL_MAX_CELL_CHARS - len(note)] + note
+
+
+def _cell_value(value: Any, record: Dict[str, Any], row_number: int, column_name: str, cell_pointer: Optional[Callable[[int, str], str]]) -> Any:
+    """
+    普通单元格的值: 缺失值返回 None，超长文本截断 (cell_pointer 给出完整内容的位置说明)。
+    """
+    if _is_missing(value):
+        return None
+    if isinstance(value, str) and len(value) > EXCEL_MAX_CELL_CHARS:
+        note = cell_pointer(record.get(ROWID_KEY, row_number), column_name) if cell_pointer else TRUNCATED_MARK
+        return truncate_cell_text(value, note)
+    return value
+
+
+def choose_engine(engine: str = ENGINE_AUTO) -> str:
+    """
+    选择写入引擎: 指定引擎时直接使用；自动模式下已安装 xlsxwriter 时使用 xlsxwriter。
+    [2026-10-19] 修改: 不再按行数改用 openpyxl (超过超链接上限的行写为 HYPERLINK 公式)。
+    """
+    if engine != ENGINE_AUTO:
+        if engine == ENGINE_XLSXWRITER and not XLSXWRITER_AVAILABLE:
+            raise ImportError("未安装 xlsxwriter，无法使用 xlsxwriter 引擎。")
+        return engine
+    return ENGINE_XLSXWRITER if XLSXWRITER_AVAILABLE else ENGINE_OPENPYXL
+
+
+def _write_xlsxwriter_link(sheet, row_idx: int, col_idx: int, url: str, link_format, link_text: str, url_count: int) -> int:
+    """
+    [2026-10-19] 新增: 写入一个超链接单元格，返回已使用的 write_url 数量。
+    前 XLSXWRITER_MAX_URLS 个使用 write_url；之后写为 HYPERLINK 公式 (缓存值为显示文字，打开时无需重新计算)；
+    超过公式字符串长度上限的链接写为纯文本。
+    """
+    if url_count < XLSXWRITER_MAX_URLS:
+        sheet.write_url(row_idx, col_idx, url, link_format, link_text)
+        return url_count + 1
+    if len(url) <= EXCEL_MAX_FORMULA_STRING:
+        escaped_url = url.replace('"', '""')
+        escaped_text = link_text.replace('"', '""')
+        sheet.write_formula(row_idx, col_idx, f'=HYPERLINK("{escaped_url}","{escaped_text}")', link_format, link_text)
+    else:
+        sheet.write_string(row_idx, col_idx, url)
+    return url_count
+
+
+def _fill_xlsxwriter_sheet(workbook, formats: tuple, sheet_name: str, records: Iterable[Dict[str, Any]], columns: List[str],
+                           link: tuple, cell_pointer: Optional[Callable[[int, str], str]]) -> int:
+    header_format, link_format = formats
+    sheet = workbook.add_worksheet(sheet_name)
+    for col_idx, column_name in enumerate(columns):
+        # openpyxl 直接写入 width=15；xlsxwriter 会在宽度上加 5 像素边距，这里换算后写入的值同样是 15
+        sheet.set_column(col_idx, col_idx, (COLUMN_WIDTH * 7 - 5) / 7)
+        sheet.write_string(0, col_idx, str(column_name), header_format)
+
+    hyperlink_column, path_column, link_text = link
+    link_col = columns.index(hyperlink_column) if hyperlink_column in columns else -1
+    row_idx = 0
+    url_count = 0
+    for row_idx, record in enumerate(records, start=1):
+        for col_idx, column_name in enumerate(columns):
+            if col_idx == link_col:
+                path = record.get(path_column)
+                if not _is_missing(path):
+                    url_count = _write_xlsxwriter_link(sheet, row_idx, col_idx, f"file:///{path}", link_format, link_text, url_count)
+                continue
+            value = _cell_value(record.get(column_name), record, row_idx, column_name, cell_pointer)
+            if value is not None:
+                sheet.write(row_idx, col_idx, value)
+    return row_idx
+
+
+def _write_with_xlsxwriter(records: Iterable[Dict[str, Any]], columns: List[str], output_filepath: str, sheet_name: str,
+                           link: tuple, cell_pointer: Optional[Callable[[int, str], str]], extra_sheets: list = ()) -> int:
+    # strings_to_urls=False: 与 openpyxl 一致，普通字符串不会被自动转为超链接
+    workbook = xlsxwriter.Workbook(output_filepath, {"constant_memory": True, "strings_to_urls": False})
+    try:
+        header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"}) if PANDAS_HEADER_STYLED else None
+        formats = (header_format, workbook.add_format({"font_color": "#0000FF", "underline": 1}))
+        row_count = _fill_xlsxwriter_sheet(workbook, formats, sheet_name, records, columns, link, cell_pointer)
+        for extra_name, extra_columns, extra_records in extra_sheets:
+            _fill_xlsxwriter_sheet(workbook, formats, extra_name, extra_records, extra_columns, link, None)
+    finally:
+        workbook.close()
+    return row_count
+
+
+def _fill_openpyxl_sheet(workbook, sheet_name: str, records: Iterable[Dict[str, Any]], columns: List[str],
+                         link: tuple, cell_pointer: Optional[Callable[[int, str], str]]) -> int:
+    sheet = workbook.create_sheet(sheet_name)
+    for col_idx in range(len(columns)):
+        sheet.column_dimensions[get_column_letter(col_idx + 1)].width = COLUMN_WIDTH
+
+    thin = Side(style="thin")
+    header_font = Font(bold=True)
+    header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_alignment = Alignment(horizontal="center", vertical="top")
+    link_font = Font(color=Color("0000FF"), underline="single")
+
+    header_row = []
+    for column_name in columns:
+        cell = WriteOnlyCell(sheet, value=str(column_name))
+        if PANDAS_HEADER_STYLED:
+            cell.font = header_font
+            cell.border = header_border
+            cell.alignment = header_alignment
+        header_row.append(cell)
+    sheet.append(header_row)
+
+    hyperlink_column, path_column, link_text = link
+    link_col = columns.index(hyperlink_column) if hyperlink_column in columns else -1
+    row_count = 0
+    for record in records:
+        row_count += 1
+        row = []
+        for col_idx, column_name in enumerate(columns):
+            if col_idx == link_col:
+                path = record.get(path_column)
+                if _is_missing(path):
+                    row.append(None)
+                    continue
+                cell = WriteOnlyCell(sheet, value=link_text)
+                cell.hyperlink = f"file:///{path}"
+                cell.font = link_font
+                row.append(cell)
+                continue
+            row.append(_cell_value(record.get(column_name), record, row_count, column_name, cell_pointer))
+        sheet.append(row)
+    return row_count
+
+
+def _write_with_openpyxl(records: Iterable[Dict[str, Any]], columns: List[str], output_filepath: str, sheet_name: str,
+                         link: tuple, cell_pointer: Optional[Callable[[int, str], str]], extra_sheets: list = ()) -> int:
+    workbook = Workbook(write_only=True)
+    row_count = _fill_openpyxl_sheet(workbook, sheet_name, records, columns, link, cell_pointer)
+    for extra_name, extra_columns, extra_records in extra_sheets:
+        _fill_openpyxl_sheet(workbook, extra_name, extra_records, extra_columns, link, None)
+    workbook.save(output_filepath)
+    return row_count
+
+
+def write_report_streaming(
+    records: Iterable[Dict[str, Any]],
+    columns: List[str],
+    output_filepath: str,
+    sheet_name: str = REPORT_SHEET_NAME,
+    row_count: Optional[int] = None,
+    engine: str = ENGINE_AUTO,
+    cell_pointer: Optional[Callable[[int, str], str]] = None,
+    hyperlink_column: str = HYPERLINK_COLUMN,
+    path_column: str = PATH_COLUMN,
+    link_text: str = HYPERLINK_TEXT,
+    extra_sheets: Optional[List[Tuple[str, List[str], List[Dict[str, Any]]]]] = None,
+) -> str:
+    """
+    以流式方式把记录写入 Excel 报告。
+
+    :param records: 记录 (字典) 的可迭代对象，只遍历一次，可以是生成器。
+    :param columns: 写入的列名及顺序，记录中不在此列表的键会被忽略。
+    :param output_filepath: 输出文件路径。
+    :param sheet_name: 工作表名称。
+    :param row_count: 行数，None 表示未知。[2026-10-19 修改] 不再影响引擎选择，保留该参数以兼容调用方。
+    :param engine: ENGINE_AUTO / ENGINE_XLSXWRITER / ENGINE_OPENPYXL。
+    :param cell_pointer: [2026-10-19 新增] 超长文本被截断时调用 cell_pointer(rowid, 列名) 生成说明文字
+                         (rowid 取记录中的 ROWID_KEY，没有时为 1 起始的行号)。
+    :param hyperlink_column: [2026-10-19 新增] 超链接列名。
+    :param path_column: [2026-10-19 新增] 超链接目标路径所在的列名。
+    :param link_text: [2026-10-19 新增] 超链接单元格显示的文字。
+    :param extra_sheets: [2026-10-19 新增] 写在主工作表之后的附加工作表 [(工作表名称, 列名, 记录列表)]，
+                         例如重复文件列表；超链接列的处理与主工作表相同。
+    :return: 实际使用的引擎名称。
+    """
+    extra_sheets = extra_sheets or []
+    chosen_engine = choose_engine(engine)
+    link = (hyperlink_column, path_column, link_text)
+    if chosen_engine == ENGINE_XLSXWRITER:
+        _write_with_xlsxwriter(records, columns, output_filepath, sheet_name, link, cell_pointer, extra_sheets)
+    else:
+        _write_with_openpyxl(records, columns, output_filepath, sheet_name, link, cell_pointer, extra_sheets)
+    return chosen_engine
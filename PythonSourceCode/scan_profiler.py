@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 图片扫描热点路径的分阶段计时 (可选，默认关闭)。
+
+process_single_image 把每个文件的处理分为以下阶段:
+- stat:        文件存在检查和创建时间读取；
+- open:        Image.open (读取文件头)；
+- metadata:    读取 PNG parameters 文本块 / EXIF UserComment；
+- parse:       非法字符清理、正则提取和切割提示词；
+- core_prompt: 停用词剔除 (提取核心词) 和模型名提取；
+- build:       构建结果字典。
+
+每个扫描子进程把一批文件的耗时汇总到 ScanProfile (对数分桶直方图 + 最慢文件列表)，
+主进程 (get_image_info / iter_image_info_batches 共用的扫描执行器) 合并各批结果并打印 p50/p95/p99 和最慢的文件。
+直方图大小固定，与文件数无关；关闭时 process_single_image 只多出几次 None 判断。
+"""
+import math
+import time
+import heapq
+from typing import Dict, List, Tuple
+
+SCAN_PROFILE_PHASES = ["stat", "open", "metadata", "parse", "core_prompt", "build"]
+
+# 每个 2 倍区间分为 4 个桶 (相邻桶相差约 19%)，覆盖 1 纳秒到约 1 小时
+BUCKETS_PER_OCTAVE = 4
+BUCKET_COUNT = 42 * BUCKETS_PER_OCTAVE
+# 汇总中列出的最慢文件数
+SLOWEST_FILES = 10
+
+
+class PhaseHistogram:
+    """
+    单个阶段的耗时直方图 (纳秒，对数分桶)，可合并。
+    """
+    __slots__ = ("counts", "count", "total_ns", "max_ns")
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, duration_ns: int):
+        index = int(math.log2(duration_ns) * BUCKETS_PER_OCTAVE) if duration_ns > 1 else 0
+        self.counts[min(index, BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def merge(self, other: "PhaseHistogram"):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+    def percentile(self, q: float) -> float:
+        """
+        第 q 百分位的耗时 (纳秒，取所在桶的上界，不超过最大值)。
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(2 ** ((index + 1) / BUCKETS_PER_OCTAVE), self.max_ns)
+        return float(self.max_ns)
+
+
+class ScanProfile:
+    """
+    一次扫描 (或一个子进程处理的一批文件) 的分阶段耗时汇总。
+    """
+    def __init__(self, slowest_files: int = SLOWEST_FILES):
+        self.phases: Dict[str, PhaseHistogram] = {phase: PhaseHistogram() for phase in SCAN_PROFILE_PHASES}
+        self.total = PhaseHistogram()
+        self.slowest_files = slowest_files
+        # 最小堆: (总耗时纳秒, 路径, {阶段: 纳秒})
+        self.slowest: List[Tuple[int, str, Dict[str, int]]] = []
+
+    def record(self, path: str, durations: Dict[str, int]):
+        total_ns = 0
+        for phase, duration_ns in durations.items():
+            self.phases[phase].add(duration_ns)
+            total_ns += duration_ns
+        self.total.add(total_ns)
+        entry = (total_ns, path, durations)
+        if len(self.slowest) < self.slowest_files:
+            heapq.heappush(self.slowest, entry)
+        elif total_ns > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def merge(self, other: "ScanProfile"):
+        for phase, histogram in other.phases.items():
+            self.phases[phase].merge(histogram)
+        self.total.merge(other.total)
+        for entry in other.slowest:
+            if len(self.slowest) < self.slowest_files:
+                heapq.heappush(self.slowest, entry)
+            elif entry[0] > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def summary_rows(self) -> List[Dict[str, float]]:
+        """
+        每个阶段一行: 文件数、p50/p95/p99/最大 (毫秒)、合计 (秒) 和占总耗时的比例。
+        """
+        grand_total = self.total.total_ns or 1
+        rows = []
+        for phase, histogram in list(self.phases.items()) + [("合计", self.total)]:
+            rows.append({
+                "阶段": phase,
+                "文件数": histogram.count,
+                "p50(ms)": histogram.percentile(50) / 1e6,
+                "p95(ms)": histogram.percentile(95) / 1e6,
+                "p99(ms)": histogram.percentile(99) / 1e6,
+                "最大(ms)": histogram.max_ns / 1e6,
+                "合计(s)": histogram.total_ns / 1e9,
+                "占比": histogram.total_ns / grand_total,
+            })
+        return rows
+
+    def print_summary(self):
+        print("\n--- 扫描分阶段耗时 (每个文件) ---")
+        print(f"{'阶段':<12}{'文件数':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}{'合计(s)':>10}{'占比':>8}")
+        for row in self.summary_rows():
+            print(
+                f"{row['阶段']:<12}{row['文件数']:>8}{row['p50(ms)']:>10.3f}{row['p95(ms)']:>10.3f}{row['p99(ms)']:>10.3f}"
+                f"{row['最大(ms)']:>10.3f}{row['合计(s)']:>10.3f}{row['占比']:>8.1%}"
+            )
+        if self.slowest:
+            print(f"\n最慢的 {len(self.slowest)} 个文件:")
+            for total_ns, path, durations in sorted(self.slowest, reverse=True):
+                slowest_phase = max(durations, key=durations.get)
+                print(f"  {total_ns / 1e6:9.3f} ms (最慢阶段 {slowest_phase} {durations[slowest_phase] / 1e6:.3f} ms)  {path}")
+
+
+class PhaseTimer:
+    """
+    单个文件的阶段计时器: start() 后在每个阶段结束时调用 mark(阶段名)，finish() 把结果记入 ScanProfile。
+    同一阶段多次 mark 时累加。
+    """
+    __slots__ = ("profile", "path", "durations", "_last")
+
+    def __init__(self, profile: ScanProfile):
+        self.profile = profile
+        self.path = ""
+        self.durations: Dict[str, int] = {}
+        self._last = 0
+
+    def start(self, path: str):
+        self.path = path
+        self.durations = {}
+        self._last = time.perf_counter_ns()
+
+    def mark(self, phase: str):
+        now = time.perf_counter_ns()
+        self.durations[phase] = self.durations.get(phase, 0) + (now - self._last)
+        self._last = now
+
+    def finish(self):
+        if self.durations:
+            self.profile.record(self.path, self.durations)
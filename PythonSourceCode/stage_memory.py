@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 流水线各阶段的峰值内存分析 (可选，默认关闭)。
+
+StageMemoryMonitor 在后台线程中定期采样 (默认每 0.1 秒):
+- tracemalloc 的 Python 分配峰值 (每次采样后 reset_peak，两次采样之间的峰值计入当时正在运行的全部阶段)；
+- 主进程 RSS 和全部子进程 (扫描/TF-IDF 进程池，含孙进程) 的 RSS 合计；
+- 阶段开始时拍摄 tracemalloc 快照；阶段开始后新增的已分配内存创新高 (超过上次快照 25%) 时再拍摄快照，
+  与开始时的快照按调用栈比较 (同 Snapshot.compare_to)，保存该阶段新增内存最多的分配位置。
+  之前阶段的结果不计入；同时运行的阶段在重叠期间的分配会计入彼此。
+阶段结束时记录净增长 (阶段结束时仍被持有的内存)。
+
+并行运行的阶段共享同一进程的内存，重叠期间的峰值会同时计入这些阶段 (汇总中标出重叠的阶段)。
+子进程中的 Python 分配位置不做跟踪，只统计子进程的 RSS。
+只有 pipeline_runner 的阶段图接入了监视器 (--memory-profile)，交互式主程序没有阶段划分，不做内存分析。
+
+RSS 读取优先使用 psutil (可选依赖)，否则读取 /proc (Linux)；两者都不可用时只报告 tracemalloc 数据。
+"""
+import os
+import sys
+import fnmatch
+import threading
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+# psutil 为可选依赖: 缺失时在 Linux 上读取 /proc
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# tracemalloc 记录的调用栈深度 (用于找到分配位置在本项目代码中的调用处)。
+# 跟踪开销随深度明显增长: 写报告阶段 1 层约慢 4 倍，8 层约慢 25 倍
+TRACEMALLOC_FRAMES = 4
+SAMPLE_INTERVAL_SECONDS = 0.1
+# 每个阶段列出的分配位置数量
+TOP_ALLOCATION_SITES = 5
+# 已分配内存比上次快照增长超过该比例时重新拍摄快照
+SNAPSHOT_GROWTH_RATIO = 1.25
+# 低于该大小 (字节) 不拍摄快照
+SNAPSHOT_MIN_BYTES = 1 << 20
+
+# 监视器运行期间 fork 出的子进程 (扫描/TF-IDF 进程池) 不继承 tracemalloc 跟踪
+_tracing_owner_pid: Optional[int] = None
+_SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+# [2026-10-19] 新增: 汇总分配位置时排除本模块 (汇总过程自身的分配也会被跟踪) 和 tracemalloc 模块的分配
+_EXCLUDE_FILTERS = (tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__))
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _read_proc_rss(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _proc_children(pid: int) -> List[int]:
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                children.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return children
+
+
+def process_rss() -> Tuple[Optional[int], Optional[int]]:
+    """
+    :return: (本进程 RSS, 全部子孙进程 RSS 合计)，单位字节；无法读取时为 None。
+    """
+    if psutil is not None:
+        try:
+            process = psutil.Process()
+            children_rss = 0
+            for child in process.children(recursive=True):
+                try:
+                    children_rss += child.memory_info().rss
+                except psutil.Error:
+                    pass # 子进程已退出
+            return process.memory_info().rss, children_rss
+        except psutil.Error:
+            return None, None
+    pid = os.getpid()
+    own_rss = _read_proc_rss(pid)
+    if own_rss is None:
+        return None, None
+    children_rss = 0
+    pending = _proc_children(pid)
+    while pending:
+        child = pending.pop()
+        children_rss += _read_proc_rss(child) or 0
+        pending.extend(_proc_children(child))
+    return own_rss, children_rss
+
+
+def peak_rss_hwm() -> Optional[int]:
+    """
+    本进程整个生命周期的 RSS 最高水位 (字节)。
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的单位是字节，Linux 是 KB
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _stop_tracing_in_child():
+    if _tracing_owner_pid is not None and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_stop_tracing_in_child)
+
+
+def format_bytes(size: Optional[float]) -> str:
+    if size is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class StageMemory:
+    """
+    单个阶段的内存统计。
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.traced_start = 0
+        self.traced_end = 0
+        self.traced_peak = 0
+        self.rss_peak: Optional[int] = None
+        self.children_rss_peak: Optional[int] = None
+        self.overlapping: set = set()
+        # 阶段开始时的 tracemalloc 快照；第一次比较时按调用栈汇总为 {调用栈: (字节, 分配次数)} 后释放快照
+        self.start_snapshot: Optional[tracemalloc.Snapshot] = None
+        self.start_statistics: Optional[Dict[tracemalloc.Traceback, Tuple[int, int]]] = None
+        # 快照时阶段开始后新增的已分配内存和新增最多的分配位置 [(位置, 项目代码中的调用处, 新增字节, 新增分配次数)]
+        self.snapshot_traced = 0
+        self.top_sites: List[Tuple[str, str, int, int]] = []
+
+    @property
+    def traced_net(self) -> int:
+        return self.traced_end - self.traced_start
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "阶段": self.name,
+            "Python分配峰值(字节)": self.traced_peak,
+            "Python分配净增长(字节)": self.traced_net,
+            "主进程RSS峰值(字节)": self.rss_peak,
+            "子进程RSS峰值(字节)": self.children_rss_peak,
+            "重叠阶段": sorted(self.overlapping),
+            "阶段新增分配位置": [{"位置": site, "调用处": caller, "新增字节": size, "新增次数": count} for site, caller, size, count in self.top_sites],
+        }
+
+
+class StageMemoryMonitor:
+    """
+    阶段内存监视器: start() 开始采样，每个阶段调用 stage_started/stage_finished，stop() 结束。
+    """
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SECONDS, top_sites: int = TOP_ALLOCATION_SITES):
+        self.interval = interval
+        self.top_sites = top_sites
+        self.stages: Dict[str, StageMemory] = {}
+        self._active: Dict[str, StageMemory] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_tracemalloc = False
+        self.process_hwm: Optional[int] = None
+
+    def start(self):
+        global _tracing_owner_pid
+        _tracing_owner_pid = os.getpid()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._thread = threading.Thread(target=self._sample_loop, name="stage-memory-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        global _tracing_owner_pid
+        _tracing_owner_pid = None
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.process_hwm = peak_rss_hwm()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """
+        采样一次，把上次采样以来的峰值计入正在运行的阶段。
+        """
+        with self._lock:
+            if not self._active:
+                tracemalloc.reset_peak()
+                return
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            rss, children_rss = process_rss()
+            snapshot_stages = []
+            for stage in self._active.values():
+                stage.traced_peak = max(stage.traced_peak, peak)
+                if rss is not None:
+                    stage.rss_peak = max(stage.rss_peak or 0, rss)
+                    stage.children_rss_peak = max(stage.children_rss_peak or 0, children_rss)
+                grown = current - stage.traced_start
+                if stage.start_snapshot is not None and grown >= SNAPSHOT_MIN_BYTES and grown > stage.snapshot_traced * SNAPSHOT_GROWTH_RATIO:
+                    snapshot_stages.append(stage)
+            if snapshot_stages:
+                statistics = tracemalloc.take_snapshot().statistics("traceback")
+                for stage in snapshot_stages:
+                    if stage.start_statistics is None:
+                        stage.start_statistics = {stat.traceback: (stat.size, stat.count) for stat in stage.start_snapshot.statistics("traceback")}
+                        stage.start_snapshot = None
+                    stage.snapshot_traced = current - stage.traced_start
+                    stage.top_sites = self._top_sites(statistics, stage.start_statistics)
+
+    def _top_sites(self, statistics: List[tracemalloc.Statistic],
+                   start_statistics: Dict[tracemalloc.Traceback, Tuple[int, int]]) -> List[Tuple[str, str, int, int]]:
+        """
+        按 (分配位置, 最内层的项目代码调用处) 汇总 statistics 比阶段开始时 (start_statistics) 新增的内存，返回新增最多的几项。
+        分配位置通常在 pandas/scipy 等库内部，调用处指出是项目中哪一行触发的。
+
+        Snapshot.statistics("traceback") 按调用栈汇总 (每个不同的调用栈只构造一次 Traceback 对象)，百万级记录也需要数秒，
+        因此不使用 Snapshot.compare_to (每次都重新汇总开始时的快照)，开始时的汇总每个阶段只计算一次。
+        _EXCLUDE_FILTERS 只比较最近一帧，同一调用栈的分配记录结果相同，因此按调用栈判断，
+        等价于 Snapshot.filter_traces；filter_traces 逐条匹配分配记录，百万级记录需要约一分钟。
+        """
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for stat in statistics:
+            start_size, start_count = start_statistics.get(stat.traceback, (0, 0))
+            if stat.size <= start_size:
+                continue # 阶段开始前已持有的内存，或阶段内已释放
+            frames = list(stat.traceback) # 从最早的调用到最近的调用
+            site = frames[-1]
+            if site.filename.startswith("<frozen importlib"):
+                continue # 模块导入
+            if any(fnmatch.fnmatch(site.filename, exclude.filename_pattern) for exclude in _EXCLUDE_FILTERS):
+                continue
+            caller = next((frame for frame in reversed(frames) if frame.filename.startswith(_SOURCE_DIR)), None)
+            key = (f"{os.path.basename(site.filename)}:{site.lineno}", f"{os.path.basename(caller.filename)}:{caller.lineno}" if caller else "-")
+            group = groups.setdefault(key, [0, 0])
+            group[0] += stat.size - start_size
+            group[1] += stat.count - start_count
+        top = sorted(groups.items(), key=lambda item: item[1][0], reverse=True)[:self.top_sites]
+        return [(site, caller, size, count) for (site, caller), (size, count) in top]
+
+    def stage_started(self, name: str):
+        self.sample()
+        with self._lock:
+            stage = StageMemory(name)
+            stage.start_snapshot = tracemalloc.take_snapshot()
+            stage.traced_start = tracemalloc.get_traced_memory()[0]
+            for other in self._active.values():
+                other.overlapping.add(name)
+                stage.overlapping.add(other.name)
+            self.stages[name] = stage
+            self._active[name] = stage
+
+    def stage_finished(self, name: str):
+        self.sample()
+        with self._lock:
+            stage = self._active.pop(name)
+            stage.start_snapshot = stage.start_statistics = None
+            stage.traced_end = tracemalloc.get_traced_memory()[0]
+
+    def results(self) -> List[Dict[str, Any]]:
+        return [stage.as_dict() for stage in self.stages.values()]
+
+    def print_summary(self):
+        print("\n--- 流水线阶段峰值内存 ---")
+        print(f"{'阶段':<16}{'Python峰值':>12}{'净增长':>12}{'主进程RSS':>12}{'子进程RSS':>12}  重叠阶段")
+        for stage in self.stages.values():
+            print(
+                f"{stage.name:<16}{format_bytes(stage.traced_peak):>12}{format_bytes(stage.traced_net):>12}"
+                f"{format_bytes(stage.rss_peak):>12}{format_bytes(stage.children_rss_peak):>12}  {', '.join(sorted(stage.overlapping)) or '-'}"
+            )
+        if self.process_hwm is not None:
+            print(f"主进程 RSS 最高水位: {format_bytes(self.process_hwm)}")
+        for stage in self.stages.values():
+            if stage.top_sites:
+                print(f"\n[{stage.name}] 阶段内新增 {format_bytes(stage.snapshot_traced)} 时新增最多的分配位置 (含重叠阶段同时期的分配):")
+                for site, caller, size, count in stage.top_sites:
+                    print(f"  {format_bytes(size):>10}  {count:>9} 个对象  {site}  (调用处 {caller})")
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 基于队列的批量结构化日志 (替代每条消息打开一次日志文件)。
+
+原来的 log_error 在每个扫描子进程中为每条消息打开、追加、关闭 image_scan_error.log 并立即打印，
+损坏文件多或移动大量文件时日志本身成为瓶颈，且多个进程的输出会交错。现在:
+- 所有进程把日志记录放入同一个 multiprocessing 队列 (子进程通过进程池的 initializer 获得队列)；
+- 主进程中唯一的写入线程按批 (最多 LOG_BATCH_SIZE 条或 LOG_FLUSH_SECONDS 秒) 写入:
+    LOG_FILE (image_scan_error.log):  与原来相同的 "时间 - 消息" 文本行 (只写 ERROR/WARNING)；
+    JSON_LOG_FILE (image_scan_error.jsonl): 结构化记录 {time, level, stage, file, error_class, message, pid}；
+- 控制台输出限速 (每秒最多 CONSOLE_LINES_PER_SECOND 行)，超出部分只计数，并定期打印省略条数；
+- 进程退出时写完剩余记录，并按 (阶段, 错误类型) 打印汇总。
+
+没有通过 initializer 拿到队列的子进程 (例如其他代码自行创建的进程池) 退回到原来的直接追加写入。
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+import multiprocessing
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+LOG_FILE = "image_scan_error.log"
+JSON_LOG_FILE = "image_scan_error.jsonl"
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_SECONDS = 0.5
+CONSOLE_LINES_PER_SECOND = 20
+
+LEVEL_INFO = "INFO"
+LEVEL_WARNING = "WARNING"
+LEVEL_ERROR = "ERROR"
+# 写入文本/JSON 日志文件的级别 (INFO 只输出到控制台)
+FILE_LEVELS = (LEVEL_WARNING, LEVEL_ERROR)
+
+_STOP = None
+_queue = None
+_writer: Optional["_LogWriter"] = None
+_lock = threading.Lock()
+
+
+def _is_main_process() -> bool:
+    return multiprocessing.parent_process() is None
+
+
+class _LogWriter:
+    """
+    主进程中的写入线程: 按批取出记录，写入日志文件并限速输出到控制台。
+    """
+    def __init__(self, log_queue):
+        self.queue = log_queue
+        self.counts: Counter = Counter()
+        self.suppressed = 0
+        self._window_start = 0.0
+        self._window_lines = 0
+        self.thread = threading.Thread(target=self._run, name="structured-log-writer", daemon=True)
+
+    def _run(self):
+        text_file = json_file = None
+        try:
+            while True:
+                batch = [self.queue.get()]
+                deadline = time.monotonic() + LOG_FLUSH_SECONDS
+                while batch[-1] is not _STOP and len(batch) < LOG_BATCH_SIZE:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self.queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                stopping = batch[-1] is _STOP
+                records = [record for record in batch if record is not _STOP]
+                file_records = [record for record in records if record["level"] in FILE_LEVELS]
+                if file_records:
+                    if text_file is None:
+                        text_file = open(LOG_FILE, "a", encoding="utf-8")
+                        json_file = open(JSON_LOG_FILE, "a", encoding="utf-8")
+                    text_file.write("".join(f"{record['time']} - {record['message']}\n" for record in file_records))
+                    json_file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in file_records))
+                    text_file.flush()
+                    json_file.flush()
+                for record in file_records:
+                    self.counts[(record["stage"] or "-", record["error_class"] or "-")] += 1
+                self._console(records)
+                if stopping:
+                    break
+        finally:
+            if text_file is not None:
+                text_file.close()
+                json_file.close()
+
+    def _console(self, records: List[Dict[str, Any]]):
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            if self.suppressed:
+                print(f"... 已省略 {self.suppressed} 条日志 (错误详见 {LOG_FILE})")
+                self.suppressed = 0
+            self._window_start = now
+            self._window_lines = 0
+        for record in records:
+            if self._window_lines < CONSOLE_LINES_PER_SECOND:
+                print(record["message"])
+                self._window_lines += 1
+            else:
+                self.suppressed += 1
+
+    def print_summary(self):
+        if self.suppressed:
+            print(f"... 已省略 {self.suppressed} 条日志 (错误详见 {LOG_FILE})")
+            self.suppressed = 0
+        if not self.counts:
+            return
+        print(f"\n--- 日志汇总 (共 {sum(self.counts.values())} 条，详见 {LOG_FILE} / {JSON_LOG_FILE}) ---")
+        for (stage, error_class), count in self.counts.most_common():
+            print(f"  {stage:<10} {error_class:<28} {count} 条")
+
+
+def get_queue():
+    """
+    返回日志队列 (主进程中首次调用时启动写入线程)。创建进程池时作为 init_worker 的参数传给子进程。
+    """
+    global _queue, _writer
+    if _queue is not None:
+        return _queue
+    if not _is_main_process():
+        return None
+    with _lock:
+        if _queue is None:
+            log_queue = multiprocessing.Queue()
+            _writer = _LogWriter(log_queue)
+            _writer.thread.start()
+            _queue = log_queue
+            atexit.register(shutdown)
+    return _queue
+
+
+def init_worker(log_queue):
+    """
+    进程池 initializer: 子进程的日志记录放入主进程的队列。
+    """
+    global _queue
+    _queue = log_queue
+
+
+def shutdown():
+    """
+    写完队列中的剩余记录并停止写入线程 (进程退出时自动调用)，打印汇总。
+    """
+    global _queue, _writer
+    with _lock:
+        writer, log_queue = _writer, _queue
+        _writer = _queue = None
+    if writer is None:
+        return
+    log_queue.put(_STOP)
+    writer.thread.join()
+    log_queue.close()
+    log_queue.join_thread()
+    writer.print_summary()
+
+
+def _direct_write(record: Dict[str, Any]):
+    """没有日志队列时的退路: 与原来的 log_error 相同，直接打印并追加写入。"""
+    print(record["message"])
+    if record["level"] in FILE_LEVELS:
+        with open(LOG_FILE, "a", encoding="utf-8") as log_file:
+            log_file.write(f"{record['time']} - {record['message']}\n")
+
+
+def log_event(message: str, level: str = LEVEL_ERROR, stage: Optional[str] = None, file: Optional[str] = None,
+              error: Optional[BaseException] = None):
+    """
+    记录一条日志。
+
+    :param message: 日志消息 (文本日志和控制台中显示的内容)。
+    :param level: LEVEL_INFO (只输出到控制台) / LEVEL_WARNING / LEVEL_ERROR。
+    :param stage: 所属阶段，例如 "scan"、"classify"、"archive"。
+    :param file: 相关的文件路径。
+    :param error: 捕获的异常 (记录其类型名)。
+    """
+    record = {
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "level": level,
+        "stage": stage,
+        "file": file,
+        "error_class": type(error).__name__ if error is not None else None,
+        "message": message,
+        "pid": os.getpid(),
+    }
+    log_queue = _queue if _queue is not None else get_queue()
+    if log_queue is None:
+        _direct_write(record)
+        return
+    try:
+        log_queue.put(record)
+    except (ValueError, OSError, AssertionError):
+        # 队列已关闭 (进程退出阶段)
+        _direct_write(record)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 可复现的合成 Stable Diffusion 图片目录树 (用于基准测试)。
+
+生成的目录树模拟真实的 outputs 目录:
+- 日期文件夹 (YYYY-MM-DD) 和受保护文件夹 (超级精选/超绝/精选/特殊画风，以及包含模糊保护关键词的文件夹)；
+- 8x8 的小图片，格式按比例混合 PNG / JPEG / WebP；
+- PNG 写入 A1111 的 parameters 文本块，JPEG/WebP 写入 EXIF UserComment ("UNICODE\\0" + UTF-16BE，与 A1111 相同)；
+- 提示词按批次重复 (同一批次只有种子不同)，开头是 POSITIVE_PROMPT_STOP_WORDS 中的画师串，
+  标签来自分类关键词和文件名标记关键词；
+- 文件修改时间固定在所在日期，同一 (数量, 种子) 生成的目录树完全相同。
+
+用法:
+    python synthetic_corpus.py <输出目录> --size 10k [--seed 0]
+"""
+import os
+import sys
+import random
+import argparse
+import concurrent.futures
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from PIL import Image, PngImagePlugin
+
+from image_scanner import POSITIVE_PROMPT_STOP_WORDS
+from filename_tagger import TAGGING_KEYWORDS
+from file_categorizer import DEFAULT_PROTECTED_FOLDER_NAMES
+
+CORPUS_SIZES = {"1k": 1000, "10k": 10000, "100k": 100000}
+# 格式及比例
+FORMAT_WEIGHTS = (("png", 0.7), ("jpeg", 0.15), ("webp", 0.15))
+# 受保护文件夹中的图片比例
+PROTECTED_RATIO = 0.2
+# 模糊保护关键词命中的文件夹
+FUZZY_PROTECTED_FOLDERS = ["我的特殊收藏", "手动挑选"]
+DATE_FOLDER_COUNT = 30
+START_DATE = datetime(2025, 1, 1, tzinfo=timezone.utc) # 使用 UTC，生成结果与本机时区无关
+BATCH_SIZES = (1, 2, 4, 4, 8)
+
+CLASSIFY_KEYWORDS = [
+    "skeleton", "nude", "green_hair", "blue_hair", "red_hair", "purple_hair", "yellow_hair",
+    "pink_hair", "white_hair", "grey_hair", "brown_hair", "black_hair", "blonde_hair", "aqua_hair",
+]
+COMMON_TAGS = [
+    "1girl", "solo", "looking_at_viewer", "smile", "long_hair", "short_hair", "blush", "open_mouth",
+    "school_uniform", "outdoors", "indoors", "sky", "cloud", "flower", "cat_ears", "hat", "dress",
+    "thighhighs", "from_side", "upper_body", "full_body", "night", "city", "beach", "rain",
+]
+QUALITY_TAGS = "masterpiece, best quality, amazing quality, very aesthetic, absurdres, newest"
+NEGATIVE_PROMPT = "lowres, bad anatomy, bad hands, text, error, missing fingers, extra digit, cropped, worst quality, low quality, jpeg artifacts, signature, watermark"
+SAMPLERS = ["Euler a", "DPM++ 2M", "DPM++ SDE", "Restart"]
+MODELS = [("waiIllustriousSDXL_v140", "bdb59bac77"), ("noobaiXLNAIXL_vPred10", "ea349eeae8"), ("ponyDiffusionV6XL", "67ab2fd8ec")]
+
+# 每个子进程生成的文件数
+GENERATE_CHUNK = 500
+
+
+def _folders() -> Tuple[List[str], List[str]]:
+    dates = [(START_DATE + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(DATE_FOLDER_COUNT)]
+    protected = list(DEFAULT_PROTECTED_FOLDER_NAMES) + FUZZY_PROTECTED_FOLDERS
+    return dates, protected
+
+
+def _batch_prompt(rng: random.Random) -> Dict[str, str]:
+    """一个生成批次的提示词和设置 (同一批次的图片只有种子不同)。"""
+    artist = rng.choice(POSITIVE_PROMPT_STOP_WORDS)
+    tags = rng.sample(COMMON_TAGS, rng.randint(4, 10)) + rng.sample(CLASSIFY_KEYWORDS, rng.randint(0, 2))
+    if rng.random() < 0.4:
+        tags += rng.sample(TAGGING_KEYWORDS, rng.randint(1, 2))
+    rng.shuffle(tags)
+    model, model_hash = rng.choice(MODELS)
+    return {
+        "positive": f"{artist}{', '.join(tags)}, {QUALITY_TAGS}",
+        "settings": (
+            f"Sampler: {rng.choice(SAMPLERS)}, Schedule type: Karras, CFG scale: {rng.choice([4, 5, 5.5, 6, 7])}, "
+            f"Seed: {{seed}}, Size: 832x1216, Model hash: {model_hash}, Model: {model}, Version: v1.10.1"
+        ),
+        "steps": str(rng.choice([20, 25, 28, 30])),
+    }
+
+
+def _parameters_text(batch: Dict[str, str], seed: int) -> str:
+    return f"{batch['positive']}\nNegative prompt: {NEGATIVE_PROMPT}\nSteps: {batch['steps']}, {batch['settings'].replace('{seed}', str(seed))}"
+
+
+def plan_corpus(n_files: int, seed: int = 0) -> List[Tuple[str, str, str, int]]:
+    """
+    计算目录树的全部文件 (不写入磁盘)。
+
+    :return: [(相对路径, 格式, parameters 文本, 修改时间戳)]。
+    """
+    rng = random.Random(seed)
+    dates, protected = _folders()
+    formats = [fmt for fmt, _ in FORMAT_WEIGHTS]
+    weights = [weight for _, weight in FORMAT_WEIGHTS]
+    files = []
+    index = 0
+    while index < n_files:
+        batch = _batch_prompt(rng)
+        batch_size = min(rng.choice(BATCH_SIZES), n_files - index)
+        date_index = rng.randrange(len(dates))
+        folder = rng.choice(protected) if rng.random() < PROTECTED_RATIO else dates[date_index]
+        fmt = rng.choices(formats, weights)[0]
+        base_seed = rng.randrange(2 ** 32)
+        mtime = int((START_DATE + timedelta(days=date_index, seconds=rng.randrange(86400))).timestamp())
+        for offset in range(batch_size):
+            ext = "jpg" if fmt == "jpeg" else fmt
+            name = f"{index:06d}-{base_seed + offset}.{ext}"
+            files.append((os.path.join(folder, name), fmt, _parameters_text(batch, base_seed + offset), mtime + offset))
+            index += 1
+    return files
+
+
+def _user_comment(text: str) -> bytes:
+    """EXIF UserComment (与 A1111 / piexif 的 unicode 编码一致)。"""
+    return b"UNICODE\0" + text.encode("utf-16-be")
+
+
+def _write_files(root: str, files: List[Tuple[str, str, str, int]]) -> int:
+    for relative_path, fmt, parameters, mtime in files:
+        path = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        color = (mtime * 37 % 256, mtime * 17 % 256, mtime * 7 % 256)
+        image = Image.new("RGB", (8, 8), color)
+        if fmt == "png":
+            info = PngImagePlugin.PngInfo()
+            info.add_text("parameters", parameters)
+            image.save(path, pnginfo=info)
+        else:
+            exif = Image.Exif()
+            exif.get_ifd(0x8769)[0x9286] = _user_comment(parameters)
+            if fmt == "jpeg":
+                image.save(path, format="JPEG", quality=80, exif=exif.tobytes())
+            else:
+                image.save(path, format="WEBP", quality=80, exif=exif.tobytes())
+        os.utime(path, (mtime, mtime))
+    return len(files)
+
+
+def generate_corpus(root: str, n_files: int, seed: int = 0, max_workers: int = None) -> int:
+    """
+    在 root 下生成合成目录树 (root 应为空目录或不存在)。
+
+    :return: 生成的文件数。
+    """
+    files = plan_corpus(n_files, seed)
+    os.makedirs(root, exist_ok=True)
+    chunks = [files[i:i + GENERATE_CHUNK] for i in range(0, len(files), GENERATE_CHUNK)]
+    if len(chunks) <= 1:
+        return sum(_write_files(root, chunk) for chunk in chunks)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return sum(executor.map(_write_files, [root] * len(chunks), chunks))
+
+
+def parse_size(size: str) -> int:
+    return CORPUS_SIZES[size] if size in CORPUS_SIZES else int(size)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="生成合成 Stable Diffusion 图片目录树")
+    parser.add_argument("root", help="输出目录")
+    parser.add_argument("--size", default="1k", help="文件数: 1k / 10k / 100k 或具体数字")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子 (相同种子生成相同的目录树)")
+    args = parser.parse_args(argv)
+    if os.path.isdir(args.root) and os.listdir(args.root):
+        parser.error(f"输出目录 '{args.root}' 不为空。")
+    count = generate_corpus(args.root, parse_size(args.size), args.seed)
+    print(f"已生成 {count} 个图片文件: {os.path.abspath(args.root)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+测试配置: PythonSourceCode 下的模块按模块名直接导入 (与主程序相同)。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _log_files_in_temp_dir(tmp_path_factory):
+    """structured_log 的日志文件写入临时目录，而不是运行测试时的当前目录。"""
+    import structured_log
+    log_dir = tmp_path_factory.mktemp("logs")
+    structured_log.LOG_FILE = str(log_dir / "image_scan_error.log")
+    structured_log.JSON_LOG_FILE = str(log_dir / "image_scan_error.jsonl")
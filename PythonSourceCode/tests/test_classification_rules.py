@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+classification_rules.build_move_plan: 绝对路径保护范围和目标路径拼接。
+"""
+import os
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from classification_rules import build_move_plan, ACTION_PROTECTED, ACTION_MOVE, PROTECT_BY_PATH
+
+
+def _record(path, date="2025-01-01", prompt="cat"):
+    return {"图片的绝对路径": path, "正面提示词": prompt, "负面提示词": "", "创建日期目录": date}
+
+
+def test_protected_folder_does_not_cover_subfolders_by_default(tmp_path):
+    root = str(tmp_path)
+    protected = os.path.join(root, "keep")
+    records = [_record(os.path.join(protected, "a.png")), _record(os.path.join(protected, "sub", "b.png"))]
+    plan = build_move_plan(records, ["cat"], root, protected_folders=[protected])
+    assert plan["动作"].tolist() == [ACTION_PROTECTED, ACTION_MOVE]
+    assert plan["保护规则"].tolist()[0] == PROTECT_BY_PATH
+
+
+def test_protect_subfolders_flag(tmp_path):
+    root = str(tmp_path)
+    protected = os.path.join(root, "keep")
+    records = [_record(os.path.join(protected, "sub", "b.png")), _record(os.path.join(root, "keeper", "c.png"))]
+    plan = build_move_plan(records, ["cat"], root, protected_folders=[protected], protect_subfolders=True)
+    assert plan["动作"].tolist() == [ACTION_PROTECTED, ACTION_MOVE]
+
+
+def test_target_folder_joins_date_and_keyword(tmp_path):
+    root = str(tmp_path)
+    records = [
+        _record(os.path.join(root, "in", "a.png")),
+        _record(os.path.join(root, "in", "b.png"), date=""),
+        _record(os.path.join(root, "in", "c.png"), date=None, prompt="dog"),
+    ]
+    plan = build_move_plan(records, ["cat"], root)
+    assert plan["目标文件夹"].tolist() == [
+        os.path.join(root, "2025-01-01", "cat"),
+        os.path.join(root, "", "cat"),
+        os.path.join(root, "未获取日期", "未分类"),
+    ]
+    assert plan["理想目标路径"].tolist()[1] == os.path.join(root, "cat", "b.png")
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+file_categorizer.categorize_images: 移动后只清理有文件移出的空文件夹。
+"""
+import os
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from file_categorizer import categorize_images, remove_empty_source_dirs
+
+
+def _image(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"png")
+    return {"图片的绝对路径": path, "正面提示词": "cat", "负面提示词": "", "创建日期目录": "2025-01-01"}
+
+
+def test_cleanup_keeps_protected_parent_of_emptied_subfolder(tmp_path):
+    root = str(tmp_path)
+    # 只有 sub 按名称检查保护规则，文件会被移动；sub 变空后被清理，但 精选 不能被删除
+    record = _image(os.path.join(root, "精选", "sub", "a.png"))
+    categorize_images([record], ["cat"], root)
+    assert os.path.exists(os.path.join(root, "2025-01-01", "cat", "a.png"))
+    assert not os.path.exists(os.path.join(root, "精选", "sub"))
+    assert os.path.isdir(os.path.join(root, "精选"))
+
+
+def test_cleanup_does_not_climb_to_empty_parents(tmp_path):
+    root = str(tmp_path)
+    source = os.path.join(root, "a", "b")
+    os.makedirs(source)
+    assert remove_empty_source_dirs([source], root) == 1
+    assert os.path.isdir(os.path.join(root, "a"))
+
+
+def test_cleanup_removes_nested_source_dirs_bottom_up(tmp_path):
+    root = str(tmp_path)
+    parent = os.path.join(root, "a")
+    child = os.path.join(parent, "b")
+    os.makedirs(child)
+    assert remove_empty_source_dirs([parent, child, root], root) == 2
+    assert os.path.isdir(root)
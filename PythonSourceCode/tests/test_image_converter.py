@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+image_converter: 生成信息写入 EXIF 后可以读回；不覆盖已存在的目标文件 (包括转换期间被创建的目标和中断恢复)。
+"""
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+from PIL import ImageDraw
+from PIL.PngImagePlugin import PngInfo
+
+import image_converter
+from image_converter import (
+    ConversionJournal, convert_one, convert_pngs, target_path_for, FORMAT_WEBP, FORMAT_JPEG, STATUS_DONE, STATUS_SKIPPED,
+)
+from image_scanner import process_single_image
+
+PARAMETERS = (
+    "1girl, 猫耳, (微笑:1.2), red_hair\n"
+    "Negative prompt: 低质量, lowres\n"
+    "Steps: 20, Sampler: Euler a, CFG scale: 7, Seed: 123, Size: 128x128"
+)
+
+
+def _make_png(path):
+    image = Image.new("RGB", (64, 64))
+    image.putdata([(x * 4, y * 4, (x + y) * 2) for y in range(64) for x in range(64)])
+    return _save_png(image, path, None)
+
+
+def _make_drawing_png(path, parameters):
+    # 有形状的画面: 有损转换后感知哈希距离稳定为 0 (平滑渐变的哈希位接近中位数，有损压缩后容易翻转)
+    image = Image.new("RGB", (128, 128), (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((10, 10, 70, 90), fill=(200, 30, 30))
+    draw.rectangle((60, 50, 120, 120), fill=(20, 40, 180))
+    draw.line((0, 127, 127, 0), fill=(0, 0, 0), width=5)
+    return _save_png(image, path, parameters)
+
+
+def _save_png(image, path, parameters):
+    pnginfo = None
+    if parameters:
+        pnginfo = PngInfo()
+        pnginfo.add_text("parameters", parameters)
+    image.save(path, format="PNG", pnginfo=pnginfo)
+    return path
+
+
+@pytest.mark.parametrize("target_format", [FORMAT_WEBP, FORMAT_JPEG])
+def test_parameters_round_trip_through_exif(tmp_path, target_format):
+    source = _make_drawing_png(str(tmp_path / "a.png"), PARAMETERS)
+    target = target_path_for(source, target_format)
+    result = convert_one(source, target, target_format, quality=90, lossless=False, delete_source=False)
+    assert result["status"] == STATUS_DONE, result["error"]
+
+    source_info, target_info = process_single_image(source), process_single_image(target)
+    assert target_info["正面提示词"] == source_info["正面提示词"]
+    assert "猫耳" in target_info["正面提示词"] and "(微笑:1.2)" in target_info["正面提示词"]
+    assert target_info["负面提示词"] == source_info["负面提示词"]
+    assert os.stat(target).st_mtime_ns == os.stat(source).st_mtime_ns
+
+
+def test_target_created_during_conversion_is_not_overwritten(tmp_path, monkeypatch):
+    source = _make_png(str(tmp_path / "a.png"))
+    target = target_path_for(source, FORMAT_WEBP)
+    real_verify = image_converter._verify
+
+    def _verify_while_user_saves(*args):
+        with open(target, "wb") as f:
+            f.write(b"user file")
+        return real_verify(*args)
+    monkeypatch.setattr(image_converter, "_verify", _verify_while_user_saves)
+
+    result = convert_one(source, target, FORMAT_WEBP, quality=90, lossless=True, delete_source=True)
+    assert result["status"] == STATUS_SKIPPED
+    with open(target, "rb") as f:
+        assert f.read() == b"user file"
+    assert os.path.exists(source)
+    assert sorted(os.listdir(str(tmp_path))) == ["a.png", "a.webp"] # 临时文件已清理
+
+
+def _interrupt(journal_path, source):
+    """模拟上次运行在 mark_running 之后中断。"""
+    stat = os.stat(source)
+    with ConversionJournal(journal_path) as journal:
+        journal.mark_running(source, stat.st_size, stat.st_mtime_ns, target_path_for(source, FORMAT_WEBP))
+
+
+def _status(journal_path, source):
+    with ConversionJournal(journal_path) as journal:
+        return journal.statuses()[source][0]
+
+
+def test_interrupted_job_does_not_overwrite_foreign_target(tmp_path):
+    source = _make_png(str(tmp_path / "a.png"))
+    target = target_path_for(source, FORMAT_WEBP)
+    with open(target, "wb") as f:
+        f.write(b"user file")
+    journal = str(tmp_path / "journal.sqlite")
+    _interrupt(journal, source)
+
+    stats = convert_pngs([source], journal_path=journal, max_workers=1)
+    assert stats["跳过"] == 1
+    with open(target, "rb") as f:
+        assert f.read() == b"user file"
+    assert _status(journal, source) == STATUS_SKIPPED
+
+
+def test_interrupted_job_with_published_target_is_marked_done(tmp_path):
+    source = _make_png(str(tmp_path / "a.png"))
+    journal = str(tmp_path / "journal.sqlite")
+    assert convert_pngs([source], journal_path=journal, max_workers=1, lossless=True)["转换成功"] == 1
+    target = target_path_for(source, FORMAT_WEBP)
+    converted = os.path.getsize(target)
+    # 转换已写入正式文件名，但完成状态还没有写入任务日志
+    _interrupt(journal, source)
+
+    stats = convert_pngs([source], journal_path=journal, max_workers=1, delete_source=True)
+    assert stats["待转换"] == 0 and stats["已完成跳过"] == 1
+    assert os.path.getsize(target) == converted
+    assert not os.path.exists(source)
+    assert _status(journal, source) == STATUS_DONE
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+image_scorer_supervised 哈希特征空间下的评分解释: 使用真实词汇而不是桶编号。
+"""
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+
+from image_scorer_supervised import ImageScorer, ScorerConfig
+
+
+def _frame():
+    rows = [
+        ("/精选/a.png", "cat ears smile"),
+        ("/精选/b.png", "cat ears night"),
+        ("/other/c.png", "dog night rain"),
+        ("/other/d@@@评分10.png", "dog rain"),
+        ("/other/e.png", "cat rain"),
+    ]
+    columns = [f"列{i}" for i in range(12)]
+    records = []
+    for path, tags in rows:
+        record = dict.fromkeys(columns, "")
+        record[columns[0]] = path
+        record[columns[11]] = tags
+        records.append(record)
+    return pd.DataFrame(records, columns=columns)
+
+
+def test_hashing_explanations_use_words():
+    config = ScorerConfig()
+    config.USE_HASHING_VECTORIZER = True
+    config.HASHING_N_FEATURES = 2 ** 12
+    scored = ImageScorer(config).score_dataframe(_frame())
+    explanations = scored[config.EXPLANATION_COLUMN].tolist()
+    assert not any("特征#" in text for text in explanations)
+    assert "cat(" in explanations[0]
+    assert "dog(" in explanations[3]
+
+
+def test_hashing_explanations_match_vocabulary_mode():
+    hashing_config = ScorerConfig()
+    hashing_config.USE_HASHING_VECTORIZER = True
+    hashing = ImageScorer(hashing_config).score_dataframe(_frame())[hashing_config.EXPLANATION_COLUMN]
+    vocabulary = ImageScorer(ScorerConfig()).score_dataframe(_frame())[ScorerConfig.EXPLANATION_COLUMN]
+    assert hashing.tolist() == vocabulary.tolist()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+keyword_matcher.KeywordMatcher 与原来逐个关键词 `keyword in all_prompts` 的结果一致
+(包括未安装 pyahocorasick 时的前缀树正则和包含关系表)。
+"""
+import random
+
+import pytest
+
+import keyword_matcher
+from keyword_matcher import KeywordMatcher
+
+BACKENDS = ["regex"] + (["ahocorasick"] if keyword_matcher.AHOCORASICK_AVAILABLE else [])
+
+# 互相包含/互为前缀的关键词: hair 与 red_hair、red 与 red_hair、long 与 long_hair、正则特殊字符
+KEYWORDS = ["hair", "Red_Hair", "red", "long_hair", "long", "ong_h", "(smile:1.2)", "a.b", "hair", "猫耳", "猫"]
+PROMPTS = [
+    "1girl, red_hair, long_hair",
+    "1girl, long hair, (smile:1.2)",
+    "RED_HAIR\\, axb",
+    "a.b, 猫耳",
+    "hai, re, lon",
+    "",
+    "long_hairred_hair",
+]
+
+
+def _original_find_all(keyword_list, all_prompts):
+    # 原 tag_files_by_prompt 的匹配循环
+    lower_keyword_list = [kw.strip().lower() for kw in keyword_list if kw.strip()]
+    matched_tags = []
+    for keyword in lower_keyword_list:
+        original_keyword = keyword_list[lower_keyword_list.index(keyword)]
+        if keyword in all_prompts:
+            matched_tags.append(original_keyword)
+    return matched_tags
+
+
+def _original_find_first(keyword_list, all_prompts):
+    # 原 categorize_images 的优先级匹配循环
+    lower_keyword_list = [kw.strip().lower() for kw in keyword_list if kw.strip()]
+    for keyword in lower_keyword_list:
+        if keyword in all_prompts:
+            return keyword_list[lower_keyword_list.index(keyword)]
+    return None
+
+
+@pytest.fixture(params=BACKENDS)
+def make_matcher(request, monkeypatch):
+    if request.param == "regex":
+        monkeypatch.setattr(keyword_matcher, "AHOCORASICK_AVAILABLE", False)
+
+    def _make(keyword_list, strip_backslash=False):
+        matcher = KeywordMatcher(keyword_list, strip_backslash)
+        if matcher._positions:
+            assert (matcher._automaton is None) == (request.param == "regex")
+        return matcher
+    return _make
+
+
+@pytest.mark.parametrize("strip_backslash", [False, True])
+def test_matches_original_loop_on_overlapping_keywords(make_matcher, strip_backslash):
+    matcher = make_matcher(KEYWORDS, strip_backslash)
+    texts = [matcher.normalize(prompt, "negative: long") for prompt in PROMPTS]
+    assert matcher.match_column(texts) == [_original_find_all(KEYWORDS, text) for text in texts]
+    assert matcher.first_match_column(texts) == [_original_find_first(KEYWORDS, text) for text in texts]
+
+
+def test_longest_match_implies_contained_keywords(make_matcher):
+    matcher = make_matcher(["hair", "red_hair", "air"])
+    # 正则在同一位置只返回 red_hair，hair/air 由包含关系补全
+    assert matcher.find_all("red_hair") == ["hair", "red_hair", "air"]
+    assert matcher.find_first("red_hair") == "hair"
+    assert matcher.find_all("red_hai") == []
+
+
+def test_random_texts_match_original_loop(make_matcher):
+    keywords = ["a", "ab", "abc", "b", "bc", "ca", "cab", "bca", "c"]
+    rng = random.Random(0)
+    texts = ["".join(rng.choice("abcx") for _ in range(rng.randint(0, 8))) for _ in range(500)]
+    for size in range(1, len(keywords) + 1):
+        keyword_list = rng.sample(keywords, size)
+        matcher = make_matcher(keyword_list)
+        assert matcher.match_column(texts) == [_original_find_all(keyword_list, text) for text in texts]
+        assert matcher.first_match_column(texts) == [_original_find_first(keyword_list, text) for text in texts]
+
+
+def test_empty_keyword_list(make_matcher):
+    matcher = make_matcher(["", "  "])
+    assert matcher.match_column(["anything"]) == [[]]
+    assert matcher.first_match_column(["anything"]) == [None]
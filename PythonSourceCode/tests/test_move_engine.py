@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+move_engine 的跨卷移动 (复制接口逐级退化、校验失败保留源文件、文件夹部分失败)
+和 file_categorizer.merge_folder_trees 的冲突改名。
+"""
+import errno
+import os
+
+import pytest
+
+import move_engine
+from move_engine import MoveStats, VERIFY_HASH, copy_file_verified, move_path, TEMP_SUFFIX
+from virtual_fs import RealFileSystem
+from file_categorizer import merge_folder_trees
+
+DATA = bytes(range(256)) * 40 # 10240 字节，大于测试中的复制块大小
+
+
+class CrossDeviceFileSystem(RealFileSystem):
+    """
+    真实文件系统，但 rename 总是报告跨卷 (EXDEV)，强制走复制 -> 校验 -> 删除源的路径。
+    """
+    def rename(self, source_path, target_path):
+        raise OSError(errno.EXDEV, "跨卷", source_path)
+
+
+def _write(path, data=DATA):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _unsupported(*args):
+    raise OSError(errno.ENOSYS, "不支持")
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(move_engine, "COPY_CHUNK_SIZE", 4096)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """
+    记录每种复制接口被调用的次数 (平台支持的接口原样转发)。
+    """
+    counts = {"copy_file_range": 0, "sendfile": 0, "read": 0}
+    for name in counts:
+        real = getattr(os, name, None)
+        if real is None:
+            continue
+
+        def _spy(*args, _name=name, _real=real):
+            counts[_name] += 1
+            return _real(*args)
+        monkeypatch.setattr(os, name, _spy)
+    return counts
+
+
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="平台不支持 copy_file_range")
+def test_copy_uses_copy_file_range(tmp_path, calls):
+    source = _write(str(tmp_path / "a.png"))
+    assert copy_file_verified(source, str(tmp_path / "b.png")) == len(DATA)
+    assert _read(str(tmp_path / "b.png")) == DATA
+    assert calls["copy_file_range"] >= 3 and calls["sendfile"] == 0
+
+
+@pytest.mark.skipif(not hasattr(os, "sendfile"), reason="平台不支持 sendfile")
+def test_copy_falls_back_to_sendfile(tmp_path, calls, monkeypatch):
+    monkeypatch.setattr(os, "copy_file_range", _unsupported, raising=False)
+    source = _write(str(tmp_path / "a.png"))
+    copy_file_verified(source, str(tmp_path / "b.png"))
+    assert _read(str(tmp_path / "b.png")) == DATA
+    assert calls["sendfile"] >= 3
+
+
+@pytest.mark.skipif(not hasattr(os, "sendfile"), reason="平台不支持 sendfile")
+def test_copy_resumes_after_partial_copy_file_range(tmp_path, monkeypatch):
+    # copy_file_range 复制了第一块后失败，sendfile 从已复制的位置继续
+    state = {"calls": 0}
+
+    def _first_chunk_only(src_fd, dst_fd, count):
+        state["calls"] += 1
+        if state["calls"] > 1:
+            raise OSError(errno.EXDEV, "跨文件系统")
+        data = os.pread(src_fd, count, 0)
+        return os.write(dst_fd, data)
+    monkeypatch.setattr(os, "copy_file_range", _first_chunk_only, raising=False)
+    source = _write(str(tmp_path / "a.png"))
+    copy_file_verified(source, str(tmp_path / "b.png"))
+    assert _read(str(tmp_path / "b.png")) == DATA
+
+
+def test_copy_falls_back_to_buffered_copy(tmp_path, calls, monkeypatch):
+    monkeypatch.setattr(os, "copy_file_range", _unsupported, raising=False)
+    monkeypatch.setattr(os, "sendfile", _unsupported, raising=False)
+    source = _write(str(tmp_path / "a.png"))
+    copy_file_verified(source, str(tmp_path / "b.png"))
+    assert _read(str(tmp_path / "b.png")) == DATA
+    assert calls["read"] >= 3
+
+
+def test_copy_refuses_existing_target(tmp_path):
+    source = _write(str(tmp_path / "a.png"))
+    target = _write(str(tmp_path / "b.png"), b"old")
+    with pytest.raises(FileExistsError):
+        copy_file_verified(source, target)
+    assert _read(target) == b"old"
+
+
+def test_verify_failure_keeps_source(tmp_path, monkeypatch):
+    source = _write(str(tmp_path / "src" / "a.png"))
+    target = str(tmp_path / "dst" / "a.png")
+    os.makedirs(os.path.dirname(target))
+    monkeypatch.setattr(move_engine, "_file_digest", lambda path: path) # 哈希总是不一致
+    stats = MoveStats()
+    with pytest.raises(OSError, match="哈希"):
+        move_path(source, target, stats, verify=VERIFY_HASH, fs=CrossDeviceFileSystem())
+    assert _read(source) == DATA
+    assert not os.path.exists(target) and not os.path.exists(target + TEMP_SUFFIX)
+    assert stats.failed == 1 and stats.copied_files == 0
+
+
+def test_move_file_across_devices_removes_source_after_copy(tmp_path):
+    source = _write(str(tmp_path / "src" / "a.png"))
+    target = str(tmp_path / "dst" / "a.png")
+    os.makedirs(os.path.dirname(target))
+    stats = MoveStats()
+    move_path(source, target, stats, verify=VERIFY_HASH, fs=CrossDeviceFileSystem())
+    assert not os.path.exists(source) and _read(target) == DATA
+    assert stats.copied_files == 1 and stats.copied_bytes == len(DATA)
+
+
+def test_partial_tree_failure_keeps_failed_sources(tmp_path, monkeypatch):
+    source_dir = str(tmp_path / "src")
+    good = [_write(os.path.join(source_dir, "a.png")), _write(os.path.join(source_dir, "sub", "b.png"))]
+    bad = _write(os.path.join(source_dir, "sub", "bad.png"))
+    real_copy = move_engine.copy_file_verified
+
+    def _copy(source_path, target_path, *args):
+        if source_path == bad:
+            raise OSError(errno.EIO, "模拟读取失败", source_path)
+        return real_copy(source_path, target_path, *args)
+    monkeypatch.setattr(move_engine, "copy_file_verified", _copy)
+
+    target_dir = str(tmp_path / "dst")
+    stats = MoveStats()
+    with pytest.raises(OSError, match="1 个文件失败"):
+        move_path(source_dir, target_dir, stats, fs=CrossDeviceFileSystem())
+    assert _read(bad) == DATA # 失败的文件和源文件夹保留
+    assert not any(os.path.exists(path) for path in good)
+    assert _read(os.path.join(target_dir, "a.png")) == DATA
+    assert _read(os.path.join(target_dir, "sub", "b.png")) == DATA
+    assert not os.path.exists(os.path.join(target_dir, "sub", "bad.png"))
+    assert stats.failed == 1 and stats.copied_files == 2
+
+
+@pytest.mark.parametrize("fs", [RealFileSystem(), CrossDeviceFileSystem()], ids=["same-device", "cross-device"])
+def test_merge_folder_trees_renames_conflicts(tmp_path, fs):
+    source_dir, target_dir = str(tmp_path / "2025-01-01"), str(tmp_path / "归档" / "2025-01-01")
+    _write(os.path.join(source_dir, "a.png"), b"new a")
+    _write(os.path.join(source_dir, "cat", "b.png"), b"new b")
+    _write(os.path.join(source_dir, "dog", "c.png"), b"c")
+    _write(os.path.join(target_dir, "a.png"), b"old a")
+    _write(os.path.join(target_dir, "a(1).png"), b"old a1")
+    _write(os.path.join(target_dir, "cat", "b.png"), b"old b")
+
+    result = merge_folder_trees(source_dir, target_dir, fs=fs)
+
+    assert sorted(result["renamed"]) == sorted([
+        (os.path.join(source_dir, "a.png"), os.path.join(target_dir, "a(2).png")),
+        (os.path.join(source_dir, "cat", "b.png"), os.path.join(target_dir, "cat", "b(1).png")),
+    ])
+    assert result["moved"] == [(os.path.join(source_dir, "dog"), os.path.join(target_dir, "dog"))]
+    assert result["failed"] == [] and result["source_removed"] is True
+    assert _read(os.path.join(target_dir, "a.png")) == b"old a"
+    assert _read(os.path.join(target_dir, "a(2).png")) == b"new a"
+    assert _read(os.path.join(target_dir, "cat", "b(1).png")) == b"new b"
+    assert _read(os.path.join(target_dir, "dog", "c.png")) == b"c"
+    assert not os.path.exists(source_dir)
+
+
+def test_merge_folder_trees_keeps_source_when_folder_meets_file(tmp_path):
+    source_dir, target_dir = str(tmp_path / "src"), str(tmp_path / "dst")
+    _write(os.path.join(source_dir, "cat", "b.png"))
+    _write(os.path.join(target_dir, "cat"), b"file named cat")
+
+    result = merge_folder_trees(source_dir, target_dir)
+
+    assert result["failed"] == [(os.path.join(source_dir, "cat"), "目标位置存在同名文件，无法合并文件夹")]
+    assert result["source_removed"] is False
+    assert _read(os.path.join(source_dir, "cat", "b.png")) == DATA
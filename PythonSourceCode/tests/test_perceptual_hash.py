@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+perceptual_hash.MultiIndexHammingIndex: 结果与两两比较的暴力方法完全一致。
+"""
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from perceptual_hash import MultiIndexHammingIndex, hamming_distance, HASH_BITS
+
+
+def _brute_force_pairs(hashes, max_distance):
+    return {
+        (i, j, hamming_distance(hashes[i], hashes[j]))
+        for i in range(len(hashes))
+        for j in range(i + 1, len(hashes))
+        if hamming_distance(hashes[i], hashes[j]) <= max_distance
+    }
+
+
+def _clustered_hashes(rng, clusters, per_cluster, max_flips):
+    """每个簇一个随机中心，成员翻转不超过 max_flips 个随机位 (模拟转换副本)，再加一些完全相同的哈希。"""
+    hashes = []
+    for _ in range(clusters):
+        center = rng.getrandbits(HASH_BITS)
+        for _ in range(per_cluster):
+            value = center
+            for bit in rng.sample(range(HASH_BITS), rng.randint(0, max_flips)):
+                value ^= 1 << bit
+            hashes.append(value)
+    hashes.extend(hashes[:5])
+    rng.shuffle(hashes)
+    return hashes
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 4, 6, 10])
+def test_pairs_match_brute_force(max_distance):
+    rng = random.Random(max_distance)
+    hashes = _clustered_hashes(rng, clusters=40, per_cluster=8, max_flips=12)
+    index = MultiIndexHammingIndex(hashes, max_distance)
+    pairs = list(index.pairs())
+    assert len(pairs) == len(set(pairs)) # 每对只生成一次
+    assert set(pairs) == _brute_force_pairs(hashes, max_distance)
+    assert all(i < j for i, j, _ in pairs)
+
+
+def test_segments_cover_all_bits():
+    for max_distance in range(0, 20):
+        index = MultiIndexHammingIndex([], max_distance)
+        assert sum(width for _, width in index.segments) == HASH_BITS
+        assert len(index.segments) == max_distance + 1
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+pipeline_runner.build_pipeline 的阶段依赖 (classify 模式下报告与分类的顺序)。
+"""
+import pytest
+
+import pipeline_runner
+
+
+def _deps(argv, stage):
+    graph = pipeline_runner.build_pipeline(pipeline_runner.parse_args(argv))
+    return graph.stages[stage].deps
+
+
+@pytest.mark.parametrize("option", ["--duplicates", "--near-duplicates", "--incremental"])
+def test_classify_waits_for_report_that_reads_files(tmp_path, option):
+    assert _deps([str(tmp_path), "--mode", "classify", "--yes", option], "classify") == ["scan", "report"]
+
+
+def test_classify_runs_beside_report_that_only_writes(tmp_path):
+    argv = [str(tmp_path), "--mode", "classify", "--yes", "--no-duplicates", "--no-near-duplicates", "--no-incremental"]
+    assert _deps(argv, "classify") == ["scan"]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+png_recompressor: 重压缩后像素和 parameters 文本块不变，无收益的文件以后不再尝试。
+"""
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+from PIL import PngImagePlugin
+
+from png_recompressor import (
+    read_chunks, recompress_file, recompress_pngs, STATUS_SAVED,
+)
+
+PARAMETERS = "1girl, solo, smile\nNegative prompt: lowres\nSteps: 20, Sampler: Euler a, Seed: 123"
+
+
+def _make_png(path, mode="RGB", compress_level=0):
+    image = Image.new(mode, (96, 64))
+    if mode == "P":
+        image.putpalette([value for i in range(256) for value in (i, 255 - i, i // 2)])
+        image.putdata([(x + y) % 256 for y in range(64) for x in range(96)])
+    else:
+        image.putdata([(x * 2, y * 3, (x * y) % 256, 255)[:len(mode)] for y in range(64) for x in range(96)])
+    info = PngImagePlugin.PngInfo()
+    info.add_text("parameters", PARAMETERS)
+    image.save(path, format="PNG", pnginfo=info, compress_level=compress_level)
+    return path
+
+
+def _pixels(path):
+    with Image.open(path) as image:
+        return image.mode, image.size, image.tobytes(), image.getpalette()
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "P"])
+def test_recompress_keeps_pixels_and_other_chunks(tmp_path, mode):
+    path = _make_png(str(tmp_path / f"{mode}.png"), mode)
+    with open(path, "rb") as f:
+        original = f.read()
+    pixels = _pixels(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    result = recompress_file(path)
+    assert result["status"] == STATUS_SAVED
+    assert result["size"] == os.path.getsize(path) < len(original)
+    assert _pixels(path) == pixels
+    with Image.open(path) as image:
+        assert image.info["parameters"] == PARAMETERS
+    with open(path, "rb") as f:
+        recompressed = f.read()
+    # IDAT 以外的数据块 (含 CRC) 逐字节相同
+    assert [raw for chunk_type, raw in read_chunks(recompressed) if chunk_type != b"IDAT"] == \
+        [raw for chunk_type, raw in read_chunks(original) if chunk_type != b"IDAT"]
+    assert os.stat(path).st_mtime_ns == mtime_ns
+
+
+def test_no_gain_file_is_left_alone_and_cached(tmp_path):
+    path = _make_png(str(tmp_path / "best.png"), compress_level=9)
+    recompress_file(path) # 已是最佳压缩
+    with open(path, "rb") as f:
+        before = f.read()
+    cache = str(tmp_path / "cache.sqlite")
+
+    first = recompress_pngs([(path, None)], cache_path=cache, max_workers=1)
+    assert first["无收益"] == 1 and first["已重压缩"] == 0
+    with open(path, "rb") as f:
+        assert f.read() == before
+
+    second = recompress_pngs([(path, None)], cache_path=cache, max_workers=1)
+    assert second["缓存跳过"] == 1 and second["已处理"] == 0
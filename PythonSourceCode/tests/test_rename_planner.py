@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+rename_planner 的预写日志: 崩溃后的恢复，以及未恢复的日志不会被新的计划覆盖。
+"""
+import json
+import os
+
+import pytest
+
+from rename_planner import (
+    plan_renames, execute_rename_plan, recover_rename_journal, recover_pending_renames,
+    PendingRenameJournalError, STATUS_DONE, STATUS_FAILED,
+)
+
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(path))
+
+
+def _write_crashed_journal(journal_path, pairs, done):
+    """模拟执行到一半时崩溃: 全部计划已写入，只有 done 中的操作已执行。"""
+    with open(journal_path, "w", encoding="utf-8") as f:
+        for source, target in pairs:
+            f.write(json.dumps({"type": "plan", "source": source, "target": target}, ensure_ascii=False) + "\n")
+    for source, target in done:
+        os.rename(source, target)
+
+
+def test_execute_removes_journal_after_success(tmp_path):
+    source = str(tmp_path / "a.png")
+    _touch(source)
+    journal = str(tmp_path / "journal.jsonl")
+    plan = plan_renames([(source, str(tmp_path / "sub" / "b.png"))])
+    summary = execute_rename_plan(plan, journal_path=journal)
+    assert summary == {STATUS_DONE: 1}
+    assert os.path.exists(str(tmp_path / "sub" / "b.png"))
+    assert not os.path.exists(journal)
+
+
+def test_execute_refuses_target_created_after_planning(tmp_path):
+    sources = [str(tmp_path / "a.png"), str(tmp_path / "b.png")]
+    for source in sources:
+        _touch(source)
+    targets = [str(tmp_path / "sub" / "a.png"), str(tmp_path / "sub" / "b.png")]
+    journal = str(tmp_path / "journal.jsonl")
+    plan = plan_renames(zip(sources, targets))
+    # 规划之后、执行之前，其他程序在目标位置写入了文件
+    os.makedirs(os.path.dirname(targets[0]))
+    with open(targets[0], "w", encoding="utf-8") as f:
+        f.write("other")
+    summary = execute_rename_plan(plan, journal_path=journal)
+    assert summary == {STATUS_DONE: 1, STATUS_FAILED: 1}
+    assert plan[0].status == STATUS_FAILED and "拒绝覆盖" in plan[0].error
+    assert open(targets[0], encoding="utf-8").read() == "other"
+    assert os.path.exists(sources[0]) and os.path.exists(targets[1])
+
+
+def test_execute_allows_case_only_rename(tmp_path):
+    source = str(tmp_path / "a.png")
+    _touch(source)
+    target = str(tmp_path / "A.png")
+    summary = execute_rename_plan(plan_renames([(source, target)]), journal_path=str(tmp_path / "journal.jsonl"))
+    assert summary == {STATUS_DONE: 1}
+    assert os.path.basename(target) in os.listdir(str(tmp_path))
+
+
+def test_execute_refuses_to_overwrite_pending_journal(tmp_path):
+    sources = [str(tmp_path / f"{i}.png") for i in range(3)]
+    for source in sources:
+        _touch(source)
+    pairs = [(source, source.replace(".png", "_new.png")) for source in sources]
+    journal = str(tmp_path / "journal.jsonl")
+    _write_crashed_journal(journal, pairs, pairs[:1])
+    before = open(journal, encoding="utf-8").read()
+
+    other = str(tmp_path / "other.png")
+    _touch(other)
+    with pytest.raises(PendingRenameJournalError):
+        execute_rename_plan(plan_renames([(other, str(tmp_path / "other_new.png"))]), journal_path=journal)
+    assert open(journal, encoding="utf-8").read() == before
+    assert os.path.exists(other)
+
+
+def test_recover_completes_crashed_plan(tmp_path):
+    sources = [str(tmp_path / f"{i}.png") for i in range(3)]
+    for source in sources:
+        _touch(source)
+    pairs = [(source, str(tmp_path / "moved" / os.path.basename(source))) for source in sources]
+    os.makedirs(str(tmp_path / "moved"))
+    journal = str(tmp_path / "journal.jsonl")
+    _write_crashed_journal(journal, pairs, pairs[:1])
+
+    summary = recover_pending_renames(journal)
+    assert summary == {"completed": 2, "rolled_back": 0, "unresolved": 0}
+    assert all(os.path.exists(target) and not os.path.exists(source) for source, target in pairs)
+    assert not os.path.exists(journal)
+    assert recover_pending_renames(journal) is None
+
+
+def test_recover_rollback(tmp_path):
+    sources = [str(tmp_path / f"{i}.png") for i in range(2)]
+    for source in sources:
+        _touch(source)
+    pairs = [(source, source.replace(".png", "_new.png")) for source in sources]
+    journal = str(tmp_path / "journal.jsonl")
+    _write_crashed_journal(journal, pairs, pairs[:1])
+
+    summary = recover_rename_journal(journal, rollback=True)
+    assert summary["rolled_back"] == 1 and summary["unresolved"] == 0
+    assert all(os.path.exists(source) for source in sources)
+    assert not os.path.exists(journal)
+
+
+def test_execute_reports_rename_stage_progress(tmp_path, monkeypatch):
+    import metrics_exporter
+    exporter = metrics_exporter.MetricsExporter()
+    monkeypatch.setattr(metrics_exporter, "_exporter", exporter)
+    requests = []
+    for i in range(5):
+        source = str(tmp_path / f"d{i % 2}" / f"{i}.png")
+        _touch(source)
+        requests.append((source, str(tmp_path / "out" / f"{i}.png")))
+    execute_rename_plan(plan_renames(requests), journal_path=str(tmp_path / "journal.jsonl"))
+    stage = exporter.stages["rename"]
+    assert (stage.total, stage.done, stage.errors) == (5, 5, 0)
+    assert not stage.running
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+report_store.ReportStore.sync_records 的增量更新 (删除范围、重命名识别)。
+"""
+import os
+
+from report_store import ReportStore, KEY_COLUMN
+
+
+def _make_images(folder, names):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for name in names:
+        path = os.path.join(folder, name)
+        with open(path, "wb") as f:
+            f.write(name.encode("utf-8"))
+        paths.append(path)
+    return paths
+
+
+def _records(paths, note="a"):
+    return [{KEY_COLUMN: path, "备注": note} for path in paths]
+
+
+def _stored_paths(store):
+    return sorted(record[KEY_COLUMN] for record in store.iter_records([KEY_COLUMN]))
+
+
+def test_sync_of_other_folder_keeps_rows(tmp_path):
+    folder_a = _make_images(str(tmp_path / "A"), ["1.png", "2.png"])
+    folder_b = _make_images(str(tmp_path / "B"), ["3.png"])
+    with ReportStore(str(tmp_path / "report.sqlite")) as store:
+        store.sync_records(_records(folder_a), scan_root=str(tmp_path / "A"))
+        changes = store.sync_records(_records(folder_b), scan_root=str(tmp_path / "B"))
+        assert changes["removed"] == []
+        assert _stored_paths(store) == sorted(folder_a + folder_b)
+
+
+def test_sync_removes_only_missing_files_under_root(tmp_path):
+    folder_a = _make_images(str(tmp_path / "A"), ["1.png", "2.png"])
+    folder_b = _make_images(str(tmp_path / "B"), ["3.png"])
+    with ReportStore(str(tmp_path / "report.sqlite")) as store:
+        store.sync_records(_records(folder_a + folder_b))
+        # A/2.png 和 B/3.png 都被删除，但这次只扫描 A
+        os.remove(folder_a[1])
+        os.remove(folder_b[0])
+        changes = store.sync_records(_records(folder_a[:1]), scan_root=str(tmp_path / "A"))
+        assert changes["removed"] == [folder_a[1]]
+        assert _stored_paths(store) == sorted([folder_a[0], folder_b[0]])
+
+
+def test_sync_keeps_existing_file_missing_from_scan(tmp_path):
+    paths = _make_images(str(tmp_path / "A"), ["1.png", "2.png"])
+    with ReportStore(str(tmp_path / "report.sqlite")) as store:
+        store.sync_records(_records(paths), scan_root=str(tmp_path / "A"))
+        changes = store.sync_records(_records(paths[:1]), scan_root=str(tmp_path / "A"))
+        assert changes["removed"] == []
+        assert _stored_paths(store) == sorted(paths)
+
+
+def test_sync_detects_rename(tmp_path):
+    paths = _make_images(str(tmp_path / "A"), ["1.png", "2.png"])
+    with ReportStore(str(tmp_path / "report.sqlite")) as store:
+        store.sync_records(_records(paths), scan_root=str(tmp_path / "A"))
+        renamed = os.path.join(str(tmp_path / "A"), "1@@@评分90.png")
+        os.rename(paths[0], renamed)
+        changes = store.sync_records(_records([renamed, paths[1]]), scan_root=str(tmp_path / "A"))
+        assert len(changes["renamed"]) == 1
+        assert changes["removed"] == [] and changes["added"] == []
+        assert _stored_paths(store) == sorted([renamed, paths[1]])
+
+
+def test_sync_with_parent_root_removes_missing_files_in_sibling_folders(tmp_path):
+    # 特殊文件夹: 用户输入的是 project/A，实际扫描的是整个 project，scan_root 为扫描的根目录
+    folder_a = _make_images(str(tmp_path / "project" / "A"), ["1.png"])
+    folder_b = _make_images(str(tmp_path / "project" / "B"), ["2.png", "3.png"])
+    with ReportStore(str(tmp_path / "report.sqlite")) as store:
+        store.sync_records(_records(folder_a + folder_b), scan_root=str(tmp_path / "project"))
+        os.remove(folder_b[1])
+        changes = store.sync_records(_records(folder_a + folder_b[:1]), scan_root=str(tmp_path / "project"))
+        assert changes["removed"] == [folder_b[1]]
+        assert _stored_paths(store) == sorted(folder_a + folder_b[:1])
+
+
+def test_sync_does_not_stat_unrelated_rows_outside_root(tmp_path, monkeypatch):
+    folder_a = _make_images(str(tmp_path / "A"), ["1.png"])
+    folder_b = _make_images(str(tmp_path / "B"), [f"{i}.png" for i in range(20)])
+    with ReportStore(str(tmp_path / "report.sqlite")) as store:
+        store.sync_records(_records(folder_a + folder_b))
+        checked = []
+        real_exists = os.path.exists
+        monkeypatch.setattr(os.path, "exists", lambda path: checked.append(path) or real_exists(path))
+        store.sync_records(_records(folder_a), scan_root=str(tmp_path / "A"))
+        assert not any(path in checked for path in folder_b)
+
+
+def test_sync_detects_move_into_root_from_other_folder(tmp_path):
+    folder_a = _make_images(str(tmp_path / "A"), ["1.png"])
+    folder_b = _make_images(str(tmp_path / "B"), ["moved.png", "stay.png"])
+    with ReportStore(str(tmp_path / "report.sqlite")) as store:
+        store.sync_records(_records(folder_a + folder_b))
+        moved = os.path.join(str(tmp_path / "A"), "moved.png")
+        os.rename(folder_b[0], moved)
+        changes = store.sync_records(_records(folder_a + [moved]), scan_root=str(tmp_path / "A"))
+        assert len(changes["renamed"]) == 1 and changes["added"] == []
+        assert _stored_paths(store) == sorted(folder_a + [moved, folder_b[1]])
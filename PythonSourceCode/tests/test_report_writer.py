@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+report_writer 的 xlsxwriter 引擎: 超过每个工作表的超链接上限后改写为 HYPERLINK 公式。
+"""
+import pytest
+
+pytest.importorskip("xlsxwriter")
+from openpyxl import load_workbook
+
+import report_writer
+from report_writer import write_report_streaming, ENGINE_XLSXWRITER, HYPERLINK_COLUMN, PATH_COLUMN, HYPERLINK_TEXT
+
+
+def _records(count, path_length=20):
+    for i in range(count):
+        path = f"/images/{i:0{path_length}d}.png"
+        yield {PATH_COLUMN: path, HYPERLINK_COLUMN: f"={path}"}
+
+
+def test_links_past_url_limit_become_hyperlink_formulas(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_writer, "XLSXWRITER_MAX_URLS", 2)
+    output = str(tmp_path / "report.xlsx")
+    engine = write_report_streaming(_records(4), [PATH_COLUMN, HYPERLINK_COLUMN], output, row_count=4)
+    assert engine == ENGINE_XLSXWRITER
+
+    sheet = load_workbook(output).active
+    links = [sheet.cell(row=row, column=2) for row in range(2, 6)]
+    # xlsxwriter 把 file:/// 链接保存为本地路径
+    assert [cell.hyperlink.target.replace("\\", "/") for cell in links[:2]] == ["/images/00000000000000000000.png", "/images/00000000000000000001.png"]
+    assert [cell.value for cell in links[:2]] == [HYPERLINK_TEXT, HYPERLINK_TEXT]
+    assert links[2].hyperlink is None
+    assert links[2].value == f'=HYPERLINK("file:////images/00000000000000000002.png","{HYPERLINK_TEXT}")'
+    assert links[3].value.startswith('=HYPERLINK("file:////images/00000000000000000003.png"')
+
+
+def test_link_too_long_for_formula_is_written_as_text(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_writer, "XLSXWRITER_MAX_URLS", 0)
+    output = str(tmp_path / "report.xlsx")
+    write_report_streaming(_records(1, path_length=300), [PATH_COLUMN, HYPERLINK_COLUMN], output)
+    cell = load_workbook(output).active.cell(row=2, column=2)
+    assert cell.value == f"file:////images/{0:0300d}.png"
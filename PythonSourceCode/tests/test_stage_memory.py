@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+stage_memory.StageMemoryMonitor: 每个阶段的分配位置只包括该阶段开始后新增的内存。
+"""
+import tracemalloc
+
+import pytest
+
+import stage_memory
+from stage_memory import StageMemoryMonitor
+
+
+def _allocate_scan_results():
+    return [{"路径": str(i)} for i in range(5000)]
+
+
+def _allocate_report_rows():
+    return [bytearray(64) for _ in range(5000)]
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    monkeypatch.setattr(stage_memory, "SNAPSHOT_MIN_BYTES", 1 << 16)
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc 已被其他代码开启")
+    monitor = StageMemoryMonitor(interval=3600) # 不自动采样，测试中手动调用 sample()
+    monitor.start()
+    yield monitor
+    monitor.stop()
+
+
+def test_later_stage_reports_only_its_own_allocations(monitor):
+    monitor.stage_started("scan")
+    scan_results = _allocate_scan_results()
+    monitor.sample()
+    monitor.stage_finished("scan")
+
+    monitor.stage_started("report")
+    report_rows = _allocate_report_rows()
+    monitor.sample()
+    monitor.stage_finished("report")
+
+    scan_lines = {site for site, _, _, _ in monitor.stages["scan"].top_sites}
+    report_lines = {site for site, _, _, _ in monitor.stages["report"].top_sites}
+    assert any(site.startswith("test_stage_memory.py:") for site in scan_lines)
+    assert report_lines and not (report_lines & scan_lines)
+    assert monitor.stages["report"].start_snapshot is None
+    assert len(scan_results) == len(report_rows)
@@ -9,6 +9,7 @@ import os # 用于获取 CPU 核心数
 import datetime # 用于实现计数器的时间跟踪
 from tqdm import tqdm # 导入 tqdm 用于进度条
 # @@    9-9,10-10   @@ 新增: 导入 tqdm 用于进度条
+import metrics_exporter # [2026-10-19] 新增: 实时吞吐指标 (可选)
 
 
 def preprocess_tags(tags_series: pd.Series) -> Tuple[List[str], pd.Series]:
@@ -171,6 +172,8 @@ def calculate_and_extract_tfidf(
             
             # @@    181-181,185-185   @@ 用 tqdm 包装 as_completed，实现实时进度条
             # 使用 as_completed 可以在任务完成时立即获取结果，实现实时进度跟踪
+            # [2026-10-19] 新增: 同时更新吞吐指标 (未开启时为空操作)
+            progress = metrics_exporter.stage_progress("tfidf", total_tasks)
             for future in tqdm(concurrent.futures.as_completed(future_to_index), total=total_tasks, desc="TF-IDF关键词提取"):
                 original_idx = future_to_index[future]
                 
@@ -178,6 +181,7 @@ def calculate_and_extract_tfidf(
                     # 获取并行任务的结果
                     original_idx_result, result_tuple = future.result()
                     results_map[original_idx_result] = result_tuple
+                    progress.advance()
                     
                     # 移除自定义进度打印逻辑 (由 tqdm 代替)
                         
@@ -190,6 +194,9 @@ def calculate_and_extract_tfidf(
                         print(error_message)
                     # 失败的任务在结果集中标记为异常
                     results_map[original_idx] = ("并行处理失败或异常", [])
+                    progress.advance(error=True)
+                progress.set_queue_depth(total_tasks - len(results_map))
+            progress.finish()
 
             # 最终打印完成信息
             final_elapsed_time = (datetime.datetime.now() - start_time).total_seconds()
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+[2026-10-19] 新增: 文件系统抽象层 (真实文件系统 / 内存中的虚拟文件系统)。
+
+文件名标记、评分重命名、分类和归档等会修改目录树的函数都接受 fs 参数 (默认 REAL_FS)。
+传入 VirtualFileSystem 时所有操作只在内存中执行，可以用真实的 30 万条路径清单
+在几秒内模拟整个流程，得到最终目录树和各类文件系统操作的次数，不会改动磁盘。
+
+两种实现都会统计操作次数 (fs.op_counts)，便于比较不同策略的文件系统往返次数。
+"""
+import os
+import errno
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+
+class RealFileSystem:
+    """
+    真实文件系统: 直接转发到 os 模块，并统计操作次数。
+    [2026-10-19] 修改: 计数加锁 (重命名计划在多个线程中并行执行，Counter 的 += 不是原子操作)。
+    """
+    is_virtual = False
+
+    def __init__(self):
+        self.op_counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, op: str):
+        with self._lock:
+            self.op_counts[op] += 1
+
+    def scandir(self, path: str):
+        self._count("scandir")
+        return os.scandir(path)
+
+    def listdir(self, path: str) -> List[str]:
+        self._count("listdir")
+        return os.listdir(path)
+
+    def exists(self, path: str) -> bool:
+        self._count("stat")
+        return os.path.exists(path)
+
+    def isdir(self, path: str) -> bool:
+        self._count("stat")
+        return os.path.isdir(path)
+
+    def isfile(self, path: str) -> bool:
+        self._count("stat")
+        return os.path.isfile(path)
+
+    def makedirs(self, path: str, exist_ok: bool = False):
+        self._count("makedirs")
+        os.makedirs(path, exist_ok=exist_ok)
+
+    def rename(self, source_path: str, target_path: str):
+        self._count("rename")
+        os.rename(source_path, target_path)
+
+    def remove(self, path: str):
+        self._count("remove")
+        os.remove(path)
+
+    def rmdir(self, path: str):
+        self._count("rmdir")
+        os.rmdir(path)
+
+
+# 默认使用的真实文件系统实例
+REAL_FS = RealFileSystem()
+
+
+class VirtualDirEntry:
+    """
+    与 os.DirEntry 接口兼容的虚拟目录项。
+    """
+    __slots__ = ("name", "path", "_is_dir")
+
+    def __init__(self, name: str, path: str, is_dir: bool):
+        self.name = name
+        self.path = path
+        self._is_dir = is_dir
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return self._is_dir
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return not self._is_dir
+
+
+class _VirtualScandirIterator:
+    """
+    与 os.scandir 返回值一样支持 with 语句和迭代。
+    """
+    def __init__(self, entries: List[VirtualDirEntry]):
+        self._iterator = iter(entries)
+
+    def __iter__(self):
+        return self._iterator
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class VirtualFileSystem:
+    """
+    内存中的虚拟文件系统 (只保存目录结构和文件名，不保存文件内容)。
+
+    语义与 Windows 上的 os 模块一致: 目标已存在时 rename 抛出 FileExistsError；
+    路径比较使用 os.path.normcase。所有修改操作都加锁，可用于并行执行的重命名计划。
+    """
+    is_virtual = True
+
+    def __init__(self, file_paths: Optional[Iterable[str]] = None):
+        # 目录键 (normcase 的绝对路径) -> {子项名称键: 子项原始名称}
+        self._children: Dict[str, Dict[str, str]] = {}
+        # 目录键 -> 目录原始路径
+        self._dir_paths: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self.op_counts: Counter = Counter()
+        for path in file_paths or []:
+            self.add_file(path)
+
+    @classmethod
+    def from_paths(cls, file_paths: Iterable[str]) -> "VirtualFileSystem":
+        """
+        从文件路径清单 (例如扫描报告中的 '图片的绝对路径' 列) 构建虚拟目录树。
+        """
+        return cls(file_paths)
+
+    @classmethod
+    def from_disk(cls, root_dir: str) -> "VirtualFileSystem":
+        """
+        把磁盘上 root_dir 的目录结构 (包括空文件夹) 快照到内存中。
+        """
+        vfs = cls()
+        for directory, _, files in os.walk(root_dir):
+            vfs._ensure_dir(directory)
+            for name in files:
+                vfs.add_file(os.path.join(directory, name))
+        vfs.op_counts.clear()
+        return vfs
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def _ensure_dir(self, path: str) -> str:
+        """
+        创建目录及所有缺失的父目录 (不计入操作次数)，返回目录键。
+        """
+        key = self._key(path)
+        if key in self._children:
+            return key
+        parent = os.path.dirname(os.path.abspath(path))
+        if parent != os.path.abspath(path):
+            parent_key = self._ensure_dir(parent)
+            name = os.path.basename(os.path.abspath(path))
+            existing = self._children[parent_key].get(os.path.normcase(name))
+            if existing is not None and self._key(os.path.join(parent, existing)) not in self._children:
+                raise FileExistsError(errno.EEXIST, "同名文件已存在，无法创建文件夹", path)
+            self._children[parent_key][os.path.normcase(name)] = name
+        self._children[key] = {}
+        self._dir_paths[key] = os.path.abspath(path)
+        return key
+
+    def add_file(self, path: str):
+        """
+        在虚拟目录树中添加一个文件 (父目录自动创建)。
+        """
+        with self._lock:
+            parent_key = self._ensure_dir(os.path.dirname(os.path.abspath(path)))
+            name = os.path.basename(path)
+            self._children[parent_key][os.path.normcase(name)] = name
+
+    def _lookup(self, path: str) -> Optional[str]:
+        """
+        返回路径类型: 'dir'、'file' 或 None (不存在)。
+        """
+        key = self._key(path)
+        if key in self._children:
+            return "dir"
+        parent_key = os.path.dirname(key)
+        siblings = self._children.get(parent_key)
+        if siblings is not None and os.path.basename(key) in siblings:
+            return "file"
+        return None
+
+    # --- 查询操作 ---
+
+    def scandir(self, path: str):
+        with self._lock:
+            self.op_counts["scandir"] += 1
+            key = self._key(path)
+            if key not in self._children:
+                raise FileNotFoundError(errno.ENOENT, "文件夹不存在", path)
+            entries = []
+            for name_key, name in self._children[key].items():
+                entry_path = os.path.join(path, name)
+                entries.append(VirtualDirEntry(name, entry_path, os.path.join(key, name_key) in self._children))
+            return _VirtualScandirIterator(entries)
+
+    def listdir(self, path: str) -> List[str]:
+        with self._lock:
+            self.op_counts["listdir"] += 1
+            key = self._key(path)
+            if key not in self._children:
+                raise FileNotFoundError(errno.ENOENT, "文件夹不存在", path)
+            return list(self._children[key].values())
+
+    def exists(self, path: str) -> bool:
+        with self._lock:
+            self.op_counts["stat"] += 1
+            return self._lookup(path) is not None
+
+    def isdir(self, path: str) -> bool:
+        with self._lock:
+            self.op_counts["stat"] += 1
+            return self._lookup(path) == "dir"
+
+    def isfile(self, path: str) -> bool:
+        with self._lock:
+            self.op_counts["stat"] += 1
+            return self._lookup(path) == "file"
+
+    # --- 修改操作 ---
+
+    def makedirs(self, path: str, exist_ok: bool = False):
+        with self._lock:
+            self.op_counts["makedirs"] += 1
+            kind = self._lookup(path)
+            if kind == "dir":
+                if not exist_ok:
+                    raise FileExistsError(errno.EEXIST, "文件夹已存在", path)
+                return
+            if kind == "file":
+                raise FileExistsError(errno.EEXIST, "同名文件已存在", path)
+            self._ensure_dir(path)
+
+    def rename(self, source_path: str, target_path: str):
+        with self._lock:
+            self.op_counts["rename"] += 1
+            kind = self._lookup(source_path)
+            if kind is None:
+                raise FileNotFoundError(errno.ENOENT, "源路径不存在", source_path)
+            source_key, target_key = self._key(source_path), self._key(target_path)
+            if self._lookup(target_path) is not None and source_key != target_key:
+                raise FileExistsError(errno.EEXIST, "目标路径已存在", target_path)
+            target_parent_key = os.path.dirname(target_key)
+            if target_parent_key not in self._children:
+                raise FileNotFoundError(errno.ENOENT, "目标文件夹不存在", target_path)
+            if kind == "dir" and (target_key + os.sep).startswith(source_key + os.sep):
+                raise OSError(errno.EINVAL, "不能把文件夹移动到自身内部", target_path)
+
+            del self._children[os.path.dirname(source_key)][os.path.basename(source_key)]
+            self._children[target_parent_key][os.path.basename(target_key)] = os.path.basename(target_path)
+
+            if kind == "dir":
+                # 整棵子树的目录键改为新前缀
+                source_prefix = source_key + os.sep
+                target_abs = os.path.abspath(target_path)
+                for key in [k for k in self._children if k == source_key or k.startswith(source_prefix)]:
+                    new_key = target_key + key[len(source_key):]
+                    self._children[new_key] = self._children.pop(key)
+                    self._dir_paths[new_key] = target_abs + self._dir_paths.pop(key)[len(source_key):]
+
+    def remove(self, path: str):
+        with self._lock:
+            self.op_counts["remove"] += 1
+            if self._lookup(path) != "file":
+                raise FileNotFoundError(errno.ENOENT, "文件不存在", path)
+            key = self._key(path)
+            del self._children[os.path.dirname(key)][os.path.basename(key)]
+
+    def rmdir(self, path: str):
+        with self._lock:
+            self.op_counts["rmdir"] += 1
+            key = self._key(path)
+            if key not in self._children:
+                raise FileNotFoundError(errno.ENOENT, "文件夹不存在", path)
+            if self._children[key]:
+                raise OSError(errno.ENOTEMPTY, "文件夹非空", path)
+            del self._children[key]
+            del self._dir_paths[key]
+            parent_key = os.path.dirname(key)
+            if parent_key in self._children:
+                self._children[parent_key].pop(os.path.basename(key), None)
+
+    # --- 结果查看 ---
+
+    def list_files(self, root_dir: Optional[str] = None) -> List[str]:
+        """
+        返回 (root_dir 下的) 全部文件路径，已排序，用于比较模拟得到的最终目录树。
+        """
+        with self._lock:
+            prefix = self._key(root_dir) + os.sep if root_dir else ""
+            files = []
+            for key, children in self._children.items():
+                if prefix and not (key + os.sep).startswith(prefix):
+                    continue
+                directory = self._dir_paths[key]
+                for name_key, name in children.items():
+                    if os.path.join(key, name_key) not in self._children:
+                        files.append(os.path.join(directory, name))
+            return sorted(files)
+
+    def summary(self) -> str:
+        """
+        操作次数摘要，例如 'rename: 120, scandir: 8'。
+        """
+        return ", ".join(f"{op}: {count}" for op, count in sorted(self.op_counts.items())) or "无操作"